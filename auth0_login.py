@@ -0,0 +1,212 @@
+# auth0_login.py
+"""
+Log into the dashboard over plain HTTP instead of driving the Auth0 pages in
+the browser.
+
+http_login() follows the same redirects the browser would (dashboard
+/auth/login -> Auth0 /authorize -> Universal Login -> /auth/callback) with a
+requests session, submitting the login forms it meets on the way: the
+username and password are filled in, hidden fields (state, or the code of a
+form_post response) are sent back as they are. Credentials are only ever
+filled into a form that is on, and posts to, the Auth0 tenant: the host the
+dashboard's /auth/login redirects to. Once the chain lands back on
+the dashboard, the dashboard's cookies are the logged-in session; the
+scraper copies them into the browser (see scraper.log_in_over_http).
+
+The session is kept for the life of the process, so its connections stay
+open and Auth0's own session cookie makes later logins (browser restarts,
+scheduler runs) skip the password form entirely.
+
+Anything unexpected (a CAPTCHA or MFA step, rejected credentials, a changed
+login page) raises FastLoginError, and the caller falls back to the UI flow.
+"""
+
+import logging
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+HTTP_TIMEOUT = 15
+# Login pages submitted before giving up (Auth0 uses two: identifier, then password)
+MAX_FORM_STEPS = 5
+POOL_SIZE = 4
+
+USERNAME_FIELDS = ("username", "email")
+PASSWORD_FIELDS = ("password",)
+
+_session = None
+
+class FastLoginError(RuntimeError):
+    pass
+
+def get_session():
+    """
+    The process-wide login session, created on first use.
+    """
+    global _session
+
+    if _session is None:
+        session = requests.Session()
+        # Connection failures on GETs are retried; form posts are not
+        adapter = HTTPAdapter(
+            pool_connections=POOL_SIZE,
+            pool_maxsize=POOL_SIZE,
+            max_retries=Retry(total=2, backoff_factor=0.3, allowed_methods=frozenset({"GET"})),
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _session = session
+    return _session
+
+class _Form:
+    def __init__(self, action, method):
+        self.action = action
+        self.method = method
+        self.fields = {}
+
+class _FormParser(HTMLParser):
+    """
+    Collects the forms of a page with their named inputs, and the name/value
+    of their first named submit button (Auth0 posts action=default).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.forms = []
+        self._form = None
+        self._button_seen = False
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "form":
+            self._form = _Form(attrs.get("action") or "", (attrs.get("method") or "get").upper())
+            self._button_seen = False
+            self.forms.append(self._form)
+            return
+        if self._form is None or not attrs.get("name"):
+            return
+        kind = (attrs.get("type") or "").lower()
+        if tag == "input" and kind not in ("submit", "button", "checkbox", "radio"):
+            self._form.fields[attrs["name"]] = attrs.get("value") or ""
+        elif (tag == "button" and kind in ("", "submit")) or (tag == "input" and kind == "submit"):
+            if not self._button_seen:
+                self._form.fields[attrs["name"]] = attrs.get("value") or ""
+                self._button_seen = True
+
+    def handle_endtag(self, tag):
+        if tag == "form":
+            self._form = None
+
+def _login_form(html):
+    """
+    The page's login form: the first one with a credential field, else the
+    first POST form (e.g. an auto-submitted form_post). None if there is none.
+    """
+    parser = _FormParser()
+    parser.feed(html)
+    for form in parser.forms:
+        if any(name in form.fields for name in USERNAME_FIELDS + PASSWORD_FIELDS):
+            return form
+    for form in parser.forms:
+        if form.method == "POST" and form.fields:
+            return form
+    return None
+
+def _cookie_domain_matches(cookie_domain, host):
+    domain = cookie_domain.lstrip(".")
+    return host == domain or host.endswith("." + domain)
+
+def dashboard_cookies(session, url):
+    """
+    The session's cookies for 'url', as Selenium add_cookie() dicts.
+    """
+    host = urlsplit(url).hostname
+    cookies = []
+    for cookie in session.cookies:
+        if not _cookie_domain_matches(cookie.domain, host):
+            continue
+        entry = {
+            "name": cookie.name,
+            "value": cookie.value,
+            "path": cookie.path or "/",
+            "secure": bool(cookie.secure),
+            "httpOnly": cookie.has_nonstandard_attr("HttpOnly"),
+        }
+        if cookie.domain.startswith("."):
+            entry["domain"] = cookie.domain
+        if cookie.expires:
+            entry["expiry"] = int(cookie.expires)
+        cookies.append(entry)
+    return cookies
+
+def http_login(email, password, login_url, session=None, timeout=HTTP_TIMEOUT, max_steps=MAX_FORM_STEPS,
+               auth_host=None):
+    """
+    Log in through 'login_url' (the dashboard's /auth/login) over HTTP.
+    Returns the dashboard's session cookies as Selenium cookie dicts;
+    raises FastLoginError (or a requests exception) if it doesn't get there.
+
+    auth_host (host[:port]) is the Auth0 tenant; by default, the first host
+    other than the dashboard that /auth/login redirects to.
+    """
+    session = session or get_session()
+    dashboard = urlsplit(login_url)
+    response = session.get(login_url, timeout=timeout)
+    auth_host = auth_host or _first_redirect_host(response, dashboard.netloc)
+    password_sent = False
+    for step in range(max_steps + 1):
+        if response.status_code >= 500:
+            raise FastLoginError(f"HTTP {response.status_code} from {response.url}")
+        here = urlsplit(response.url)
+        if here.netloc == dashboard.netloc:
+            if here.path.rstrip("/") == dashboard.path.rstrip("/"):
+                raise FastLoginError(f"Sent back to {response.url} (HTTP {response.status_code})")
+            cookies = dashboard_cookies(session, login_url)
+            if not cookies:
+                raise FastLoginError(f"Back on {response.url} without any session cookie")
+            logger.info("HTTP login done in %d form step(s); %d dashboard cookie(s).", step, len(cookies))
+            return cookies
+        if step == max_steps:
+            break
+
+        form = _login_form(response.text)
+        if form is None:
+            raise FastLoginError(f"No login form at {here.scheme}://{here.netloc}{here.path} "
+                                 f"(HTTP {response.status_code})")
+        fields = dict(form.fields)
+        action = urljoin(response.url, form.action)
+        wants_password = any(name in fields for name in PASSWORD_FIELDS)
+        if any(name in fields for name in USERNAME_FIELDS + PASSWORD_FIELDS):
+            # Never hand the credentials to anyone but the tenant
+            if here.netloc != auth_host or urlsplit(action).netloc != auth_host:
+                raise FastLoginError(f"Login form at {here.netloc} posting to {urlsplit(action).netloc} "
+                                     f"isn't on the Auth0 tenant {auth_host}")
+        if wants_password and password_sent:
+            raise FastLoginError("Password form shown again; credentials rejected or an extra check (CAPTCHA/MFA)")
+        for name in USERNAME_FIELDS:
+            if name in fields:
+                fields[name] = email
+        for name in PASSWORD_FIELDS:
+            if name in fields:
+                fields[name] = password
+                password_sent = True
+        if form.method == "POST":
+            response = session.post(action, data=fields, timeout=timeout)
+        else:
+            response = session.get(action, params=fields, timeout=timeout)
+    raise FastLoginError(f"Still not back on {dashboard.netloc} after {max_steps} login forms")
+
+def _first_redirect_host(response, dashboard_host):
+    """
+    The first host other than the dashboard's in the response's redirect chain.
+    """
+    for hop in response.history + [response]:
+        host = urlsplit(hop.url).netloc
+        if host != dashboard_host:
+            return host
+    return None
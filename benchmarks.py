@@ -0,0 +1,831 @@
+#!/usr/bin/env python3
+# benchmarks.py
+"""
+Local benchmarks for the scraper's data paths. Nothing here talks to Google,
+Redash or the dashboard; remote APIs are replaced by in-process fakes.
+
+Usage:
+    python benchmarks.py upload [--rows 10000 100000] [--latency-ms 80]
+    python benchmarks.py startup [--budget-ms 100]
+    python benchmarks.py locations [--rows 200000] [--distinct 3000]
+    python benchmarks.py pipeline [--sizes 1000 10000 100000 1000000] [--update-baseline]
+    python benchmarks.py regroup [--rows 100000] [--max-rows-in-memory 20000]
+    python benchmarks.py queue [--rows 1234] [--workers 4] [--latency-ms 300]
+    python benchmarks.py rules [--rows 200000] [--rules 5000]
+    python benchmarks.py login [--latency-ms 50]
+"""
+
+import argparse
+import csv
+import fnmatch
+import importlib
+import io
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from itertools import zip_longest
+
+from data_filter import (
+    DomainRules,
+    RowRules,
+    build_output_rows,
+    filter_by_row_rules,
+    iter_regrouped_locations,
+    regroup_and_merge_locations,
+)
+from google_sheets import _build_sheet_row, stream_upload_to_google_sheets, upload_data_to_google_sheets
+from local_history import append_run_data
+from location_helpers import _parse_location_field, combine_record, process_location_field, process_location_fields
+from redash_data import build_location_map
+from sheets_io import SheetsIO
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks_baseline.json")
+
+###################################################
+# Fake Google Sheets API
+###################################################
+
+class FakeSpreadsheet:
+    """
+    Stand-in for gspread.Spreadsheet's values_* endpoints.
+
+    Each request sleeps for a fixed round-trip latency plus a per-megabyte
+    transfer cost, so request count and payload size both show up in timings.
+    """
+
+    id = "benchmark-spreadsheet"
+
+    def __init__(self, latency_seconds=0.08, seconds_per_mb=0.25):
+        self.latency_seconds = latency_seconds
+        self.seconds_per_mb = seconds_per_mb
+        self.requests = 0
+        self.cells_written = 0
+        self._lock = threading.Lock()
+
+    def _round_trip(self, values=()):
+        payload = sum(len(str(value)) + 3 for row in values for value in row)
+        with self._lock:
+            self.requests += 1
+            self.cells_written += sum(len(row) for row in values)
+        time.sleep(self.latency_seconds + self.seconds_per_mb * payload / (1024 * 1024))
+
+    def values_batch_clear(self, params=None, body=None):
+        self._round_trip()
+
+    def values_batch_update(self, body=None):
+        for entry in body["data"]:
+            self._round_trip(entry["values"])
+
+    def values_update(self, range, params=None, body=None):
+        self._round_trip(body["values"])
+
+    def values_batch_get(self, ranges, params=None):
+        self._round_trip()
+        return {"valueRanges": [{"range": r} for r in ranges]}
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title="auth_failed"):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.row_count = 1000
+
+    def resize(self, rows=None, cols=None):
+        self.spreadsheet._round_trip()
+        if rows:
+            self.row_count = rows
+
+###################################################
+# Synthetic data
+###################################################
+
+def make_regrouped_rows(count, seed=1):
+    """
+    Rows shaped like regroup_and_merge_locations() output.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        locations = ", ".join(str(rng.randint(10000, 99999)) for _ in range(rng.randint(1, 6)))
+        rows.append({
+            "ID": f"conn_{i:08d}",
+            "WebsiteId": f"portal{rng.randint(1, 400)}.example.com",
+            "Username": f"user{rng.randint(1, 50000)}@example.com",
+            "Status": "auth_failed",
+            "LastUpdated": "2025-02-03 04:05:06",
+            "practiceGroupId": str(rng.randint(1, 300)),
+            "practiceGroupName": f"Practice Group {rng.randint(1, 300)}",
+            "locationId": locations,
+        })
+    return rows
+
+def make_scraped_locations(count, distinct, seed=1):
+    """
+    Locations column of a scraped Connections table: 'distinct' different
+    strings, a few of them very common (as for large practices), plus the
+    Redash location map they join against.
+    """
+    rng = random.Random(seed)
+    pool = ["default"]
+    location_map = {}
+    for _ in range(distinct - 1):
+        ids = [str(rng.randint(10000, 99999)) for _ in range(rng.randint(1, 5))]
+        for loc_id in ids:
+            location_map[loc_id] = {"practiceGroupId": "1", "practiceGroupName": "Practice Group 1"}
+        entries = [f"airpay_{loc_id}" for loc_id in ids]
+        if rng.random() < 0.3:
+            entries.append("default")
+        pool.append(", ".join(entries))
+    weights = [1.0 / (rank + 1) for rank in range(len(pool))]
+    # Fresh string objects per row, like text read from the page
+    fields = ["".join(list(field)) for field in rng.choices(pool, weights=weights, k=count)]
+    return fields, location_map
+
+def make_pipeline_inputs(count, seed=1):
+    """
+    Inputs for the post-scrape pipeline with 'count' scraped connections:
+    (scraped records, Redash rows, "Run" practice groups, excluded domains).
+
+    Practice group sizes are skewed (a few groups own most locations and
+    connections), connections often have many locations, about half share
+    their group's common location string, and 10% of Redash rows are
+    duplicate location IDs.
+    """
+    rng = random.Random(seed)
+    group_count = max(20, count // 500)
+    groups = [f"Practice Group {g}" for g in range(group_count)]
+    weights = [1.0 / (g + 1) ** 1.1 for g in range(group_count)]
+
+    locations_by_group = {}
+    redash_rows = []
+    for index, group in enumerate(rng.choices(range(group_count), weights=weights, k=max(100, count // 2))):
+        loc_id = str(100000 + index)
+        locations_by_group.setdefault(group, []).append(loc_id)
+        redash_rows.append({"locationId": loc_id, "practiceGroupId": str(group), "practiceGroupName": groups[group]})
+    redash_rows.extend(dict(row) for row in rng.sample(redash_rows, len(redash_rows) // 10))
+    rng.shuffle(redash_rows)
+
+    common_locations = {
+        group: ", ".join(f"airpay_{loc_id}" for loc_id in owned[:8]) + ", default"
+        for group, owned in locations_by_group.items()
+    }
+    statuses = ["auth_failed", "active", "active", "pending"]
+    domains = [f"portal{d}.example.com" for d in range(300)] + ["unumdentalpwp.skygenusasystems.com"]
+    scraped = []
+    for i, group in enumerate(rng.choices(range(group_count), weights=weights, k=count)):
+        owned = locations_by_group.get(group)
+        if owned is None:
+            locations = "default"
+        elif rng.random() < 0.5:
+            locations = common_locations[group]
+        else:
+            picked = rng.sample(owned, min(len(owned), 1 + int(rng.expovariate(0.3))))
+            locations = ", ".join(f"airpay_{loc_id}" for loc_id in picked)
+        scraped.append({
+            "ID": f"conn_{i:08d}",
+            "WebsiteId": rng.choice(domains),
+            "Username": f"user{rng.randint(1, 50000)}@example.com",
+            "Status": rng.choice(statuses),
+            "Locations": locations,
+            "LastUpdated": "2025-02-03 04:05:06",
+        })
+
+    valid_groups = groups[::2]
+    return scraped, redash_rows, valid_groups, {"unumdentalpwp.skygenusasystems.com"}
+
+###################################################
+# Benchmarks
+###################################################
+
+def bench_upload(row_counts, latency_ms, workers_options):
+    print(f"{'rows':>8}  {'method':<22} {'seconds':>8} {'rows/s':>10} {'requests':>9}")
+    for count in row_counts:
+        data = make_regrouped_rows(count)
+
+        runs = [("single insert", None)]
+        runs.extend((f"stream, {w} worker(s)", w) for w in workers_options)
+        for label, workers in runs:
+            spreadsheet = FakeSpreadsheet(latency_seconds=latency_ms / 1000.0)
+            worksheet = FakeWorksheet(spreadsheet)
+            sheets_io = SheetsIO(spreadsheet, requests_per_minute=10 ** 9)
+
+            started = time.perf_counter()
+            if workers is None:
+                upload_data_to_google_sheets(worksheet, data, sheets_io=sheets_io)
+            else:
+                with tempfile.TemporaryDirectory() as tmp:
+                    stream_upload_to_google_sheets(
+                        worksheet,
+                        data,
+                        sheets_io=sheets_io,
+                        workers=workers,
+                        checkpoint_path=os.path.join(tmp, "checkpoint.json"),
+                    )
+            elapsed = time.perf_counter() - started
+
+            print(
+                f"{count:>8}  {label:<22} {elapsed:>8.2f} {count / elapsed:>10.0f} "
+                f"{spreadsheet.requests:>9}"
+            )
+
+def bench_locations(count, distinct):
+    fields, location_map = make_scraped_locations(count, distinct)
+    print(f"{count} rows, {distinct} distinct Locations strings, {len(location_map)} location IDs")
+
+    def join(parsed):
+        matched = 0
+        for ids in parsed:
+            for loc_id in ids:
+                if location_map.get(loc_id) is not None:
+                    matched += 1
+        return matched
+
+    started = time.perf_counter()
+    per_row = [process_location_field(field) for field in fields]
+    parse_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    matched = join(per_row)
+    join_seconds = time.perf_counter() - started
+    print(f"{'per-row process_location_field':<34} parse {parse_seconds:7.3f}s  join {join_seconds:7.3f}s  ({matched} matches)")
+
+    # The real map has interned keys (redash_data.build_location_map)
+    location_map = {sys.intern(key): value for key, value in location_map.items()}
+    started = time.perf_counter()
+    batch = process_location_fields(fields)
+    parse_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    matched = join(batch)
+    join_seconds = time.perf_counter() - started
+    print(f"{'batch process_location_fields':<34} parse {parse_seconds:7.3f}s  join {join_seconds:7.3f}s  ({matched} matches)")
+
+    assert [list(ids) for ids in batch] == per_row
+
+def expand_records(records, parsed_locations, location_map):
+    """
+    One row per (connection, location), as run_scraper_once builds them.
+    """
+    expanded = []
+    for record, locations in zip(records, parsed_locations):
+        if not locations:
+            expanded.append(combine_record(record, None, None))
+            continue
+        for loc_id in locations:
+            expanded.append(combine_record(record, loc_id, location_map.get(loc_id)))
+    return expanded
+
+def parse_locations(records):
+    """
+    Replace each record's Locations with its parsed IDs, as run_scraper_once does.
+    """
+    parsed_locations = process_location_fields([record["Locations"] for record in records])
+    for record, cleaned_locations in zip(records, parsed_locations):
+        record["Locations"] = cleaned_locations
+
+def run_pipeline(inputs, measure, history_path):
+    """
+    The post-scrape stages of run_scraper_once, each wrapped in measure(name, func, *args).
+    Expanding, filtering and regrouping is one stage, since it runs as one stream.
+    """
+    scraped, redash_rows, valid_groups, excluded = inputs
+    # Every pass parses the Locations strings from scratch, like a fresh process
+    _parse_location_field.cache_clear()
+    # Locations are parsed in place; keep the generated table intact for the next pass
+    records = [dict(record) for record in scraped]
+
+    location_map = measure("build_location_map", build_location_map, redash_rows)
+    measure("process_locations", parse_locations, records)
+    regrouped = measure(
+        "expand_filter_regroup", build_output_rows,
+        records, location_map, valid_groups, RowRules(excluded_domains=excluded),
+    )
+    measure("history_rows", append_run_data, regrouped, history_path)
+    fetch_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    measure("sheet_rows", lambda rows: [_build_sheet_row(r, fetch_time) for r in rows], regrouped)
+
+def calibrate():
+    """
+    Seconds for a fixed workload shaped like the pipeline: splitting and
+    cleaning comma-separated fields, looking them up, building, grouping
+    and sorting small dicts, and writing them as CSV. Used to scale the
+    baseline to the speed of the machine running the comparison. It is
+    written out here rather than calling the pipeline, so a slower pipeline
+    can't also slow down its own yardstick.
+    """
+    rng = random.Random(3)
+    fields = [
+        ", ".join(f"airpay_{rng.randrange(100000, 150000)}" for _ in range(rng.randrange(1, 12))) + ", default"
+        for _ in range(3000)
+    ]
+    best = None
+    for _ in range(5):
+        started = time.perf_counter()
+        lookup = {str(100000 + i): {"groupId": str(i % 300), "groupName": f"Group {i % 300}"} for i in range(10000)}
+        groups = {}
+        for index, field in enumerate(fields):
+            entries = [entry.strip() for entry in field.split(",")]
+            for entry in entries:
+                if entry.lower() == "default":
+                    continue
+                loc_id = sys.intern(entry[7:] if entry.startswith("airpay_") else entry)
+                row = {"ID": f"conn_{index}", "locationId": loc_id, "Status": "auth_failed"}
+                row.update(lookup.get(loc_id, {"groupId": "", "groupName": ""}))
+                groups.setdefault((row["groupName"], row["ID"]), []).append(row)
+        writer = csv.writer(io.StringIO())
+        for key in sorted(groups):
+            rows = groups[key]
+            merged = dict(rows[0], locationId=", ".join(row["locationId"] for row in rows))
+            writer.writerow(merged.values())
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def measure_pipeline(size):
+    """
+    {stage: {"seconds": best wall time, "peak_bytes": peak traced allocation}} for one size.
+    """
+    inputs = make_pipeline_inputs(size)
+    results = {}
+    repeat = max(1, min(20, 100000 // size))
+
+    def timed(name, func, *args):
+        started = time.perf_counter()
+        value = func(*args)
+        elapsed = time.perf_counter() - started
+        entry = results.setdefault(name, {})
+        entry["seconds"] = min(entry.get("seconds", elapsed), elapsed)
+        return value
+
+    def traced(name, func, *args):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        value = func(*args)
+        results[name]["peak_bytes"] = tracemalloc.get_traced_memory()[1] - before
+        return value
+
+    with tempfile.TemporaryDirectory() as tmp:
+        history_path = os.path.join(tmp, "history.csv")
+        for _ in range(repeat):
+            run_pipeline(inputs, timed, history_path)
+        # Memory in a separate pass: tracemalloc slows everything down
+        tracemalloc.start()
+        try:
+            run_pipeline(inputs, traced, history_path)
+        finally:
+            tracemalloc.stop()
+    return results
+
+def bench_pipeline(sizes, baseline_path, update_baseline, time_tolerance, memory_tolerance):
+    """
+    Time and peak memory per pipeline stage, compared with a stored baseline.
+    Exits 1 if any stage is slower or bigger than the baseline allows.
+    """
+    baseline = {}
+    if not update_baseline and os.path.exists(baseline_path):
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    calibration = calibrate()
+    measured = {str(size): measure_pipeline(size) for size in sizes}
+    # A burst of load while calibrating would skew every comparison, so
+    # calibrate on both sides of the measurements and keep the quicker run
+    calibration = min(calibration, calibrate())
+    # >1 when this machine is slower than the one that recorded the baseline
+    speed = calibration / baseline["calibration_seconds"] if baseline else 1.0
+
+    regressions = []
+    print(f"{'rows':>8}  {'stage':<26} {'seconds':>9} {'baseline':>9} {'peak MB':>9} {'baseline':>9}")
+    for size in sizes:
+        expected = baseline.get("results", {}).get(str(size), {})
+        for stage, entry in measured[str(size)].items():
+            base = expected.get(stage)
+            flag = ""
+            if base:
+                allowed_seconds = base["seconds"] * speed * (1 + time_tolerance)
+                allowed_bytes = base["peak_bytes"] * (1 + memory_tolerance)
+                # Differences this small are noise, not regressions
+                if entry["seconds"] > allowed_seconds and entry["seconds"] - base["seconds"] * speed > 0.005:
+                    flag = " SLOWER"
+                if entry["peak_bytes"] > allowed_bytes and entry["peak_bytes"] - base["peak_bytes"] > 256 * 1024:
+                    flag += " BIGGER"
+                if flag:
+                    regressions.append((size, stage, flag.strip()))
+            print(
+                f"{size:>8}  {stage:<26} {entry['seconds']:>9.4f} "
+                f"{(base['seconds'] * speed if base else float('nan')):>9.4f} "
+                f"{entry['peak_bytes'] / 1e6:>9.2f} {(base['peak_bytes'] / 1e6 if base else float('nan')):>9.2f}{flag}"
+            )
+
+    if update_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump({"calibration_seconds": calibration, "python": sys.version.split()[0], "results": measured},
+                      f, indent=2)
+        print(f"Baseline written to {baseline_path}")
+    elif not baseline:
+        print(f"No baseline at {baseline_path}; run with --update-baseline to record one.")
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond tolerance "
+              f"(time {time_tolerance:.0%}, memory {memory_tolerance:.0%}).")
+        sys.exit(1)
+
+def bench_regroup(count, max_rows_in_memory):
+    """
+    Check that spilling regrouping gives exactly the in-memory result, with
+    rows in scrape order and shuffled (a connection's rows spread over many
+    runs), and compare time and peak memory. Exits 1 on a mismatch.
+    """
+    scraped, redash_rows, _, _ = make_pipeline_inputs(count)
+    location_map = build_location_map(redash_rows)
+    rows = expand_records(scraped, process_location_fields([r["Locations"] for r in scraped]), location_map)
+    shuffled = list(rows)
+    random.Random(7).shuffle(shuffled)
+
+    def measure(func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - started
+        # Memory in a separate pass: tracemalloc slows everything down
+        tracemalloc.start()
+        try:
+            func(*args)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return result, elapsed, peak
+
+    def stream_matches(source, expected):
+        # Compare as the rows stream out, without keeping them, as a streaming caller would
+        streamed = iter_regrouped_locations(source, max_rows_in_memory)
+        return all(a == b for a, b in zip_longest(streamed, expected))
+
+    failed = False
+    for label, source in (("scrape order", rows), ("shuffled", shuffled)):
+        expected, memory_seconds, memory_peak = measure(regroup_and_merge_locations, source)
+        matches, spill_seconds, spill_peak = measure(stream_matches, source, expected)
+        failed = failed or not matches
+        print(f"{label}: {len(source)} rows -> {len(expected)} connections, "
+              f"{'identical' if matches else 'MISMATCH'}")
+        print(f"  in memory: {memory_seconds:.3f}s, peak {memory_peak / 1e6:.1f} MB")
+        print(f"  streaming, {max_rows_in_memory} rows in memory: {spill_seconds:.3f}s, peak {spill_peak / 1e6:.1f} MB")
+    if failed:
+        sys.exit(1)
+
+def test_fake(name):
+    """
+    Import one of the tests' fakes, e.g. "fake_dashboard" (tests/fake_dashboard.py).
+    """
+    tests_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests")
+    if tests_dir not in sys.path:
+        sys.path.insert(0, tests_dir)
+    return importlib.import_module(name)
+
+def dashboard_scraper(count, latency_seconds):
+    """
+    A page_queue scrape_item running main._scrape_work_item (the real page
+    loop) in a fake browser showing make_table(count), with 'latency_seconds'
+    per page load.
+    """
+    from main import _scrape_work_item
+
+    fake_dashboard = test_fake("fake_dashboard")
+
+    class SlowDashboard(fake_dashboard.FakeDashboard):
+        def load(self, url):
+            time.sleep(latency_seconds)
+            super().load(url)
+
+    driver = fake_dashboard.fake_driver(SlowDashboard(fake_dashboard.make_table(count)))
+    return lambda item: _scrape_work_item(driver, item)
+
+def queue_worker(queue_path, run_id, worker_id, faults, count, latency_ms):
+    """
+    A local worker process for bench_queue; 'faults' maps worker ids to "die" or "hang".
+    """
+    from page_queue import PageQueue, work_on_queue
+
+    fault = dict(entry.split("=") for entry in faults.split(",") if entry).get(worker_id)
+    scrape = dashboard_scraper(count, latency_ms / 1000)
+
+    def scrape_item(item):
+        if fault == "die":
+            os._exit(3)
+        if fault == "hang":
+            time.sleep(3600)
+        return scrape(item)
+
+    work_on_queue(PageQueue(queue_path), scrape_item, worker_id, run_id=run_id)
+
+def bench_queue(count, workers, latency_ms, page_size=50):
+    """
+    Scrape a fake dashboard's table through the page queue with local worker
+    processes (one of which dies and one hangs holding an item), each running
+    the real page loop against its own copy, and check the merged records
+    match the table. Exits 1 on a mismatch.
+    """
+    from page_queue import PageQueue, coordinate_run
+    from pagination import PagePlan
+
+    fake_dashboard = test_fake("fake_dashboard")
+    plan = PagePlan(fake_dashboard.BASE_URL, page_size, total_rows=count, page_param="page",
+                    size_param="pageSize", requested_size=page_size)
+    faults = "" if workers < 2 else f"{socket.gethostname()}-local1=die,{socket.gethostname()}-local2=hang"
+    with tempfile.TemporaryDirectory() as tmp:
+        queue_path = os.path.join(tmp, "queue.sqlite")
+        started = time.perf_counter()
+        records = coordinate_run(
+            PageQueue(queue_path),
+            plan,
+            dashboard_scraper(count, latency_ms / 1000),
+            worker_command=[sys.executable, os.path.abspath(__file__), "queue-worker", queue_path,
+                            "--faults", faults, "--rows", str(count), "--latency-ms", str(latency_ms)],
+            local_workers=workers,
+            pages_per_item=3,
+            lease_seconds=5,
+            poll_seconds=0.2,
+        )
+        elapsed = time.perf_counter() - started
+
+    matches = records == fake_dashboard.make_table(count)
+    print(f"{len(records)} records from {plan.total_pages} planned pages with {workers} worker(s) "
+          f"({faults or 'no faults'}) in {elapsed:.1f}s: {'identical to the table' if matches else 'MISMATCH'}")
+    if not matches:
+        sys.exit(1)
+
+def make_domain_rules(count, seed=1):
+    """
+    'count' excluded-domain rules (mostly exact, then *.suffix, .suffix and
+    a few wildcards) and the domains they were built from.
+    """
+    rng = random.Random(seed)
+    rules = []
+    domains = []
+    for i in range(count):
+        domain = f"portal{i}.{rng.choice(['dental', 'vision', 'health'])}{i % 97}.com"
+        domains.append(domain)
+        kind = rng.random()
+        if kind < 0.60:
+            rules.append(domain)
+        elif kind < 0.85:
+            rules.append("*." + domain.split(".", 1)[1])
+        elif kind < 0.95:
+            rules.append("." + domain)
+        else:
+            rules.append(f"portal{i}*.{domain.split('.', 1)[1]}")
+    return rules, domains
+
+def naive_excluded(domain, rules):
+    """
+    The straightforward way: try every rule in turn.
+    """
+    domain = domain.lower()
+    for rule in rules:
+        if rule.startswith("*.") and not any(c in rule[2:] for c in "*?["):
+            if domain.endswith(rule[1:]):
+                return True
+        elif rule.startswith("."):
+            if domain == rule[1:] or domain.endswith(rule):
+                return True
+        elif any(c in rule for c in "*?["):
+            if fnmatch.fnmatchcase(domain, rule):
+                return True
+        elif domain == rule:
+            return True
+    return False
+
+def bench_rules(count, rule_count, sample=2000):
+    """
+    Row filtering with compiled RowRules vs looping over the rule list per
+    row. The loop is timed on a sample of rows and scaled up (it is far too
+    slow for the whole set); both must agree on the sample.
+    """
+    rules, rule_domains = make_domain_rules(rule_count)
+    rng = random.Random(2)
+    other = [f"site{i}.example.org" for i in range(2000)]
+    rows = []
+    for i in range(count):
+        if rng.random() < 0.3:
+            domain = rng.choice(rule_domains)
+            domain = rng.choice([domain, "www." + domain, domain.split(".", 1)[1]])
+        else:
+            domain = rng.choice(other)
+        rows.append({"WebsiteId": domain, "Status": rng.choice(["auth_failed", "active"]), "practiceGroupName": ""})
+
+    started = time.perf_counter()
+    compiled = RowRules(excluded_domains=rules, target_statuses=["auth_failed", "locked"])
+    compile_seconds = time.perf_counter() - started
+
+    logging.disable(logging.CRITICAL)
+    started = time.perf_counter()
+    kept = filter_by_row_rules(rows, compiled)
+    compiled_seconds = time.perf_counter() - started
+
+    # Without the per-domain memo: every row goes through the trie/regex
+    unmemoized = DomainRules(rules)
+    started = time.perf_counter()
+    for row in rows:
+        unmemoized._match(row["WebsiteId"])
+    trie_seconds = time.perf_counter() - started
+
+    sampled = rows[:sample]
+    statuses = {"auth_failed", "locked"}
+    started = time.perf_counter()
+    naive_kept = [row for row in sampled if row["Status"] in statuses and not naive_excluded(row["WebsiteId"], rules)]
+    naive_seconds = (time.perf_counter() - started) * len(rows) / len(sampled)
+
+    matches = naive_kept == filter_by_row_rules(sampled, RowRules(excluded_domains=rules, target_statuses=statuses))
+    print(f"{len(rows)} rows, {len(rules)} rules; {len(kept)} rows kept; sample agrees: {matches}")
+    print(f"  compile:                 {compile_seconds * 1000:.1f} ms")
+    print(f"  compiled (memoized):     {compiled_seconds:.3f}s")
+    print(f"  compiled (no memo):      {trie_seconds:.3f}s")
+    print(f"  loop over rules (est.):  {naive_seconds:.1f}s ({naive_seconds / compiled_seconds:.0f}x slower)")
+    if not matches:
+        sys.exit(1)
+
+def bench_login(latency_ms):
+    """
+    scraper.log_in_over_http against the Auth0 stand-in (tests/fake_auth0.py):
+    a first login (both Universal Login forms), a second one reusing the
+    Auth0 session, then a wrong password and an unreachable server, which
+    must both return False (the UI-flow fallback) quickly. Exits 1 if any
+    case goes wrong. tests/test_http_login.py checks the same cases.
+    """
+    from auth0_login import get_session
+    from scraper import log_in_over_http
+
+    fake_auth0 = test_fake("fake_auth0")
+    server, stand_in = fake_auth0.start_stand_in("ops@example.com", "correct horse", latency_ms / 1000)
+    login_url = f"{stand_in.dashboard}/auth/login"
+    connections_url = f"{stand_in.dashboard}/connection"
+
+    with socket.socket() as closed:
+        closed.bind(("127.0.0.1", 0))
+        closed_port = closed.getsockname()[1]
+
+    cases = [
+        ("first login", "correct horse", login_url, True, True),
+        ("Auth0 session reused", "correct horse", login_url, True, False),
+        ("wrong password", "wrong", login_url, False, True),
+        ("server unreachable", "correct horse", f"http://127.0.0.1:{closed_port}/auth/login", False, True),
+    ]
+    failed = False
+    logging.disable(logging.CRITICAL)
+    for label, password, url, expected, fresh_session in cases:
+        if fresh_session:
+            get_session().cookies.clear()
+        browser = fake_auth0.StandInBrowser()
+        del stand_in.served[:]
+        started = time.perf_counter()
+        result = log_in_over_http(browser, stand_in.email, password, login_url=url,
+                                  connections_url=connections_url)
+        elapsed = time.perf_counter() - started
+        table_shown = bool(browser.find_elements(None, "table tbody tr"))
+        ok = result == expected and table_shown == expected
+        failed = failed or not ok
+        print(f"{label:22} {'logged in' if result else 'fell back':9} in {elapsed:.2f}s, "
+              f"{len(stand_in.served):2d} requests, table shown: {table_shown}"
+              f"{'' if ok else '  WRONG'}")
+    server.shutdown()
+    if failed:
+        sys.exit(1)
+
+def measure_import_time(module, repeat=5):
+    """
+    Import 'module' in fresh interpreters with -X importtime.
+    Returns (best cumulative microseconds, {imported module: cumulative us} from the best run);
+    the time is None if -X importtime never reported the module (e.g. it is
+    built in or already imported at interpreter startup). Raises
+    CalledProcessError if the import fails.
+    """
+    best_total = None
+    best_modules = {}
+    here = os.path.dirname(os.path.abspath(__file__))
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=here, capture_output=True, text=True, check=True,
+        )
+        modules = {}
+        total = None
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative, name = line.split("|")
+            if not cumulative.strip().isdigit():
+                continue  # the header line
+            modules[name.strip()] = int(cumulative)
+            if name.strip() == module:
+                total = int(cumulative)
+        if total is not None and (best_total is None or total < best_total):
+            best_total, best_modules = total, modules
+    return best_total, best_modules
+
+def bench_startup(modules, budget_ms):
+    """
+    Fail (exit 1) if importing any entry point takes longer than budget_ms.
+    """
+    failed = False
+    for module in modules:
+        try:
+            total_us, imported = measure_import_time(module)
+        except subprocess.CalledProcessError as e:
+            error = (e.stderr.strip().splitlines() or ["no output"])[-1]
+            print(f"import {module}: FAILED ({error})")
+            failed = True
+            continue
+        if total_us is None:
+            print(f"import {module}: NOT MEASURED (no -X importtime line for it; "
+                  f"built in or imported at interpreter startup?)")
+            failed = True
+            continue
+        total_ms = total_us / 1000.0
+        status = "ok" if total_ms <= budget_ms else "OVER BUDGET"
+        print(f"import {module}: {total_ms:.1f} ms (budget {budget_ms:.0f} ms) {status}")
+        if total_ms > budget_ms:
+            failed = True
+            heaviest = sorted(
+                ((us, name) for name, us in imported.items() if name != module),
+                reverse=True,
+            )[:10]
+            for us, name in heaviest:
+                print(f"    {us / 1000.0:8.1f} ms  {name}")
+    if failed:
+        sys.exit(1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    upload = commands.add_parser("upload", help="Sheets upload throughput against a fake API")
+    upload.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    upload.add_argument("--latency-ms", type=float, default=80.0)
+    upload.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+
+    startup = commands.add_parser("startup", help="Fail if importing the entry points exceeds a time budget")
+    startup.add_argument("--budget-ms", type=float, default=100.0)
+    startup.add_argument("--modules", nargs="+", default=["main", "main_new"])
+
+    locations = commands.add_parser("locations", help="Per-row vs batch location field parsing")
+    locations.add_argument("--rows", type=int, default=200000)
+    locations.add_argument("--distinct", type=int, default=3000)
+
+    pipeline = commands.add_parser("pipeline", help="Per-stage time/memory of the data pipeline vs a baseline")
+    pipeline.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+    pipeline.add_argument("--baseline", default=BASELINE_FILE)
+    pipeline.add_argument("--update-baseline", action="store_true")
+    pipeline.add_argument("--time-tolerance", type=float, default=0.30)
+    pipeline.add_argument("--memory-tolerance", type=float, default=0.15)
+
+    regroup = commands.add_parser("regroup", help="Check spilling regrouping against the in-memory path")
+    regroup.add_argument("--rows", type=int, default=100000, help="Scraped connections to generate")
+    regroup.add_argument("--max-rows-in-memory", type=int, default=20000)
+
+    queue = commands.add_parser("queue", help="Scrape a fake dashboard through the page queue with local workers")
+    queue.add_argument("--rows", type=int, default=1234)
+    queue.add_argument("--workers", type=int, default=4)
+    queue.add_argument("--latency-ms", type=float, default=300, help="Fake dashboard delay per page load")
+
+    rules = commands.add_parser("rules", help="Compiled status/domain rules vs a loop over the rule list")
+    rules.add_argument("--rows", type=int, default=200000)
+    rules.add_argument("--rules", type=int, default=5000)
+
+    login = commands.add_parser("login", help="HTTP login and its fallback against a local Auth0 stand-in")
+    login.add_argument("--latency-ms", type=float, default=50, help="Stand-in server delay per request")
+
+    # Started by bench_queue (through page_queue.coordinate_run), not by hand
+    queue_worker_command = commands.add_parser("queue-worker")
+    queue_worker_command.add_argument("queue_path")
+    queue_worker_command.add_argument("--run-id")
+    queue_worker_command.add_argument("--worker-id")
+    queue_worker_command.add_argument("--faults", default="")
+    queue_worker_command.add_argument("--rows", type=int, required=True)
+    queue_worker_command.add_argument("--latency-ms", type=float, default=0)
+
+    args = parser.parse_args()
+    if args.command == "upload":
+        bench_upload(args.rows, args.latency_ms, args.workers)
+    elif args.command == "startup":
+        bench_startup(args.modules, args.budget_ms)
+    elif args.command == "locations":
+        bench_locations(args.rows, args.distinct)
+    elif args.command == "pipeline":
+        bench_pipeline(args.sizes, args.baseline, args.update_baseline, args.time_tolerance, args.memory_tolerance)
+    elif args.command == "regroup":
+        bench_regroup(args.rows, args.max_rows_in_memory)
+    elif args.command == "queue":
+        bench_queue(args.rows, args.workers, args.latency_ms)
+    elif args.command == "rules":
+        bench_rules(args.rows, args.rules)
+    elif args.command == "login":
+        bench_login(args.latency_ms)
+    elif args.command == "queue-worker":
+        queue_worker(args.queue_path, args.run_id, args.worker_id, args.faults, args.rows, args.latency_ms)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,460 @@
+# browser_manager.py
+"""
+Lifecycle of the Chrome/chromedriver processes and profile folder for one run.
+
+BrowserManager.prepare() (before the browser starts):
+  - kills chrome/chromedriver processes left behind by runs that were killed
+    before driver.quit() could run,
+  - removes stale /tmp/chrome-profile-* folders,
+  - creates this run's profile from a template that keeps a warm HTTP cache,
+  - rotates chromedriver.log if it has grown past its cap.
+BrowserManager.watch() then polls the browser's process tree and kills it if
+it goes over the configured memory or CPU-time limit, and keeps the
+chromedriver log under its cap while the run is going.
+BrowserManager.close() (after driver.quit()) refreshes the template cache
+and deletes the profile.
+MemoryGuard restarts a browser that has grown too big between pages of a
+scrape, keeping the logged-in session, before the hard limit has to kill it.
+
+Process inspection uses /proc, so sweeping and limits only apply on Linux;
+elsewhere they are skipped and only the profile handling runs.
+"""
+
+import gzip
+import logging
+import os
+import shutil
+import signal
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import run_metrics
+from utils import writable_path
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PARENT = tempfile.gettempdir()
+PROFILE_PREFIX = "chrome-profile-"
+# Profiles not touched for this long, and not used by a running browser, are removed
+STALE_PROFILE_SECONDS = 30 * 60
+
+# Only the cache folders are kept in the template; cookies and logins are not
+PROFILE_TEMPLATE_DIR = writable_path("chrome_profile_template")
+TEMPLATE_PATHS = (
+    os.path.join("Default", "Cache"),
+    os.path.join("Default", "Code Cache"),
+    "GrShaderCache",
+    "ShaderCache",
+)
+TEMPLATE_MAX_AGE_SECONDS = 24 * 60 * 60
+DISK_CACHE_BYTES = 64 * 1024 * 1024
+
+CHROMEDRIVER_LOG = os.path.join(PROFILE_PARENT, "chromedriver.log")
+CHROMEDRIVER_LOG_BACKUPS = 3
+
+# Set in chromedriver's environment and inherited by every Chrome process it
+# starts, so a later run can tell whose processes they are
+OWNER_ENV = "TUUTHFAIRY_SCRAPER_PID"
+BROWSER_PROCESS_NAMES = ("chrome", "chromium", "chromedriver", "chromium-browse", "chrome_crashpad")
+
+WATCH_INTERVAL_SECONDS = 2.0
+KILL_GRACE_SECONDS = 5.0
+
+_HAS_PROC = os.path.isdir("/proc")
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+class BrowserManager:
+    """
+    Profile folder, chromedriver log and resource limits for one browser session.
+
+    Options (config.json):
+      browser_memory_limit_mb     - resident memory of the whole browser tree (default 3072, 0 = off)
+      browser_cpu_limit_seconds   - CPU time of the whole browser tree (default 3600, 0 = off)
+      chromedriver_log_max_mb     - size at which chromedriver.log is rotated (default 10)
+    """
+
+    def __init__(self, config, log_path=CHROMEDRIVER_LOG, template_dir=PROFILE_TEMPLATE_DIR):
+        self.memory_limit_bytes = config.get("browser_memory_limit_mb", 3072) * 1024 * 1024
+        self.cpu_limit_seconds = config.get("browser_cpu_limit_seconds", 3600)
+        self.log_max_bytes = config.get("chromedriver_log_max_mb", 10) * 1024 * 1024
+        self.log_path = log_path
+        self.template_dir = template_dir
+        self.profile_dir = None
+        self.limit_exceeded = None
+        self.peak_rss_bytes = 0
+        self._log_file = None
+        self._root_pid = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def tree_rss_bytes(self):
+        """
+        Resident memory of chromedriver and all browser processes under it (0 if unknown).
+        """
+        if not _HAS_PROC or self._root_pid is None:
+            return 0
+        return sum(_rss_bytes(pid) for pid in _process_tree(self._root_pid))
+
+    def prepare(self):
+        """
+        Clean up after earlier runs and create this run's profile folder.
+        """
+        kill_orphaned_browsers()
+        sweep_stale_profiles()
+
+        name = f"{PROFILE_PREFIX}{datetime.now().strftime('%Y%m%d%H%M%S')}-{os.getpid()}"
+        self.profile_dir = os.path.join(PROFILE_PARENT, name)
+        if os.path.isdir(self.template_dir):
+            shutil.copytree(self.template_dir, self.profile_dir)
+            logger.info("Created Chrome profile %s from template.", self.profile_dir)
+        else:
+            os.makedirs(self.profile_dir)
+            logger.info("Created empty Chrome profile %s (no template yet).", self.profile_dir)
+
+        if _file_size(self.log_path) > self.log_max_bytes:
+            _rotate_log(self.log_path)
+        self._log_file = open(self.log_path, "ab")
+        return self.profile_dir
+
+    def chrome_arguments(self):
+        return [
+            f"--user-data-dir={self.profile_dir}",
+            f"--disk-cache-size={DISK_CACHE_BYTES}",
+        ]
+
+    def service_kwargs(self):
+        """
+        Keyword arguments for selenium's chrome Service: log to our capped
+        file and tag the browser processes with this process's PID.
+        """
+        env = dict(os.environ)
+        env[OWNER_ENV] = str(os.getpid())
+        return {"log_output": self._log_file, "env": env}
+
+    def watch(self, chromedriver_pid):
+        """
+        Start enforcing the memory/CPU limits on chromedriver and everything under it.
+        """
+        self._root_pid = chromedriver_pid
+        if not _HAS_PROC:
+            return
+        self._thread = threading.Thread(target=self._watch_loop, name="browser-watchdog", daemon=True)
+        self._thread.start()
+
+    def _watch_loop(self):
+        while not self._stop.wait(WATCH_INTERVAL_SECONDS):
+            if _file_size(self.log_path) > self.log_max_bytes:
+                _rotate_log(self.log_path, truncate=True)
+
+            tree = _process_tree(self._root_pid)
+            if not tree:
+                return
+            rss = sum(_rss_bytes(pid) for pid in tree)
+            cpu = sum(_cpu_seconds(pid) for pid in tree)
+            self.peak_rss_bytes = max(self.peak_rss_bytes, rss)
+
+            if self.memory_limit_bytes and rss > self.memory_limit_bytes:
+                self.limit_exceeded = f"memory {rss / 1e6:.0f} MB > {self.memory_limit_bytes / 1e6:.0f} MB"
+            elif self.cpu_limit_seconds and cpu > self.cpu_limit_seconds:
+                self.limit_exceeded = f"CPU time {cpu:.0f}s > {self.cpu_limit_seconds}s"
+            if self.limit_exceeded:
+                # Kill the browsers but not chromedriver, so the next WebDriver
+                # command fails cleanly and the run is retried
+                logger.error("Browser over its limit (%s); killing it.", self.limit_exceeded)
+                run_metrics.incr("browser_limit_kills")
+                _terminate([pid for pid in tree if pid != self._root_pid])
+                return
+
+    def close(self):
+        """
+        Call after driver.quit(): stop watching, refresh the template cache and delete the profile.
+        """
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self._log_file:
+            self._log_file.close()
+        if self.peak_rss_bytes:
+            logger.info("Browser peak memory: %.0f MB.", self.peak_rss_bytes / 1e6)
+        if not self.profile_dir:
+            return
+        if not self.limit_exceeded and _age_seconds(self.template_dir) > TEMPLATE_MAX_AGE_SECONDS:
+            try:
+                self._refresh_template()
+            except OSError as exc:
+                logger.warning("Could not refresh Chrome profile template: %s", exc)
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+    def _refresh_template(self):
+        staging = f"{self.template_dir}.new"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        for relative in TEMPLATE_PATHS:
+            source = os.path.join(self.profile_dir, relative)
+            if os.path.isdir(source):
+                shutil.copytree(source, os.path.join(staging, relative))
+        old = f"{self.template_dir}.old"
+        if os.path.isdir(self.template_dir):
+            os.replace(self.template_dir, old)
+        os.replace(staging, self.template_dir)
+        shutil.rmtree(old, ignore_errors=True)
+        logger.info("Refreshed Chrome profile template %s.", self.template_dir)
+
+class MemoryGuard:
+    """
+    Recycles the browser mid-scrape when it gets too big.
+
+    The scraper calls should_recycle() between pages. Over a threshold,
+    recycle() saves the session cookies, quits the browser and calls
+    restart(cookies), which must return a new (driver, browser) that is
+    logged in and showing /connection. driver and browser always hold the
+    current pair, so the caller quits the right one at the end.
+
+    Options (config.json):
+      browser_recycle_rss_mb      - resident memory of the browser tree (default 1536, 0 = off);
+                                    keep it under browser_memory_limit_mb
+      browser_recycle_js_heap_mb  - JS heap used by the page, from CDP Performance.getMetrics
+                                    (default 512, 0 = off)
+      browser_recycle_max         - restarts per run (default 5)
+    """
+
+    def __init__(self, config, driver, browser, restart):
+        self.rss_limit_bytes = config.get("browser_recycle_rss_mb", 1536) * 1024 * 1024
+        self.js_heap_limit_bytes = config.get("browser_recycle_js_heap_mb", 512) * 1024 * 1024
+        self.max_recycles = config.get("browser_recycle_max", 5)
+        self.driver = driver
+        self.browser = browser
+        self.restart = restart
+        self.recycles = 0
+        self._enable_metrics()
+
+    def _enable_metrics(self):
+        try:
+            self.driver.execute_cdp_cmd("Performance.enable", {})
+            self._cdp = True
+        except Exception as exc:
+            # Not a Chromium driver, or CDP unavailable: only RSS is checked
+            logger.info("CDP performance metrics unavailable (%s); checking browser RSS only.", exc)
+            self._cdp = False
+
+    def js_heap_bytes(self):
+        if not self._cdp:
+            return 0
+        try:
+            metrics = self.driver.execute_cdp_cmd("Performance.getMetrics", {})["metrics"]
+        except Exception as exc:
+            logger.debug("Performance.getMetrics failed: %s", exc)
+            return 0
+        return int(next((m["value"] for m in metrics if m["name"] == "JSHeapUsedSize"), 0))
+
+    def should_recycle(self):
+        """
+        Reason the browser should be restarted now, or None.
+        """
+        if self.recycles >= self.max_recycles:
+            return None
+        if self.rss_limit_bytes:
+            rss = self.browser.tree_rss_bytes()
+            if rss > self.rss_limit_bytes:
+                return f"browser memory {rss / 1e6:.0f} MB > {self.rss_limit_bytes / 1e6:.0f} MB"
+        if self.js_heap_limit_bytes:
+            heap = self.js_heap_bytes()
+            if heap > self.js_heap_limit_bytes:
+                return f"JS heap {heap / 1e6:.0f} MB > {self.js_heap_limit_bytes / 1e6:.0f} MB"
+        return None
+
+    def recycle(self, reason=""):
+        """
+        Replace the browser with a fresh, logged-in one; returns the new driver.
+        """
+        logger.warning("Restarting the browser mid-scrape (%s).", reason or "requested")
+        run_metrics.incr("browser_recycles")
+        try:
+            cookies = self.driver.get_cookies()
+        except Exception as exc:
+            logger.warning("Could not save session cookies (%s); the new browser will log in again.", exc)
+            cookies = []
+        try:
+            self.driver.quit()
+        finally:
+            self.browser.close()
+        self.driver, self.browser = self.restart(cookies)
+        self.recycles += 1
+        self._enable_metrics()
+        return self.driver
+
+def kill_orphaned_browsers():
+    """
+    Kill chrome/chromedriver processes whose scraper process is gone, plus
+    browsers from older runs (no owner tag) that were re-parented to init.
+    """
+    if not _HAS_PROC:
+        return []
+    orphans = []
+    my_pid = os.getpid()
+    for pid in _all_pids():
+        owner = _owner_pid(pid)
+        if owner is not None:
+            if owner != my_pid and not _pid_alive(owner):
+                orphans.append(pid)
+        elif _is_browser(pid) and _parent_pid(pid) == 1 and PROFILE_PREFIX in _cmdline(pid):
+            orphans.append(pid)
+            orphans.extend(_process_tree(pid)[1:])
+    if orphans:
+        logger.warning("Killing %d orphaned browser process(es): %s", len(orphans), orphans)
+        run_metrics.incr("orphaned_browser_processes", len(orphans))
+        _terminate(orphans)
+    return orphans
+
+def sweep_stale_profiles(parent=PROFILE_PARENT, max_age_seconds=STALE_PROFILE_SECONDS):
+    """
+    Remove chrome-profile-* folders that are old and not in use by any browser.
+    """
+    in_use = set()
+    if _HAS_PROC:
+        for pid in _all_pids():
+            for arg in _cmdline(pid).split("\0"):
+                if arg.startswith("--user-data-dir="):
+                    in_use.add(os.path.abspath(arg.split("=", 1)[1]))
+    removed = 0
+    for name in os.listdir(parent):
+        path = os.path.join(parent, name)
+        if (
+            name.startswith(PROFILE_PREFIX)
+            and os.path.isdir(path)
+            and path not in in_use
+            and _age_seconds(path) > max_age_seconds
+        ):
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    if removed:
+        logger.info("Removed %d stale Chrome profile folder(s) from %s.", removed, parent)
+    return removed
+
+###################################################
+# /proc helpers
+###################################################
+
+def _all_pids():
+    return [int(name) for name in os.listdir("/proc") if name.isdigit()]
+
+def _read_proc(pid, name, mode="r"):
+    try:
+        with open(f"/proc/{pid}/{name}", mode) as f:
+            return f.read()
+    except OSError:
+        return b"" if "b" in mode else ""
+
+def _stat_fields(pid):
+    # Fields after "(comm)": state, ppid, ..., utime (11), stime (12), ..., rss (21)
+    stat = _read_proc(pid, "stat")
+    return stat[stat.rfind(")") + 2:].split() if stat else []
+
+def _parent_pid(pid):
+    fields = _stat_fields(pid)
+    return int(fields[1]) if fields else None
+
+def _rss_bytes(pid):
+    fields = _stat_fields(pid)
+    return int(fields[21]) * _PAGE_SIZE if fields else 0
+
+def _cpu_seconds(pid):
+    fields = _stat_fields(pid)
+    return (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS if fields else 0.0
+
+def _cmdline(pid):
+    return _read_proc(pid, "cmdline")
+
+def _is_browser(pid):
+    comm = _read_proc(pid, "comm").strip()
+    return any(comm.startswith(name) for name in BROWSER_PROCESS_NAMES)
+
+def _owner_pid(pid):
+    marker = f"{OWNER_ENV}=".encode()
+    for entry in _read_proc(pid, "environ", "rb").split(b"\0"):
+        if entry.startswith(marker):
+            try:
+                return int(entry[len(marker):])
+            except ValueError:
+                return None
+    return None
+
+def _process_tree(root_pid):
+    """
+    root_pid followed by all of its live descendants.
+    """
+    children = {}
+    for pid in _all_pids():
+        parent = _parent_pid(pid)
+        if parent is not None:
+            children.setdefault(parent, []).append(pid)
+    if not _pid_alive(root_pid):
+        return []
+    tree = [root_pid]
+    for pid in tree:
+        tree.extend(children.get(pid, []))
+    return tree
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    # Exited but not yet reaped by its parent
+    fields = _stat_fields(pid) if _HAS_PROC else None
+    return not (fields and fields[0] == "Z")
+
+def _terminate(pids):
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        for pid in pids:
+            try:
+                os.kill(pid, sig)
+            except OSError:
+                pass
+        deadline = time.monotonic() + KILL_GRACE_SECONDS
+        while time.monotonic() < deadline and any(_pid_alive(pid) for pid in pids):
+            time.sleep(0.2)
+        pids = [pid for pid in pids if _pid_alive(pid)]
+        if not pids:
+            return
+
+###################################################
+# Files
+###################################################
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def _age_seconds(path):
+    try:
+        return time.time() - os.path.getmtime(path)
+    except OSError:
+        return float("inf")
+
+def _rotate_log(path, truncate=False):
+    """
+    Shift path.1.gz .. path.N.gz and gzip the current log into path.1.gz.
+    With truncate=True the file is emptied in place (the writer keeps its
+    O_APPEND handle); otherwise it is removed.
+    """
+    for i in range(CHROMEDRIVER_LOG_BACKUPS - 1, 0, -1):
+        source = f"{path}.{i}.gz"
+        if os.path.exists(source):
+            os.replace(source, f"{path}.{i + 1}.gz")
+    try:
+        with open(path, "rb") as f_in, gzip.open(f"{path}.1.gz", "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        if truncate:
+            os.truncate(path, 0)
+        else:
+            os.remove(path)
+    except OSError as exc:
+        logger.warning("Could not rotate %s: %s", path, exc)
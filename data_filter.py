@@ -1,9 +1,34 @@
 # data_filter.py
 
+import fnmatch
+import heapq
+import json
 import logging
+import os
+import re
+import tempfile
+from contextlib import ExitStack
+from itertools import groupby
+
+from location_helpers import iter_expanded_records
 
 logger = logging.getLogger(__name__)
 
+# Rows (connection + location pairs) the regrouping keeps in memory before
+# spilling a sorted run to disk; see iter_regrouped_locations()
+REGROUP_MAX_ROWS_IN_MEMORY = 1000000
+# Spilled runs merged at once; more are merged in several passes
+REGROUP_MAX_OPEN_RUNS = 64
+
+# Used when config.json has no excluded_domains / target_statuses
+DEFAULT_EXCLUDED_DOMAINS = ("unumdentalpwp.skygenusasystems.com",)
+DEFAULT_TARGET_STATUSES = ("auth_failed",)
+
+# Per-connection fields taken from its first row
+_CONNECTION_FIELDS = (
+    "ID", "WebsiteId", "Username", "Status", "LastUpdated", "practiceGroupId", "practiceGroupName",
+)
+
 def filter_by_practice_groups(expanded_data, valid_practice_groups):
     """
     Filter the list of expanded data rows to only include rows whose
@@ -50,17 +75,192 @@ def exclude_websites(rows, excluded_sites):
     )
     return filtered
 
-def regroup_and_merge_locations(rows):
+class DomainRules:
+    """
+    A set of domain rules compiled for fast matching:
+      - "portal.example.com"   only that domain,
+      - "*.example.com"        any subdomain of example.com (not example.com itself),
+      - ".example.com"         example.com and any subdomain,
+      - other patterns with *, ? or [...] (e.g. "portal*.example.com") are
+        shell-style wildcards over the whole domain.
+    Matching is case-insensitive. Exact and suffix rules go into a trie keyed
+    by the domain's labels in reverse (com -> example -> portal), so a lookup
+    costs one step per label however many rules there are; the remaining
+    wildcards are combined into one regex. Results are memoized per domain.
+    """
+
+    # Trie node markers: the domain itself / any subdomain matches
+    _EXACT = ""
+    _SUBDOMAINS = "*"
+
+    def __init__(self, patterns=()):
+        self.patterns = sorted({pattern.strip().lower().rstrip(".") for pattern in patterns if pattern.strip()})
+        self._trie = {}
+        wildcards = []
+        for pattern in self.patterns:
+            if pattern.startswith("*.") and not _has_wildcard(pattern[2:]):
+                self._insert(pattern[2:], self._SUBDOMAINS)
+            elif pattern.startswith(".") and not _has_wildcard(pattern[1:]):
+                self._insert(pattern[1:], self._EXACT)
+                self._insert(pattern[1:], self._SUBDOMAINS)
+            elif _has_wildcard(pattern):
+                wildcards.append(fnmatch.translate(pattern))
+            else:
+                self._insert(pattern, self._EXACT)
+        self._wildcard = re.compile("|".join(wildcards)) if wildcards else None
+        self._memo = {}
+
+    def _insert(self, domain, marker):
+        node = self._trie
+        for label in reversed(domain.split(".")):
+            node = node.setdefault(label, {})
+        node[marker] = True
+
+    def matches(self, domain):
+        result = self._memo.get(domain)
+        if result is None:
+            result = self._memo[domain] = self._match(domain)
+        return result
+
+    def _match(self, domain):
+        normalized = domain.strip().lower().rstrip(".")
+        node = self._trie
+        labels = normalized.split(".")
+        for depth, label in enumerate(reversed(labels), 1):
+            node = node.get(label)
+            if node is None:
+                break
+            if depth < len(labels) and self._SUBDOMAINS in node:
+                return True
+        else:
+            if self._EXACT in node:
+                return True
+        return bool(self._wildcard and self._wildcard.match(normalized))
+
+def _has_wildcard(pattern):
+    return any(char in pattern for char in "*?[")
+
+class RowRules:
+    """
+    Which rows a run keeps: a target Status and a WebsiteId that isn't
+    excluded. Compiled once per run from config.json:
+
+      "excluded_domains": ["unumdentalpwp.skygenusasystems.com", "*.example.com"],
+      "target_statuses": ["auth_failed"],
+      "practice_group_rules": {
+          "Some Practice Group": {"excluded_domains": [...], "target_statuses": [...]}
+      }
+
+    A practice group entry replaces the corresponding global list for rows
+    of that group (matched like filter_by_practice_groups, ignoring case and
+    surrounding spaces).
+    """
+
+    def __init__(self, excluded_domains=DEFAULT_EXCLUDED_DOMAINS, target_statuses=DEFAULT_TARGET_STATUSES,
+                 practice_group_rules=None):
+        self.domains = DomainRules(excluded_domains)
+        self.statuses = frozenset(status.strip() for status in target_statuses)
+        self.group_rules = {}
+        for group, rules in (practice_group_rules or {}).items():
+            self.group_rules[group.strip().lower()] = (
+                DomainRules(rules["excluded_domains"]) if "excluded_domains" in rules else self.domains,
+                frozenset(s.strip() for s in rules["target_statuses"]) if "target_statuses" in rules else self.statuses,
+            )
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            excluded_domains=config.get("excluded_domains", DEFAULT_EXCLUDED_DOMAINS),
+            target_statuses=config.get("target_statuses", DEFAULT_TARGET_STATUSES),
+            practice_group_rules=config.get("practice_group_rules"),
+        )
+
+    def signature(self):
+        """
+        Canonical text of the rules, e.g. for run_fingerprint.
+        """
+        return json.dumps({
+            "excluded_domains": self.domains.patterns,
+            "target_statuses": sorted(self.statuses),
+            "practice_group_rules": {
+                group: {"excluded_domains": domains.patterns, "target_statuses": sorted(statuses)}
+                for group, (domains, statuses) in sorted(self.group_rules.items())
+            },
+        }, sort_keys=True)
+
+    def keep(self, row):
+        domains, statuses = self.domains, self.statuses
+        if self.group_rules:
+            group = self.group_rules.get(row.get("practiceGroupName", "").strip().lower())
+            if group is not None:
+                domains, statuses = group
+        return row["Status"] in statuses and not domains.matches(row["WebsiteId"])
+
+def filter_by_row_rules(rows, rules):
+    """
+    Keep rows with a target status whose website isn't excluded (see RowRules);
+    with the default rules, the same as filter_auth_failed + exclude_websites.
+    """
+    logger.info("Filtering by row rules: %s", rules.signature())
+    if rules.group_rules:
+        filtered = [row for row in rows if rules.keep(row)]
+    else:
+        # No per-group overrides: one status set and one (memoized) domain lookup per row
+        statuses, excluded = rules.statuses, rules.domains.matches
+        filtered = [row for row in rows if row["Status"] in statuses and not excluded(row["WebsiteId"])]
+    logger.info(
+        "filter_by_row_rules: %d rows in, %d rows out",
+        len(rows), len(filtered)
+    )
+    return filtered
+
+def iter_filtered_rows(rows, valid_practice_groups, rules):
+    """
+    Streaming filter_by_practice_groups + filter_by_row_rules: yields the rows
+    both would keep, in order, without building either list. 'rows' can be
+    any iterable.
+    """
+    normalized_set = {pg.strip().lower() for pg in valid_practice_groups}
+    rows_in = rows_out = 0
+    for row in rows:
+        rows_in += 1
+        if row.get("practiceGroupName", "").strip().lower() in normalized_set and rules.keep(row):
+            rows_out += 1
+            yield row
+    logger.info("iter_filtered_rows: %d rows in, %d rows out", rows_in, rows_out)
+
+def build_output_rows(records, location_map, valid_practice_groups, rules,
+                      max_rows_in_memory=REGROUP_MAX_ROWS_IN_MEMORY, spill_dir=None):
+    """
+    The rows for history and Google Sheets: one row per (connection, location)
+    of the parsed records, filtered by practice group and row rules, then
+    regrouped per connection. It all runs as one stream, so the expanded and
+    filtered rows are never held in memory as lists.
+    """
+    expanded = iter_expanded_records(records, location_map)
+    return regroup_and_merge_locations(
+        iter_filtered_rows(expanded, valid_practice_groups, rules), max_rows_in_memory, spill_dir
+    )
+
+def regroup_and_merge_locations(rows, max_rows_in_memory=None, spill_dir=None):
     """
-    Given a list of rows (each representing a single location for a connection),
+    Given rows (any iterable, each representing a single location for a connection),
     group them by the connection 'ID' and merge the locationIds.
 
     Each connection (ID) appears only once and the locationIds are concatenated.
+    With max_rows_in_memory, grouping spills to disk past that many rows
+    (see iter_regrouped_locations); the result is the same.
     """
-    logger.info("Regrouping and merging locationIds across %d rows.", len(rows))
+    if max_rows_in_memory is not None:
+        merged_data = list(iter_regrouped_locations(rows, max_rows_in_memory, spill_dir))
+        logger.info("Finished regroup_and_merge_locations: %d unique connections.", len(merged_data))
+        return merged_data
+
     grouped = {}
+    rows_in = 0
 
     for row in rows:
+        rows_in += 1
         conn_id = row["ID"]
         if conn_id not in grouped:
             grouped[conn_id] = {
@@ -76,6 +276,7 @@ def regroup_and_merge_locations(rows):
         # Append the locationId if it exists
         if row.get("locationId"):
             grouped[conn_id]["locationIds"].append(row["locationId"])
+    logger.info("Regrouping and merging locationIds across %d rows.", rows_in)
 
     merged_data = []
     for conn_id, agg in grouped.items():
@@ -92,4 +293,121 @@ def regroup_and_merge_locations(rows):
         })
 
     logger.info("Finished regroup_and_merge_locations: %d unique connections.", len(merged_data))
-    return merged_data
\ No newline at end of file
+    return merged_data
+
+def iter_regrouped_locations(rows, max_rows_in_memory=REGROUP_MAX_ROWS_IN_MEMORY, spill_dir=None):
+    """
+    Streaming, bounded-memory regroup_and_merge_locations: yields the same
+    merged rows in the same order (connections in first-seen order, their
+    locationIds ", "-joined in input order). 'rows' can be any iterable.
+
+    Up to max_rows_in_memory rows are grouped in memory. Past that, groups
+    are written to temporary files (in spill_dir, default the system temp
+    dir) as runs sorted by ID, the runs are merged to combine each
+    connection's locations, and the combined connections are sorted back
+    into first-seen order the same way before being yielded.
+    """
+    with tempfile.TemporaryDirectory(prefix="regroup_", dir=spill_dir) as tmp:
+        grouped = {}
+        buffered = 0
+        runs = []
+        for seq, row in enumerate(rows):
+            conn_id = row["ID"]
+            group = grouped.get(conn_id)
+            if group is None:
+                # [ID, first-seen position, connection fields, locationIds]
+                group = grouped[conn_id] = [conn_id, seq, [row[field] for field in _CONNECTION_FIELDS], []]
+            if row.get("locationId"):
+                group[3].append(row["locationId"])
+            buffered += 1
+            if buffered >= max_rows_in_memory:
+                runs.append(_write_run(tmp, sorted(grouped.values(), key=_by_id)))
+                grouped = {}
+                buffered = 0
+
+        if not runs:
+            for group in grouped.values():
+                yield _merged_row(group)
+            return
+
+        if grouped:
+            runs.append(_write_run(tmp, sorted(grouped.values(), key=_by_id)))
+        del grouped
+        logger.info("regroup: spilled %d sorted runs to %s", len(runs), tmp)
+
+        # Combine each connection's groups across runs, then sort the
+        # connections back into first-seen order, again spilling if needed
+        connections = _merge_runs(tmp, runs, _by_id, _combine_groups)
+        ordered = []
+        buffered = 0
+        runs = []
+        for group in connections:
+            ordered.append(group)
+            buffered += 1 + len(group[3])
+            if buffered >= max_rows_in_memory:
+                runs.append(_write_run(tmp, sorted(ordered, key=_by_first_seen)))
+                ordered = []
+                buffered = 0
+        if runs:
+            if ordered:
+                runs.append(_write_run(tmp, sorted(ordered, key=_by_first_seen)))
+            ordered = _merge_runs(tmp, runs, _by_first_seen)
+        else:
+            ordered.sort(key=_by_first_seen)
+        for group in ordered:
+            yield _merged_row(group)
+
+def _by_id(group):
+    return group[0]
+
+def _by_first_seen(group):
+    return group[1]
+
+def _combine_groups(groups):
+    # Runs are merged in input order, so the first group has the first-seen
+    # position and fields, and locations concatenate in input order
+    first = groups[0]
+    if len(groups) == 1:
+        return first
+    return [first[0], first[1], first[2], [loc for group in groups for loc in group[3]]]
+
+def _merged_row(group):
+    merged = dict(zip(_CONNECTION_FIELDS, group[2]))
+    merged["locationId"] = ", ".join(group[3])
+    return merged
+
+def _write_run(directory, groups):
+    fd, path = tempfile.mkstemp(suffix=".jsonl", dir=directory)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        for group in groups:
+            f.write(json.dumps(group, separators=(",", ":")) + "\n")
+    return path
+
+def _read_run(f):
+    for line in f:
+        yield json.loads(line)
+
+def _merge_runs(directory, paths, key, combine=None):
+    """
+    Merge sorted runs into one sorted stream (deleting them as it goes),
+    applying 'combine' to each set of groups with the same key.
+    """
+    while len(paths) > REGROUP_MAX_OPEN_RUNS:
+        paths = [
+            _write_run(directory, _merge_stream(paths[start:start + REGROUP_MAX_OPEN_RUNS], key, combine))
+            for start in range(0, len(paths), REGROUP_MAX_OPEN_RUNS)
+        ]
+    return _merge_stream(paths, key, combine)
+
+def _merge_stream(paths, key, combine):
+    with ExitStack() as stack:
+        runs = [_read_run(stack.enter_context(open(path, "r", encoding="utf-8"))) for path in paths]
+        # heapq.merge is stable, so groups with equal keys come out in run order
+        merged = heapq.merge(*runs, key=key)
+        if combine is None:
+            yield from merged
+        else:
+            for _, groups in groupby(merged, key=key):
+                yield combine(list(groups))
+    for path in paths:
+        os.remove(path)
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# driver_trace.py
+"""
+Trace every WebDriver command (find_elements, .text, page_source, screenshots, ...)
+that the scraper sends to chromedriver.
+
+Each command becomes one JSON line in the trace file:
+    {"t": 12.345, "cmd": "getElementText", "site": "scraper.py:259 _scrape_row_with_retry",
+     "ms": 4.1, "req": 58, "resp": 17, "ok": true}
+
+Usage:
+    python driver_trace.py summary driver_traces/trace_XXXX.jsonl
+    python driver_trace.py timeline driver_traces/trace_XXXX.jsonl timeline.json
+The timeline file opens in chrome://tracing or https://ui.perfetto.dev.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+import run_metrics
+from utils import writable_path
+
+logger = logging.getLogger(__name__)
+
+TRACE_DIR = writable_path("driver_traces")
+
+# Frames from these files are never reported as the caller of a command
+_SKIP_PATH_PARTS = (
+    os.sep + "selenium" + os.sep,
+    os.path.basename(__file__),
+)
+
+class DriverTracer:
+    """
+    Wraps driver.execute so every WebDriver round trip is recorded.
+
+    WebElement methods call back into their parent driver's execute(), so
+    element commands (.text, find_elements on a row, click) are traced too.
+    """
+
+    def __init__(self, driver, trace_path):
+        self.driver = driver
+        self.trace_path = trace_path
+        self._original_execute = driver.execute
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(trace_path) or ".", exist_ok=True)
+        self._file = open(trace_path, "w", encoding="utf-8")
+        driver.execute = self._traced_execute
+
+    def _traced_execute(self, driver_command, params=None):
+        site = _caller_site()
+        request_bytes = _payload_size(params)
+        start = time.perf_counter()
+        ok = True
+        response = None
+        try:
+            response = self._original_execute(driver_command, params)
+            return response
+        except Exception:
+            ok = False
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            entry = {
+                "t": round(start - self._t0, 4),
+                "cmd": driver_command,
+                "site": site,
+                "ms": round(elapsed_ms, 2),
+                "req": request_bytes,
+                "resp": _payload_size(response.get("value")) if response else 0,
+                "ok": ok,
+            }
+            line = json.dumps(entry, separators=(",", ":"))
+            with self._lock:
+                if not self._file.closed:
+                    self._file.write(line + "\n")
+            run_metrics.incr("webdriver_commands")
+
+    def attach(self, driver):
+        """
+        Trace 'driver' from now on instead, e.g. the browser MemoryGuard restarted.
+        """
+        self.driver.execute = self._original_execute
+        self.driver = driver
+        self._original_execute = driver.execute
+        driver.execute = self._traced_execute
+
+    def close(self):
+        """
+        Stop tracing, flush the file and log the chattiest call sites.
+        """
+        self.driver.execute = self._original_execute
+        with self._lock:
+            self._file.close()
+        logger.info("WebDriver trace written to %s", self.trace_path)
+        for row in summarize_trace(self.trace_path)[:5]:
+            logger.info(
+                "WebDriver calls from %s: %d commands, %.0f ms, %d bytes returned.",
+                row["site"], row["count"], row["ms"], row["resp"]
+            )
+
+def trace_driver(driver, run_id=None, trace_dir=TRACE_DIR):
+    """
+    Start tracing 'driver' into trace_dir/trace_<run_id>.jsonl and return the tracer.
+    """
+    run_id = run_id or run_metrics.current().run_id
+    return DriverTracer(driver, os.path.join(trace_dir, f"trace_{run_id}.jsonl"))
+
+def read_trace(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def summarize_trace(path):
+    """
+    Aggregate a trace per call site, most expensive first.
+    Each row: site, count, ms, req, resp, commands ({command name: count}).
+    """
+    sites = {}
+    for entry in read_trace(path):
+        row = sites.setdefault(entry["site"], {
+            "site": entry["site"], "count": 0, "ms": 0.0, "req": 0, "resp": 0, "commands": {},
+        })
+        row["count"] += 1
+        row["ms"] += entry["ms"]
+        row["req"] += entry["req"]
+        row["resp"] += entry["resp"]
+        row["commands"][entry["cmd"]] = row["commands"].get(entry["cmd"], 0) + 1
+    return sorted(sites.values(), key=lambda row: row["ms"], reverse=True)
+
+def to_timeline(path, out_path):
+    """
+    Convert a trace into Chrome trace-event JSON for a timeline view.
+    """
+    events = []
+    for entry in read_trace(path):
+        events.append({
+            "name": entry["cmd"],
+            "cat": entry["site"],
+            "ph": "X",
+            "ts": entry["t"] * 1e6,
+            "dur": entry["ms"] * 1e3,
+            "pid": 1,
+            "tid": 1,
+            "args": {"site": entry["site"], "req": entry["req"], "resp": entry["resp"], "ok": entry["ok"]},
+        })
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events}, f)
+
+def _caller_site():
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not any(part in filename for part in _SKIP_PATH_PARTS):
+            return f"{os.path.basename(filename)}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+def _payload_size(value):
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value)
+    try:
+        return len(json.dumps(value, default=str, separators=(",", ":")))
+    except (TypeError, ValueError):
+        return 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    summary = commands.add_parser("summary", help="Per-call-site totals")
+    summary.add_argument("trace")
+    timeline = commands.add_parser("timeline", help="Export a chrome://tracing timeline")
+    timeline.add_argument("trace")
+    timeline.add_argument("out")
+    args = parser.parse_args()
+
+    if args.command == "summary":
+        rows = summarize_trace(args.trace)
+        print(f"{'calls':>7} {'ms':>10} {'resp bytes':>12}  site / commands")
+        for row in rows:
+            commands_text = ", ".join(f"{name} x{n}" for name, n in sorted(row["commands"].items()))
+            print(f"{row['count']:>7} {row['ms']:>10.0f} {row['resp']:>12}  {row['site']}")
+            print(f"{'':>32}{commands_text}")
+        print(f"{sum(r['count'] for r in rows):>7} {sum(r['ms'] for r in rows):>10.0f} "
+              f"{sum(r['resp'] for r in rows):>12}  TOTAL")
+    else:
+        to_timeline(args.trace, args.out)
+        print(f"Wrote {args.out}")
+
+if __name__ == "__main__":
+    main()
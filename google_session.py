@@ -0,0 +1,158 @@
+# google_session.py
+
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+import gspread
+from google.auth.transport.requests import Request
+from google.oauth2.service_account import Credentials
+from gspread.exceptions import SpreadsheetNotFound
+
+from sheets_io import SheetsIO, DEFAULT_REQUESTS_PER_MINUTE
+from utils import read_json_file, write_json_file
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# OAuth access token for the service account, reused until shortly before it expires
+TOKEN_CACHE_FILE = os.path.join(BASE_DIR, "google_token_cache.json")
+# Spreadsheet name -> key, so we only search Drive by name once
+SPREADSHEET_KEY_CACHE_FILE = os.path.join(BASE_DIR, "spreadsheet_keys.json")
+
+SCOPES = [
+    "https://www.googleapis.com/auth/drive",
+    "https://www.googleapis.com/auth/spreadsheets",
+]
+
+# Treat a cached token as expired this long before it really is
+TOKEN_EXPIRY_MARGIN = timedelta(minutes=5)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def get_google_session(service_account_file):
+    """
+    Return the process-wide GoogleSession for this service account,
+    creating it on first use.
+    """
+    key = os.path.abspath(service_account_file)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = GoogleSession(service_account_file)
+            _sessions[key] = session
+        return session
+
+class GoogleSession:
+    """
+    One authorized gspread client per process.
+
+      - The access token is cached on disk and reused until it expires,
+        so a new process does not have to re-authorize.
+      - Spreadsheet name -> key resolution is cached on disk, so the Drive
+        search by name only happens the first time.
+      - Opened spreadsheets (and their SheetsIO, which holds the worksheet
+        handles) are kept for the life of the process, so retries and later
+        runs skip those round trips entirely.
+    """
+
+    def __init__(
+        self,
+        service_account_file,
+        token_cache_path=TOKEN_CACHE_FILE,
+        key_cache_path=SPREADSHEET_KEY_CACHE_FILE,
+    ):
+        self.service_account_file = service_account_file
+        self.token_cache_path = token_cache_path
+        self.key_cache_path = key_cache_path
+        self.credentials = Credentials.from_service_account_file(
+            service_account_file, scopes=SCOPES
+        )
+        self._client = None
+        self._sheets_io = {}
+        self._lock = threading.RLock()
+        self._load_cached_token()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._ensure_token()
+                self._client = gspread.authorize(self.credentials)
+            return self._client
+
+    def open_sheets_io(self, spreadsheet_name, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE):
+        """
+        Return the cached SheetsIO for a spreadsheet, opening it on first use.
+        """
+        with self._lock:
+            self._ensure_token()
+            sheets_io = self._sheets_io.get(spreadsheet_name)
+            if sheets_io is None:
+                spreadsheet = self._open_spreadsheet(spreadsheet_name)
+                sheets_io = SheetsIO(spreadsheet, requests_per_minute=requests_per_minute)
+                self._sheets_io[spreadsheet_name] = sheets_io
+            return sheets_io
+
+    def _open_spreadsheet(self, spreadsheet_name):
+        keys = read_json_file(self.key_cache_path)
+        cached_key = keys.get(spreadsheet_name)
+
+        if cached_key:
+            try:
+                spreadsheet = self.client.open_by_key(cached_key)
+                logger.info("Opened spreadsheet '%s' by cached key.", spreadsheet_name)
+                return spreadsheet
+            except SpreadsheetNotFound:
+                logger.warning(
+                    "Cached key for spreadsheet '%s' no longer works; searching Drive by name.",
+                    spreadsheet_name
+                )
+
+        spreadsheet = self.client.open(spreadsheet_name)
+        keys[spreadsheet_name] = spreadsheet.id
+        write_json_file(self.key_cache_path, keys, file_mode=0o600)
+        logger.info("Resolved spreadsheet '%s' to key %s and cached it.", spreadsheet_name, spreadsheet.id)
+        return spreadsheet
+
+    def _ensure_token(self):
+        """
+        Refresh the access token if needed and persist it for the next process.
+        """
+        if self.credentials.valid and not self._expires_soon(self.credentials.expiry):
+            return
+        self.credentials.refresh(Request())
+        logger.info("Refreshed Google access token (expires %s UTC).", self.credentials.expiry)
+        # Owner-only: the file holds a live access token
+        token = {
+            "service_account_email": self.credentials.service_account_email,
+            "token": self.credentials.token,
+            "expiry": self.credentials.expiry.isoformat(),
+        }
+        write_json_file(self.token_cache_path, token, file_mode=0o600)
+
+    def _load_cached_token(self):
+        cached = read_json_file(self.token_cache_path)
+        if cached.get("service_account_email") != self.credentials.service_account_email:
+            return
+        try:
+            expiry = datetime.fromisoformat(cached["expiry"])
+        except (KeyError, TypeError, ValueError):
+            return
+        if self._expires_soon(expiry):
+            return
+
+        # google-auth keeps expiry as a naive UTC datetime
+        self.credentials.token = cached["token"]
+        self.credentials.expiry = expiry
+        logger.info("Reusing cached Google access token (expires %s UTC).", expiry)
+
+    @staticmethod
+    def _expires_soon(expiry):
+        if expiry is None:
+            return True
+        # expiry is naive UTC, as google-auth keeps it
+        return expiry - TOKEN_EXPIRY_MARGIN <= datetime.now(timezone.utc).replace(tzinfo=None)
@@ -1,12 +1,60 @@
 # google_sheets.py
 
 import gspread
+import requests
+from gspread.exceptions import APIError
+from gspread.utils import absolute_range_name, rowcol_to_a1
+from google.auth.exceptions import GoogleAuthError
 from google.oauth2.service_account import Credentials
+import hashlib
 import logging
-from datetime import datetime
+import os
+import re
+import threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+
+from google_session import get_google_session
+from sheets_io import SheetsIO, DEFAULT_REQUESTS_PER_MINUTE
+from utils import read_json_file, write_json_file
 
 logger = logging.getLogger(__name__)
 
+SHEET_HEADER = [
+    "Connection Link",
+    "WebsiteId",
+    "Username",
+    "Status",
+    "locationId",
+    "LastUpdated",
+    "practiceGroupId",
+    "practiceGroupName",
+    "FetchedAt"
+]
+
+CONNECTION_BASE_URL = "https://dashboard.tuuthfairy.com/connection/"
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Local copy of the parsed "Run" practice groups, reused while the sheet is unchanged
+PRACTICE_GROUPS_CACHE_FILE = os.path.join(BASE_DIR, "practice_groups_cache.json")
+# Re-download at least this often, even if the sheet looks unchanged
+PRACTICE_GROUPS_MAX_CACHE_AGE = timedelta(hours=24)
+# Errors that mean Google couldn't be reached (as opposed to e.g. a missing spreadsheet)
+GOOGLE_UNREACHABLE_ERRORS = (APIError, GoogleAuthError, requests.exceptions.RequestException)
+
+# Streaming uploads: rows per chunk, rough request-size cap per chunk, and parallel writers
+# A cell written USER_ENTERED with text like this holds a number
+_NUMBER_PATTERN = re.compile(r"[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?")
+
+UPLOAD_CHUNK_ROWS = 2000
+UPLOAD_CHUNK_MAX_BYTES = 2 * 1024 * 1024
+UPLOAD_WORKERS = 4
+# Which chunks of an in-progress streaming upload have been acknowledged
+UPLOAD_CHECKPOINT_FILE = os.path.join(BASE_DIR, "upload_checkpoint.json")
+
 def setup_google_sheets_client(service_account_file, sheet_name, worksheet_name="auth_failed"):
     """
     Sets up the Google Sheets client and returns the specified worksheet.
@@ -16,7 +64,190 @@ def setup_google_sheets_client(service_account_file, sheet_name, worksheet_name=
     worksheet = spreadsheet.worksheet(worksheet_name)
     return worksheet
 
-def upload_data_to_google_sheets(worksheet, data, practice_group_count=None):
+def open_sheets_io(service_account_file, sheet_name, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE):
+    """
+    Return the SheetsIO that the run uses for every read and write.
+
+    The client, spreadsheet and worksheet handles come from the process-wide
+    GoogleSession, so only the first run in a process pays for authorizing
+    and opening the spreadsheet. Call stats start fresh for each run.
+    """
+    session = get_google_session(service_account_file)
+    sheets_io = session.open_sheets_io(sheet_name, requests_per_minute=requests_per_minute)
+    sheets_io.reset_stats()
+    return sheets_io
+
+def open_practice_groups(
+    service_account_file,
+    sheet_name,
+    practice_list_tab="Tuuthfairy Groups",
+    requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+    cache_path=PRACTICE_GROUPS_CACHE_FILE,
+):
+    """
+    Open the run's SheetsIO and load the practice groups marked "Run".
+
+    Returns (sheets_io, groups). If Google can't be reached even to open the
+    spreadsheet, the groups come from the local cache and sheets_io is None;
+    the caller opens the spreadsheet again when it needs to upload.
+    """
+    try:
+        sheets_io = open_sheets_io(service_account_file, sheet_name, requests_per_minute=requests_per_minute)
+    except GOOGLE_UNREACHABLE_ERRORS as exc:
+        cache = read_json_file(cache_path)
+        if (
+            cache.get("spreadsheet_name") != sheet_name
+            or _read_practice_groups_cache(cache_path, cache.get("spreadsheet_id"), practice_list_tab) is None
+        ):
+            raise
+        return None, _use_cached_practice_groups(cache, exc)
+
+    groups = load_practice_groups_from_sheet(sheets_io, practice_list_tab, cache_path=cache_path)
+    return sheets_io, groups
+
+def get_worksheet(sheets_io, worksheet_name="auth_failed"):
+    """
+    Look up a worksheet (tab) in the run's spreadsheet.
+    """
+    return sheets_io.worksheet(worksheet_name)
+
+def load_practice_groups_from_sheet(
+    sheets_io,
+    practice_list_tab="Tuuthfairy Groups",
+    cache_path=PRACTICE_GROUPS_CACHE_FILE,
+    max_cache_age=PRACTICE_GROUPS_MAX_CACHE_AGE,
+):
+    """
+    Return the set of practice groups marked "Run" on the practice list tab.
+
+    The parsed set is cached locally. Before re-reading the tab we make one
+    cheap Drive call for the spreadsheet's modifiedTime; if nothing was edited
+    since the cache was filled (our own uploads move the cached modifiedTime
+    along, see _own_sheet_write), the cached set is returned. If Google can't
+    be reached, we fall back to the last known list and log how stale it is.
+    """
+    cache = _read_practice_groups_cache(cache_path, sheets_io.spreadsheet.id, practice_list_tab)
+
+    try:
+        modified_time = _spreadsheet_modified_time(sheets_io)
+        if cache and _practice_groups_cache_is_fresh(cache, modified_time, max_cache_age):
+            logger.info(
+                "Practice group list unchanged since %s; using %d cached groups.",
+                cache["fetched_at"], len(cache["groups"])
+            )
+            return set(cache["groups"])
+
+        valid_practice_groups = _fetch_practice_groups(sheets_io, practice_list_tab)
+    except GOOGLE_UNREACHABLE_ERRORS as exc:
+        if not cache:
+            raise
+        return _use_cached_practice_groups(cache, exc)
+
+    write_json_file(cache_path, {
+        "spreadsheet_id": sheets_io.spreadsheet.id,
+        "spreadsheet_name": sheets_io.spreadsheet.title,
+        "tab": practice_list_tab,
+        "modified_time": modified_time.isoformat(),
+        "fetched_at": datetime.now(timezone.utc).isoformat(),
+        "groups": sorted(valid_practice_groups),
+    }, indent=2)
+    return valid_practice_groups
+
+def _use_cached_practice_groups(cache, exc):
+    age = datetime.now(timezone.utc) - datetime.fromisoformat(cache["fetched_at"])
+    logger.warning(
+        "Could not load practice groups from Google (%s). Using the cached list from %s "
+        "(%s old); it may be stale.",
+        exc, cache["fetched_at"], age
+    )
+    return set(cache["groups"])
+
+def _fetch_practice_groups(sheets_io, practice_list_tab):
+    """
+    Read the practice list tab and parse out the groups marked "Run".
+
+    Column A holds the Status and column B the Practice Group; both columns
+    are read in a single batch_get instead of one col_values call each.
+    """
+    values = sheets_io.batch_get([absolute_range_name(practice_list_tab, "A:B")])[0]
+
+    # Match col_values(): each column ends at its last non-empty cell
+    status_col = [row[0] if len(row) > 0 else "" for row in values]
+    groups_col = [row[1] if len(row) > 1 else "" for row in values]
+    while status_col and not status_col[-1]:
+        status_col.pop()
+    while groups_col and not groups_col[-1]:
+        groups_col.pop()
+
+    valid_practice_groups = []
+    min_len = min(len(status_col), len(groups_col))
+    # skip the header row (index 0)
+    for i in range(1, min_len):
+        status_value = status_col[i].strip()
+        group_name = groups_col[i].strip()
+        if status_value.lower() == "run":
+            valid_practice_groups.append(group_name)
+
+    logger.info("Downloaded %d practice groups marked 'Run'.", len(valid_practice_groups))
+    return set(valid_practice_groups)
+
+def _practice_groups_cache_is_fresh(cache, modified_time, max_cache_age):
+    """
+    The cache is fresh if the spreadsheet hasn't been modified since it was filled
+    (or since our last upload, when nothing else had changed it before that).
+    """
+    now = datetime.now(timezone.utc)
+    if now - datetime.fromisoformat(cache["fetched_at"]) > max_cache_age:
+        return False
+    return modified_time <= datetime.fromisoformat(cache["modified_time"])
+
+@contextmanager
+def _own_sheet_write(sheets_io, cache_path=PRACTICE_GROUPS_CACHE_FILE):
+    """
+    Wrap our own writes to the spreadsheet, so their modifiedTime bump doesn't
+    invalidate the practice group cache on the next run.
+
+    The cached modifiedTime is moved forward to the one after our write only
+    if the spreadsheet still had the cached modifiedTime just before it, i.e.
+    nobody else had edited it since the groups were read. An edit made while
+    our write is in flight can't be told apart from it and is missed until
+    the cache reaches max_cache_age.
+    """
+    cache = read_json_file(cache_path)
+    untouched = False
+    if cache.get("spreadsheet_id") == sheets_io.spreadsheet.id and "modified_time" in cache:
+        try:
+            untouched = _spreadsheet_modified_time(sheets_io) == datetime.fromisoformat(cache["modified_time"])
+        except GOOGLE_UNREACHABLE_ERRORS as exc:
+            logger.debug("Could not check modifiedTime before writing: %s", exc)
+
+    yield
+
+    if not untouched:
+        return
+    try:
+        cache["modified_time"] = _spreadsheet_modified_time(sheets_io).isoformat()
+    except GOOGLE_UNREACHABLE_ERRORS as exc:
+        logger.debug("Could not read modifiedTime after writing: %s", exc)
+        return
+    write_json_file(cache_path, cache, indent=2)
+
+def _spreadsheet_modified_time(sheets_io):
+    return _parse_rfc3339(sheets_io.call("get_lastUpdateTime", sheets_io.spreadsheet.get_lastUpdateTime))
+
+def _read_practice_groups_cache(cache_path, spreadsheet_id, practice_list_tab):
+    cache = read_json_file(cache_path)
+    if cache.get("spreadsheet_id") != spreadsheet_id or cache.get("tab") != practice_list_tab:
+        return None
+    if "groups" not in cache or "fetched_at" not in cache or "modified_time" not in cache:
+        return None
+    return cache
+
+def _parse_rfc3339(value):
+    # Drive returns e.g. "2025-02-03T14:05:06.789Z"
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+def upload_data_to_google_sheets(worksheet, data, practice_group_count=None, sheets_io=None):
     """
     Overwrites the entire worksheet with the new data.
     If there's no data, writes a message indicating that no auth_failed connections were found,
@@ -24,15 +255,20 @@ def upload_data_to_google_sheets(worksheet, data, practice_group_count=None):
 
     Otherwise:
       1) Clears the sheet.
-      2) Inserts a header row (including a 'Connection Link' column).
+      2) Writes a header row (including a 'Connection Link' column).
       3) Builds each row with a clickable link in the 'Connection Link' column that points to
          https://dashboard.tuuthfairy.com/connection/<ID>.
-      4) Inserts all rows below the header, interpreting formulas with `value_input_option='USER_ENTERED'`.
+      4) Writes all rows below the header, interpreting formulas with USER_ENTERED.
+
+    The clear and the write are queued on 'sheets_io' and sent as one
+    values_batch_clear plus one values_batch_update.
     """
+    if sheets_io is None:
+        sheets_io = SheetsIO(worksheet.spreadsheet)
+
     # CASE 1: No data
     if not data:
         logger.info("No auth_failed connections found. Writing a message to the sheet instead.")
-        worksheet.clear()
 
         # Format the message with the practice group count and time
         fetch_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -41,59 +277,377 @@ def upload_data_to_google_sheets(worksheet, data, practice_group_count=None):
             f"from Tuuthfairy Groups. {fetch_time}"
         )
 
-        # Insert a header row for clarity
-        worksheet.insert_row(["Message"], 1)
-        # Insert the message as the second row
-        worksheet.insert_row([message], 2)
+        # A header row for clarity, then the message as the second row
+        sheets_io.queue_clear(worksheet.title)
+        sheets_io.queue_write(worksheet.title, "A1:A2", [["Message"], [message]])
+        with _own_sheet_write(sheets_io):
+            sheets_io.flush()
         return
 
     # CASE 2: We have data
-    # Define the header row
-    header = [
-        "Connection Link",
-        "WebsiteId",
-        "Username",
-        "Status",
-        "locationId",
-        "LastUpdated",
-        "practiceGroupId",
-        "practiceGroupName",
-        "FetchedAt"
-    ]
+    # We'll use one timestamp for the entire upload run
+    fetch_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-    # Clear the entire worksheet
-    worksheet.clear()
+    # Header first, then each row with the first column as a clickable link
+    new_rows = [SHEET_HEADER]
+    new_rows.extend(_build_sheet_row(record, fetch_time) for record in data)
 
-    # Insert the header at row 1
-    worksheet.insert_row(header, 1)
+    with _own_sheet_write(sheets_io):
+        _ensure_row_count(sheets_io, worksheet, len(new_rows))
+
+        # Clear the entire worksheet, then write everything from A1 down
+        last_col = _column_letter(len(SHEET_HEADER))
+        sheets_io.queue_clear(worksheet.title)
+        sheets_io.queue_write(worksheet.title, f"A1:{last_col}{len(new_rows)}", new_rows)
+        sheets_io.flush()
+
+    logger.info("Data successfully overwritten in Google Sheets (auth_failed tab).")
+
+def sync_data_to_google_sheets(worksheet, data, practice_group_count=None, sheets_io=None):
+    """
+    Bring the worksheet up to date by writing only the rows that changed.
+
+    Reads the current contents with one batch_get call and diffs them
+    against 'data', keyed on the connection ID shown in the 'Connection Link' column:
+      - Unchanged rows are left alone (including their FetchedAt value).
+      - Changed rows are rewritten in place.
+      - New connections take over the rows of removed ones, then go at the end.
+      - Leftover gaps are closed by moving rows up from the bottom, and the
+        rows no longer needed at the end are blanked.
+
+    Everything is sent in a single values_batch_update, so the sheet is never
+    empty mid-update. With no data we fall back to the full-rewrite message.
+    """
+    if sheets_io is None:
+        sheets_io = SheetsIO(worksheet.spreadsheet)
+
+    if not data:
+        upload_data_to_google_sheets(
+            worksheet, data, practice_group_count=practice_group_count, sheets_io=sheets_io
+        )
+        return
 
-    # We'll use one timestamp for the entire upload run
     fetch_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    width = len(SHEET_HEADER)
+
+    # Only the table columns take part in the diff. Values are read as stored, not as
+    # displayed ("0123" was stored as the number 123, "1.50" as 1.5), then compared
+    # with what writing the record would store (see _row_matches_record)
+    sheet_values = sheets_io.batch_get(
+        [absolute_range_name(worksheet.title)],
+        value_render_option="UNFORMATTED_VALUE",
+        date_time_render_option="FORMATTED_STRING",
+    )[0]
+    current = [(row + [""] * width)[:width] for row in sheet_values]
+    header_ok = bool(current) and current[0] == SHEET_HEADER
+    existing = current[1:]
+
+    records_by_id = {}
+    for record in data:
+        records_by_id[str(record.get("ID", ""))] = record
+
+    # 1) Keep surviving connections in their current row (an int = index in 'existing').
+    #    Rows for removed connections become holes (None).
+    target = []
+    seen = set()
+    for index, old_row in enumerate(existing):
+        conn_id = str(old_row[0])
+        if header_ok and conn_id in records_by_id and conn_id not in seen:
+            seen.add(conn_id)
+            record = records_by_id[conn_id]
+            if _row_matches_record(old_row, record):
+                target.append(index)
+            else:
+                target.append(_build_sheet_row(record, fetch_time))
+        else:
+            target.append(None)
+
+    # 2) New connections fill the holes first, then go at the end
+    holes = deque(i for i, row in enumerate(target) if row is None)
+    for conn_id, record in records_by_id.items():
+        if conn_id in seen:
+            continue
+        new_row = _build_sheet_row(record, fetch_time)
+        if holes:
+            target[holes.popleft()] = new_row
+        else:
+            target.append(new_row)
+
+    # 3) Close any remaining holes by moving rows up from the bottom
+    while holes:
+        if target[-1] is None:
+            target.pop()
+            holes.pop()
+        else:
+            target[holes.popleft()] = target.pop()
+
+    # 4) Work out which sheet rows need writing (row 1 is the header)
+    changed = {}
+    if not header_ok:
+        changed[1] = SHEET_HEADER
+    for index, row in enumerate(target):
+        if isinstance(row, int):
+            if row == index:
+                continue
+            # A kept row that moved: rebuild it so column A stays a formula
+            old_row = existing[row]
+            row = _build_sheet_row(records_by_id[str(old_row[0])], old_row[-1])
+        changed[index + 2] = row
+    for index in range(len(target), len(existing)):
+        changed[index + 2] = [""] * width
+
+    if not changed:
+        logger.info("Google Sheets already up to date; nothing to write.")
+        return
+
+    ranges = _coalesce_row_ranges(changed, width)
+    with _own_sheet_write(sheets_io):
+        # Make sure the grid is tall enough before writing past the current end
+        _ensure_row_count(sheets_io, worksheet, len(target) + 1)
+
+        for entry in ranges:
+            sheets_io.queue_write(worksheet.title, entry["range"], entry["values"])
+        sheets_io.flush()
+
+    logger.info(
+        "Synced Google Sheets: %d rows written in %d ranges (%d connections, %d previously).",
+        len(changed), len(ranges), len(target), len(existing)
+    )
+
+def stream_upload_to_google_sheets(
+    worksheet,
+    data,
+    practice_group_count=None,
+    sheets_io=None,
+    chunk_rows=UPLOAD_CHUNK_ROWS,
+    max_chunk_bytes=UPLOAD_CHUNK_MAX_BYTES,
+    workers=UPLOAD_WORKERS,
+    checkpoint_path=UPLOAD_CHECKPOINT_FILE,
+):
+    """
+    Overwrite the worksheet like upload_data_to_google_sheets, but for very large results.
+
+      - Rows (including the =HYPERLINK formulas) are built lazily, never all at once.
+      - They are cut into chunks bounded by both row count and approximate request size,
+        and each chunk is written to its own precomputed A1 range.
+      - Chunks are sent by a small worker pool, with at most a few in flight.
+      - Every acknowledged chunk is recorded in a checkpoint file. If the upload dies
+        part way, calling this again with the same data skips the clear and the
+        chunks that already landed. The checkpoint is removed when the upload completes.
+    """
+    if sheets_io is None:
+        sheets_io = SheetsIO(worksheet.spreadsheet)
+
+    if not data:
+        upload_data_to_google_sheets(
+            worksheet, data, practice_group_count=practice_group_count, sheets_io=sheets_io
+        )
+        return
+
+    # A resumed upload's earlier chunks already moved modifiedTime, so it leaves the cache alone
+    with _own_sheet_write(sheets_io):
+        upload_id = _upload_fingerprint(sheets_io.spreadsheet.id, worksheet.title, data)
+        checkpoint = read_json_file(checkpoint_path)
+        if checkpoint.get("upload_id") == upload_id:
+            fetch_time = checkpoint["fetch_time"]
+            done = set(checkpoint["done"])
+            logger.info("Resuming upload %s: %d chunks already written.", upload_id[:12], len(done))
+        else:
+            fetch_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            done = set()
+            checkpoint = {"upload_id": upload_id, "fetch_time": fetch_time, "done": []}
+
+            # Fresh upload: clear the tab and write the header before any data chunk
+            _ensure_row_count(sheets_io, worksheet, len(data) + 1)
+            sheets_io.queue_clear(worksheet.title)
+            sheets_io.queue_write(
+                worksheet.title, f"A1:{_column_letter(len(SHEET_HEADER))}1", [SHEET_HEADER]
+            )
+            sheets_io.flush()
+            write_json_file(checkpoint_path, checkpoint, indent=2)
+
+        checkpoint_lock = threading.Lock()
+
+        def send_chunk(index, range_name, rows):
+            sheets_io.call(
+                "values_update",
+                sheets_io.spreadsheet.values_update,
+                absolute_range_name(worksheet.title, range_name),
+                params={"valueInputOption": "USER_ENTERED"},
+                body={"values": rows},
+                kind="write",
+            )
+            # Acknowledge the chunk so a resumed upload can skip it
+            with checkpoint_lock:
+                checkpoint["done"].append(index)
+                write_json_file(checkpoint_path, checkpoint, indent=2)
+
+        rows = (_build_sheet_row(record, fetch_time) for record in data)
+        sent = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            in_flight = set()
+            for index, range_name, chunk in _iter_row_chunks(rows, chunk_rows, max_chunk_bytes):
+                if index in done:
+                    continue
+                # Keep memory bounded: wait for a slot before building more chunks
+                if len(in_flight) >= workers * 2:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        future.result()
+                in_flight.add(pool.submit(send_chunk, index, range_name, chunk))
+                sent += 1
+            for future in in_flight:
+                future.result()
 
-    # Build rows to insert, with the first column as a clickable link
-    new_rows = []
-    base_url = "https://dashboard.tuuthfairy.com/connection/"
+    try:
+        os.remove(checkpoint_path)
+    except OSError:
+        pass
 
+    logger.info(
+        "Streamed %d rows to Google Sheets in %d chunks (%d skipped from a previous attempt).",
+        len(data), sent, len(done)
+    )
+
+def _iter_row_chunks(rows, chunk_rows, max_chunk_bytes, first_row=2):
+    """
+    Yield (chunk_index, a1_range, rows) for consecutive chunks of 'rows'.
+    A chunk ends at chunk_rows rows or once its rough JSON size passes max_chunk_bytes.
+    """
+    last_col = _column_letter(len(SHEET_HEADER))
+    index = 0
+    start = first_row
+    chunk = []
+    chunk_bytes = 0
+
+    for row in rows:
+        # Roughly what the row costs in the request body: each value plus quoting/commas
+        row_bytes = sum(len(str(value)) + 3 for value in row) + 2
+        if chunk and (len(chunk) >= chunk_rows or chunk_bytes + row_bytes > max_chunk_bytes):
+            yield index, f"A{start}:{last_col}{start + len(chunk) - 1}", chunk
+            index += 1
+            start += len(chunk)
+            chunk = []
+            chunk_bytes = 0
+        chunk.append(row)
+        chunk_bytes += row_bytes
+
+    if chunk:
+        yield index, f"A{start}:{last_col}{start + len(chunk) - 1}", chunk
+
+def _upload_fingerprint(spreadsheet_id, worksheet_title, data):
+    """
+    Identify an upload by its target and content, so a retry of the same data can resume it.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{spreadsheet_id}\x1f{worksheet_title}\x1f{len(data)}".encode("utf-8"))
     for record in data:
-        connection_id = record.get("ID", "")
-        # Build a formula that creates a clickable hyperlink: =HYPERLINK("url", "link text")
-        link_formula = f'=HYPERLINK("{base_url}{connection_id}", "{connection_id}")'
-
-        row = [
-            link_formula,
-            record.get("WebsiteId", ""),
-            record.get("Username", ""),
-            record.get("Status", ""),
-            record.get("locationId", ""),
-            record.get("LastUpdated", ""),
-            record.get("practiceGroupId", ""),
-            record.get("practiceGroupName", ""),
-            fetch_time
-        ]
-        new_rows.append(row)
-
-    # Insert all new rows below the header
-    # Use 'USER_ENTERED' so Google Sheets interprets our =HYPERLINK formula
-    worksheet.insert_rows(new_rows, 2, value_input_option='USER_ENTERED')
-
-    logger.info("Data successfully overwritten in Google Sheets (auth_failed tab).")
\ No newline at end of file
+        for value in _build_sheet_row(record, "")[1:-1]:
+            digest.update(str(value).encode("utf-8"))
+            digest.update(b"\x1f")
+        digest.update(str(record.get("ID", "")).encode("utf-8"))
+        digest.update(b"\x1e")
+    return digest.hexdigest()
+
+def _build_sheet_row(record, fetch_time):
+    """
+    Build one worksheet row, with the first column as a clickable link to the connection.
+    """
+    connection_id = record.get("ID", "")
+    # Build a formula that creates a clickable hyperlink: =HYPERLINK("url", "link text")
+    link_formula = f'=HYPERLINK("{CONNECTION_BASE_URL}{connection_id}", "{connection_id}")'
+    # Written as text (leading apostrophe): Sheets would parse it as a date and show it
+    # in the sheet's own format, which the diff sync could never match again
+    last_updated = record.get("LastUpdated", "")
+    if last_updated not in ("", None):
+        last_updated = f"'{last_updated}"
+
+    return [
+        link_formula,
+        record.get("WebsiteId", ""),
+        record.get("Username", ""),
+        record.get("Status", ""),
+        record.get("locationId", ""),
+        last_updated,
+        record.get("practiceGroupId", ""),
+        record.get("practiceGroupName", ""),
+        fetch_time
+    ]
+
+def _ensure_row_count(sheets_io, worksheet, needed_rows):
+    """
+    Grow the worksheet grid if it has fewer than 'needed_rows' rows;
+    values updates cannot write past the end of the grid.
+    """
+    if needed_rows > worksheet.row_count:
+        sheets_io.call("resize", worksheet.resize, rows=needed_rows, kind="write")
+
+def _column_letter(col):
+    """
+    1 -> "A", 9 -> "I", 27 -> "AA".
+    """
+    return rowcol_to_a1(1, col).rstrip("0123456789")
+
+def _row_matches_record(sheet_row, record):
+    """
+    Compare the stored values of an existing sheet row (read with
+    UNFORMATTED_VALUE) with a record, ignoring the link formula (column A)
+    and FetchedAt (last column).
+    """
+    new_row = _build_sheet_row(record, "")
+    return all(
+        _entered_value(new_value) == _entered_value(old_value)
+        for new_value, old_value in zip(new_row[1:-1], sheet_row[1:-1])
+    )
+
+def _entered_value(value):
+    """
+    What a cell holds once 'value' is written USER_ENTERED, as the API returns
+    it with UNFORMATTED_VALUE: numbers and TRUE/FALSE are typed, the rest is
+    text ('text with a leading apostrophe' always is, without the apostrophe).
+    """
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value)
+    if text.startswith("'"):
+        return text[1:]
+    if text.upper() in ("TRUE", "FALSE"):
+        return text.upper() == "TRUE"
+    if _NUMBER_PATTERN.fullmatch(text.strip()):
+        return float(text)
+    return text
+
+def _coalesce_row_ranges(changed, width):
+    """
+    Turn {sheet_row_number: values} into batch_update entries,
+    merging consecutive rows into a single A1 range each.
+    """
+    last_col = _column_letter(width)
+    ranges = []
+    block_start = None
+    block_rows = []
+    previous = None
+
+    for row_number in sorted(changed):
+        if previous is not None and row_number != previous + 1:
+            ranges.append({
+                "range": f"A{block_start}:{last_col}{previous}",
+                "values": block_rows,
+            })
+            block_rows = []
+            block_start = None
+        if block_start is None:
+            block_start = row_number
+        block_rows.append(changed[row_number])
+        previous = row_number
+
+    if block_rows:
+        ranges.append({
+            "range": f"A{block_start}:{last_col}{previous}",
+            "values": block_rows,
+        })
+    return ranges
@@ -1,9 +1,15 @@
 # location_helpers.py
 
 import logging
+import sys
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
+# Distinct raw Locations strings remembered by process_location_fields().
+# Connections of one practice often share the exact same string.
+LOCATION_CACHE_SIZE = 8192
+
 def process_location_field(location_field):
     """
     Process a comma-separated location field.
@@ -38,4 +44,72 @@ def process_location_field(location_field):
             processed_entries.append(entry)
     
     logger.debug("Processed entries: %s", processed_entries)
-    return processed_entries
\ No newline at end of file
+    return processed_entries
+
+def process_location_fields(location_fields):
+    """
+    Process many location fields at once (see process_location_field).
+
+    Returns one tuple of location IDs per input field, in order. Results are
+    memoized by the raw string in a bounded LRU, so repeated strings are
+    parsed once and share the same tuple; the IDs are interned, so they are
+    the same string objects as the interned keys of the Redash location map.
+    """
+    results = [_parse_location_field(field) for field in location_fields]
+    if logger.isEnabledFor(logging.DEBUG):
+        for field, ids in zip(location_fields, results):
+            logger.debug("Processed location field %r -> %s", field, ids)
+        logger.debug("Location parse cache: %s", _parse_location_field.cache_info())
+    return results
+
+def combine_record(scraped_record, loc_id, redash_info):
+    """
+    Combine a single scraped record with Redash practice group info for that location.
+    """
+    new_entry = {
+        "ID": scraped_record["ID"],
+        "WebsiteId": scraped_record["WebsiteId"],
+        "Username": scraped_record["Username"],
+        "Status": scraped_record["Status"],
+        "locationId": loc_id or "",
+        "LastUpdated": scraped_record["LastUpdated"],
+    }
+    if redash_info:
+        new_entry["practiceGroupId"] = redash_info["practiceGroupId"]
+        new_entry["practiceGroupName"] = redash_info["practiceGroupName"]
+    else:
+        new_entry["practiceGroupId"] = ""
+        new_entry["practiceGroupName"] = ""
+    return new_entry
+
+def iter_expanded_records(records, location_map):
+    """
+    Yield one row per (connection, location), combined with that location's
+    Redash info; a connection without locations gives a single row.
+    The records' Locations must already be parsed (process_location_fields).
+    """
+    for record in records:
+        if not record["Locations"]:
+            yield combine_record(record, None, None)
+            continue
+        for loc_id in record["Locations"]:
+            yield combine_record(record, loc_id, location_map.get(loc_id, None))
+
+@lru_cache(maxsize=LOCATION_CACHE_SIZE)
+def _parse_location_field(location_field):
+    # Same rules as process_location_field(), without the per-entry logging
+    entries = [entry.strip() for entry in location_field.split(",")]
+
+    # If there's only one entry and it's "default"
+    if len(entries) == 1 and entries[0].lower() == "default":
+        return ("default",)
+
+    processed_entries = []
+    for entry in entries:
+        if entry.lower() == "default":
+            # Skip if there are multiple entries
+            continue
+        if entry.startswith("airpay_"):
+            entry = entry[7:]
+        processed_entries.append(sys.intern(entry))
+    return tuple(processed_entries)
@@ -0,0 +1,168 @@
+# log_setup.py
+"""
+Logging for the scraper entry points.
+
+Records are handed to a QueueHandler on the calling thread and written to disk
+by a QueueListener thread, so the scrape loop never waits on file I/O. The log
+file is rotated when it passes a size limit or when the day (or hour) changes,
+and rotated files are gzip-compressed: tuuthfairy_scraper.log.1.gz, .2.gz, ...
+
+With json_format=True each line is a JSON object that also carries the run ID
+and the run_metrics stage that was active when the record was logged.
+"""
+
+import atexit
+import copy
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+from datetime import datetime
+
+import run_metrics
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(name)s - %(message)s"
+
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 14
+
+# strftime patterns naming the current rotation period
+_PERIOD_FORMATS = {
+    "daily": "%Y-%m-%d",
+    "hourly": "%Y-%m-%d %H",
+}
+
+_listener = None
+
+class SizeAndTimeRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler that also rolls over when the period changes, and
+    gzips rotated files.
+
+    The period of an existing log file is taken from its modification time,
+    so short cron runs still rotate once a day rather than only when a single
+    process happens to live past midnight.
+    """
+
+    def __init__(self, filename, max_bytes=DEFAULT_MAX_BYTES, backup_count=DEFAULT_BACKUP_COUNT,
+                 when="daily", encoding="utf-8"):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding)
+        self.period_format = _PERIOD_FORMATS[when]
+        try:
+            started = datetime.fromtimestamp(os.path.getmtime(self.baseFilename))
+        except OSError:
+            started = datetime.now()
+        self.file_period = started.strftime(self.period_format)
+        self.namer = lambda name: name + ".gz"
+        self.rotator = _gzip_rotator
+
+    def shouldRollover(self, record):
+        if datetime.now().strftime(self.period_format) != self.file_period:
+            return os.path.exists(self.baseFilename)
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.file_period = datetime.now().strftime(self.period_format)
+
+class RunContextFilter(logging.Filter):
+    """
+    Stamp records with the current run ID and stage. Runs on the calling
+    thread before the record is queued, while that context is still correct.
+    """
+
+    def filter(self, record):
+        record.run_id = run_metrics.current().run_id
+        record.stage = run_metrics.current_stage()
+        return True
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Like QueueHandler, but keeps the traceback in exc_text instead of folding
+    it into the message, so the file-side formatter decides how to show it.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "run_id": getattr(record, "run_id", None),
+            "stage": getattr(record, "stage", None),
+            "msg": record.getMessage(),
+        }
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+def setup_logging(log_file, level=logging.INFO, json_format=False, max_bytes=DEFAULT_MAX_BYTES,
+                  backup_count=DEFAULT_BACKUP_COUNT, when="daily"):
+    """
+    Route the root logger through a queue to a rotating, compressing log file.
+
+    Safe to call again (e.g. once config.json has been read): the previous
+    listener is flushed and replaced.
+    """
+    global _listener
+    stop_logging()
+
+    file_handler = SizeAndTimeRotatingFileHandler(
+        log_file, max_bytes=max_bytes, backup_count=backup_count, when=when
+    )
+    file_handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT))
+
+    queue_handler = _QueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(RunContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, file_handler)
+    _listener.start()
+
+def setup_logging_from_config(log_file, config):
+    """
+    setup_logging() with the log_* options from config.json.
+    """
+    setup_logging(
+        log_file,
+        json_format=config.get("log_json", False),
+        max_bytes=int(config.get("log_max_mb", DEFAULT_MAX_BYTES // (1024 * 1024)) * 1024 * 1024),
+        backup_count=config.get("log_backup_count", DEFAULT_BACKUP_COUNT),
+        when=config.get("log_rotate_when", "daily"),
+    )
+
+def stop_logging():
+    """
+    Write out everything still queued and close the log file.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+atexit.register(stop_logging)
+
+def _gzip_rotator(source, dest):
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
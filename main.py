@@ -1,32 +1,25 @@
 #!/usr/bin/env python3
+import argparse
 import json
 import logging
 import os
 import sys
 import time
-from datetime import datetime
 import shutil  # ADDED for environment checks
 
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-
-# Scraper pieces
-from scraper import (
-    ensure_logged_in,
-    go_directly_to_connections,
-    scrape_connections_table,
-)
-from redash_data import fetch_redash_csv, build_location_map
+# Scraper pieces. Selenium, gspread/google-auth and requests are imported
+# inside run_scraper_once, at the stage that first needs them, so that
+# starting the script (and --help, or a skipped locked run) stays fast.
 from data_filter import (
-    filter_by_practice_groups,
-    filter_auth_failed,
-    exclude_websites,
-    regroup_and_merge_locations,
+    build_output_rows,
+    RowRules,
+    REGROUP_MAX_ROWS_IN_MEMORY,
 )
-from google_sheets import setup_google_sheets_client, upload_data_to_google_sheets
-from location_helpers import process_location_field
+from location_helpers import process_location_fields
 from local_history import append_run_data
+from log_setup import setup_logging, setup_logging_from_config
+import run_metrics
+from scheduler import SingleFlightLock, run_scheduler
 
 ###################################################
 # Use absolute paths for files/logs
@@ -35,11 +28,6 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 LOG_FILE = os.path.join(BASE_DIR, "tuuthfairy_scraper.log")
 CONFIG_PATH = os.path.join(BASE_DIR, "config.json")
 
-logging.basicConfig(
-    filename=LOG_FILE,
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
-)
 logger = logging.getLogger(__name__)
 
 def load_config(path=CONFIG_PATH):
@@ -67,87 +55,35 @@ def check_cron_environment():
     path_env = os.getenv("PATH", "")
     logger.info("Current PATH environment variable: %s", path_env)
 
-def load_practice_groups_from_sheet(
-    service_account_file,
-    spreadsheet_name,
-    practice_list_tab="Tuuthfairy Groups"
-):
-    import gspread
-    from google.oauth2.service_account import Credentials
-
-    creds = Credentials.from_service_account_file(service_account_file)
-    scoped = creds.with_scopes([
-        "https://www.googleapis.com/auth/drive",
-        "https://www.googleapis.com/auth/spreadsheets",
-    ])
-    client = gspread.authorize(scoped)
-
-    spreadsheet = client.open(spreadsheet_name)
-    worksheet = spreadsheet.worksheet(practice_list_tab)
-
-    # Grab column A (Status) and column B (Practice Group)
-    status_col = worksheet.col_values(1)
-    groups_col = worksheet.col_values(2)
-
-    valid_practice_groups = []
-    min_len = min(len(status_col), len(groups_col))
-    # skip the header row (index 0)
-    for i in range(1, min_len):
-        status_value = status_col[i].strip()
-        group_name = groups_col[i].strip()
-        if status_value.lower() == "run":
-            valid_practice_groups.append(group_name)
-
-    return set(valid_practice_groups)
-
-def _combine(scraped_record, loc_id, redash_info):
-    """
-    Combine a single scraped record with Redash practice group info for that location.
-    """
-    new_entry = {
-        "ID": scraped_record["ID"],
-        "WebsiteId": scraped_record["WebsiteId"],
-        "Username": scraped_record["Username"],
-        "Status": scraped_record["Status"],
-        "locationId": loc_id or "",
-        "LastUpdated": scraped_record["LastUpdated"],
-    }
-    if redash_info:
-        new_entry["practiceGroupId"] = redash_info["practiceGroupId"]
-        new_entry["practiceGroupName"] = redash_info["practiceGroupName"]
-    else:
-        new_entry["practiceGroupId"] = ""
-        new_entry["practiceGroupName"] = ""
-    return new_entry
-
 def run_scraper_once(config):
     """
-    Run the scraper steps exactly once.
+    Run the scraper steps exactly once, timing each stage.
     Raises exceptions on any failure so that main() can catch them.
-    """
-    logger.info("Starting single scraper run...")
-
-    SERVICE_ACCOUNT_FILE = config["service_account_file"]
-    SHEET_NAME = config["sheet_name"]
-    AUTH0_EMAIL = config["auth0_email"]
-    AUTH0_PASSWORD = config["auth0_password"]
-    redash_url = config["redash_url"]
-    api_key = config["redash_api_key"]
-
-    # Example: exclude certain domains
-    excluded_domains = {"unumdentalpwp.skygenusasystems.com"}
 
-    # Load practice groups from Google Sheet
-    valid_practice_groups = load_practice_groups_from_sheet(
-        SERVICE_ACCOUNT_FILE,
-        SHEET_NAME,
-        practice_list_tab="Tuuthfairy Groups",
-    )
-    logger.info("Fetched practice groups: %s", valid_practice_groups)
+    Every run, successful or not, ends with a JSON report under run_reports/
+    and a refreshed Prometheus textfile (see run_metrics.py).
+    """
+    metrics = run_metrics.start_run()
+    try:
+        with metrics.span("run"):
+            result = _run_scraper_stages(config)
+        metrics.finish(success=True)
+        return result
+    except Exception:
+        metrics.finish(success=False)
+        raise
+    finally:
+        metrics.write_reports(prometheus_path=config.get("prometheus_textfile", run_metrics.PROMETHEUS_FILE))
 
-    # Fetch & build location map from Redash
-    redash_rows = fetch_redash_csv(redash_url, api_key=api_key)
-    location_map = build_location_map(redash_rows)
+def _start_browser(config):
+    """
+    Start headless Chrome in a fresh profile (see BrowserManager).
+    Returns (driver, browser); the caller must driver.quit() and browser.close().
+    """
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+    from browser_manager import BrowserManager
 
     # Configure headless Chrome with recommended flags for cron
     options = Options()
@@ -164,17 +100,6 @@ def run_scraper_once(config):
     options.add_argument("--window-size=1280,720")
     options.binary_location = '/snap/bin/chromium'
 
-    # Unique profile folder for each run (solves profile conflicts)
-    unique_profile = f"/tmp/chrome-profile-{datetime.now().strftime('%Y%m%d%H%M%S')}"
-    options.add_argument(f"--user-data-dir={unique_profile}")
-
-    options.add_argument(
-        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.5481.77 Safari/537.36"
-    )
-    options.add_experimental_option("excludeSwitches", ["enable-logging", "enable-automation"])
-    options.add_experimental_option("useAutomationExtension", False)
-
     if sys.platform.startswith("darwin"):
         # === macOS ===
         # 1) ChromeDriver location (likely installed via Homebrew)
@@ -197,73 +122,336 @@ def run_scraper_once(config):
         # fill in as appropriate, or just raise an error
         raise RuntimeError("Unsupported platform for this script.")
 
-    # Set up the ChromeDriver service
+    options.add_argument(
+        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.5481.77 Safari/537.36"
+    )
+    options.add_experimental_option("excludeSwitches", ["enable-logging", "enable-automation"])
+    options.add_experimental_option("useAutomationExtension", False)
+
+    # Fresh profile folder for each run, created from a warm-cache template
+    # (only now, so an unsupported platform leaves nothing to clean up);
+    # also clears out profiles and browser processes left by killed runs
+    browser = BrowserManager(config)
+    browser.prepare()
+    for argument in browser.chrome_arguments():
+        options.add_argument(argument)
+
+    # Set up the ChromeDriver service (verbose log, size-capped by BrowserManager)
     service = Service(
         executable_path=chromedriver_path,
-        service_args=["--verbose"],  # produce verbose chromedriver.log
-        log_path="/tmp/chromedriver.log"
+        service_args=["--verbose"],
+        **browser.service_kwargs()
+    )
+
+    try:
+        with run_metrics.span("browser_start"):
+            driver = webdriver.Chrome(service=service, options=options)
+    except Exception:
+        browser.close()
+        raise
+    browser.watch(service.process.pid)
+    return driver, browser
+
+def _restart_browser(config, cookies, tracer=None):
+    """
+    A new browser for MemoryGuard: logged in with the old one's cookies and showing /connection.
+    A DriverTracer, if given, moves over to the new browser.
+    """
+    from scraper import restore_session
+
+    driver, browser = _start_browser(config)
+    if tracer:
+        tracer.attach(driver)
+    try:
+        restore_session(driver, cookies, config["auth0_email"], config["auth0_password"],
+                        fast_login=config.get("fast_login", True))
+    except Exception:
+        driver.quit()
+        browser.close()
+        raise
+    return driver, browser
+
+def _run_scraper_stages(config):
+    """
+    The scraper steps themselves; see run_scraper_once().
+    """
+    logger.info("Starting single scraper run...")
+
+    SERVICE_ACCOUNT_FILE = config["service_account_file"]
+    SHEET_NAME = config["sheet_name"]
+    AUTH0_EMAIL = config["auth0_email"]
+    AUTH0_PASSWORD = config["auth0_password"]
+    redash_url = config["redash_url"]
+    api_key = config["redash_api_key"]
+    # "replace" (default) rewrites the whole tab; "diff" only writes changed rows
+    SHEETS_SYNC_MODE = config.get("sheets_sync_mode", "replace")
+    # Full rewrites this large are streamed in parallel, resumable chunks
+    SHEETS_STREAM_MIN_ROWS = config.get("sheets_stream_min_rows", 5000)
+
+    # Target statuses and excluded domains (optionally per practice group), compiled once
+    row_rules = RowRules.from_config(config)
+
+    from google_sheets import (
+        open_sheets_io,
+        open_practice_groups,
+        get_worksheet,
+        upload_data_to_google_sheets,
+        sync_data_to_google_sheets,
+        stream_upload_to_google_sheets,
     )
+    from sheets_io import DEFAULT_REQUESTS_PER_MINUTE
+
+    # One Sheets client/spreadsheet for the whole run; all reads and writes go through it.
+    # Load practice groups from Google Sheet (from the local cache if Google is unreachable,
+    # in which case sheets_io is None and the spreadsheet is opened again for the upload)
+    sheets_requests_per_minute = config.get("sheets_requests_per_minute", DEFAULT_REQUESTS_PER_MINUTE)
+    with run_metrics.span("practice_groups"):
+        sheets_io, valid_practice_groups = open_practice_groups(
+            SERVICE_ACCOUNT_FILE,
+            SHEET_NAME,
+            practice_list_tab="Tuuthfairy Groups",
+            requests_per_minute=sheets_requests_per_minute,
+        )
+    logger.info("Fetched practice groups: %s", valid_practice_groups)
+
+    # Fetch & build location map from Redash (reused for a while in scheduler mode)
+    from redash_data import get_location_map
+    with run_metrics.span("redash"):
+        location_map = get_location_map(
+            redash_url,
+            api_key=api_key,
+            max_age_seconds=config.get("location_map_max_age_minutes", 30) * 60,
+        )
+
+    from browser_manager import MemoryGuard
+    from pagination import DEFAULT_MAX_PAGE_SIZE, plan_pagination
+    from scraper import (
+        ensure_logged_in,
+        go_directly_to_connections,
+        scrape_connections_table,
+        RowHashCache,
+    )
+    from run_fingerprint import ContentDigest, RunFingerprint, digest_records, inputs_fingerprint
 
-    driver = webdriver.Chrome(service=service, options=options)
+    driver, browser = _start_browser(config)
+
+    # Optionally record every WebDriver round trip (see driver_trace.py)
+    tracer = None
+    if config.get("trace_webdriver", False):
+        from driver_trace import trace_driver
+        tracer = trace_driver(driver)
+
+    # Restarts the browser between pages if it grows too big (see browser_manager.py)
+    memory_guard = MemoryGuard(
+        config, driver, browser, restart=lambda cookies: _restart_browser(config, cookies, tracer)
+    )
     try:
-        # 1) Login via Auth0 with step-by-step waits and 2 retries if needed
-        ensure_logged_in(driver, AUTH0_EMAIL, AUTH0_PASSWORD, max_retries=2)
+        # 1) Login via Auth0: over HTTP if it works, else step-by-step waits and 2 retries
+        with run_metrics.span("login"):
+            ensure_logged_in(driver, AUTH0_EMAIL, AUTH0_PASSWORD, max_retries=2,
+                             fast_login=config.get("fast_login", True))
 
         # 2) Go directly to /connection
-        go_directly_to_connections(driver)
+        with run_metrics.span("navigate"):
+            go_directly_to_connections(driver)
+
+        # Page size, total pages and whether pages open by URL
+        plan = None
+        if config.get("plan_pagination", True):
+            with run_metrics.span("plan_pages"):
+                plan = plan_pagination(driver, max_page_size=config.get("max_page_size", DEFAULT_MAX_PAGE_SIZE))
 
         # 3) Scrape all rows
-        all_data = scrape_connections_table(driver)
+        with run_metrics.span("scrape"):
+            # The table's hash is built row by row while scraping
+            table_digest = ContentDigest()
+            scrape_workers = config.get("scrape_workers", 0)
+            if scrape_workers and plan is not None and plan.url_mode and plan.total_pages:
+                # Split the pages between this browser and worker processes (see page_queue.py)
+                all_data = _scrape_with_workers(config, plan, scrape_workers, memory_guard)
+                for record in all_data:
+                    table_digest.add(record)
+            else:
+                # Rows unchanged since the last run are reused rather than re-read
+                row_cache = RowHashCache() if config.get("reuse_unchanged_rows", True) else None
+                all_data = scrape_connections_table(
+                    driver, row_cache=row_cache, plan=plan, digest=table_digest, memory_guard=memory_guard
+                )
+                if row_cache is not None:
+                    row_cache.save()
+            driver = memory_guard.driver
+
+        # Nothing downstream can change if the table, location map and practice groups didn't
+        fingerprint = None
+        if config.get("skip_unchanged_runs", True):
+            fingerprint = RunFingerprint(max_age_seconds=config.get("full_run_max_age_hours", 24) * 3600)
+            run_inputs = inputs_fingerprint(table_digest, location_map, valid_practice_groups, row_rules)
+            if fingerprint.inputs_unchanged(run_inputs):
+                logger.info(
+                    "Scraped table, location map and practice groups unchanged since the last full run (%s); "
+                    "skipping enrich, filter, history and the Sheets upload.",
+                    fingerprint.previous.get("last_changed"),
+                )
+                fingerprint.mark_checked()
+                run_metrics.incr("runs_unchanged")
+                return fingerprint.previous_rows
 
         # 4) Process location fields
-        for record in all_data:
-            cleaned_locations = process_location_field(record["Locations"])
-            record["Locations"] = cleaned_locations
-
-        # Expand data: one row per location
-        expanded_data = []
-        for record in all_data:
-            if not record["Locations"]:
-                expanded_data.append(_combine(record, None, None))
-                continue
-            for loc_id in record["Locations"]:
-                redash_info = location_map.get(loc_id, None)
-                expanded_data.append(_combine(record, loc_id, redash_info))
-
-        # 5) Filter and regroup
-        filtered_data = filter_by_practice_groups(expanded_data, valid_practice_groups)
-        auth_failed_data = filter_auth_failed(filtered_data)
-        final_filtered_data = exclude_websites(auth_failed_data, excluded_domains)
-        regrouped_data = regroup_and_merge_locations(final_filtered_data)
+        with run_metrics.span("enrich"):
+            # One pass over the table; repeated Locations strings are parsed once
+            parsed_locations = process_location_fields([record["Locations"] for record in all_data])
+            for record, cleaned_locations in zip(all_data, parsed_locations):
+                record["Locations"] = cleaned_locations
+
+        # 5) Expand (one row per location), filter and regroup in one streaming pass,
+        #    so only the scraped table and the final rows are ever held in memory
+        with run_metrics.span("filter"):
+            regrouped_data = build_output_rows(
+                all_data,
+                location_map,
+                valid_practice_groups,
+                row_rules,
+                max_rows_in_memory=config.get("regroup_max_rows_in_memory", REGROUP_MAX_ROWS_IN_MEMORY),
+            )
+
+        run_metrics.incr("rows_expanded", sum(len(record["Locations"]) or 1 for record in all_data))
+        run_metrics.incr("rows_final", len(regrouped_data))
+
+        output_digest = digest_records(regrouped_data) if fingerprint is not None else None
+        if fingerprint is not None and fingerprint.output_unchanged(output_digest):
+            logger.info("Output unchanged since the last full run; skipping history and the Sheets upload.")
+            fingerprint.mark_checked(run_inputs)
+            run_metrics.incr("runs_unchanged")
+            return regrouped_data
+        if fingerprint is not None:
+            # Only a run that gets through history and the upload counts as a full run
+            fingerprint.invalidate()
 
         # 6) Save a local CSV
-        append_run_data(regrouped_data)
+        with run_metrics.span("history"):
+            append_run_data(regrouped_data)
 
         # 7) Overwrite Google Sheets
-        worksheet = setup_google_sheets_client(SERVICE_ACCOUNT_FILE, SHEET_NAME, "auth_failed")
-        upload_data_to_google_sheets(worksheet, regrouped_data)
+        with run_metrics.span("sheets_upload"):
+            if sheets_io is None:
+                sheets_io = open_sheets_io(
+                    SERVICE_ACCOUNT_FILE, SHEET_NAME, requests_per_minute=sheets_requests_per_minute
+                )
+            worksheet = get_worksheet(sheets_io, "auth_failed")
+            if SHEETS_SYNC_MODE == "diff":
+                # Only write the rows that changed since the last run
+                sync_data_to_google_sheets(worksheet, regrouped_data, sheets_io=sheets_io)
+            elif len(regrouped_data) >= SHEETS_STREAM_MIN_ROWS:
+                stream_upload_to_google_sheets(worksheet, regrouped_data, sheets_io=sheets_io)
+            else:
+                upload_data_to_google_sheets(worksheet, regrouped_data, sheets_io=sheets_io)
+
+        if fingerprint is not None:
+            fingerprint.record(run_inputs, output_digest, regrouped_data)
 
         logger.info("Single scraper run completed successfully!")
+        return regrouped_data
     finally:
         # Always quit the driver to free resources, preventing zombies
-        driver.quit()
-
-def main():
-    logger.info("Launching script with retry mechanism...")
+        # (the current one: the memory guard may have replaced it)
+        memory_guard.driver.quit()
+        memory_guard.browser.close()
+        if tracer:
+            tracer.close()
+        if sheets_io is not None:
+            sheets_io.log_stats()
+
+def _scrape_with_workers(config, plan, local_workers, memory_guard):
+    """
+    Scrape the planned pages through the page queue, with 'local_workers'
+    worker processes plus this run's own browser (memory_guard.driver, which
+    the guard may restart between pages); returns the merged records.
+    """
+    from page_queue import DEFAULT_LEASE_SECONDS, DEFAULT_PAGES_PER_ITEM, PAGE_QUEUE_FILE, PageQueue, coordinate_run
+
+    queue_path = config.get("page_queue_path", PAGE_QUEUE_FILE)
+    worker_command = [sys.executable, os.path.abspath(__file__), "--worker", queue_path]
+    return coordinate_run(
+        PageQueue(queue_path),
+        plan,
+        lambda item: _scrape_work_item(memory_guard.driver, item, memory_guard),
+        worker_command=worker_command,
+        local_workers=local_workers,
+        pages_per_item=config.get("pages_per_work_item", DEFAULT_PAGES_PER_ITEM),
+        lease_seconds=config.get("work_lease_seconds", DEFAULT_LEASE_SECONDS),
+    )
 
-    # Check environment up front (especially helpful under cron)
-    check_cron_environment()
+def _scrape_work_item(driver, item, memory_guard=None):
+    """
+    Scrape the pages of one page_queue WorkItem. With a MemoryGuard, a browser
+    that has grown too big is restarted before the item and between its pages.
+    """
+    from pagination import PagePlan
+    from scraper import scrape_connections_table
+
+    if memory_guard is not None:
+        reason = memory_guard.should_recycle()
+        if reason:
+            memory_guard.recycle(reason)
+        driver = memory_guard.driver
+    plan = PagePlan.from_dict(item.plan)
+    plan.open_page(driver, item.first_page)
+    return scrape_connections_table(driver, plan=plan, first_page=item.first_page, last_page=item.last_page,
+                                    memory_guard=memory_guard)
+
+def run_page_worker(config, queue_path, run_id=None, worker_id=None):
+    """
+    Work on page_queue items (of one run, or of any run on a shared queue)
+    until none are left. The browser is only started once there is work.
+    """
+    from browser_manager import MemoryGuard
+    from page_queue import PageQueue, default_worker_id, work_on_queue
+    from scraper import ensure_logged_in, go_directly_to_connections
+
+    worker_id = worker_id or default_worker_id()
+    queue = PageQueue(queue_path)
+    browser_state = {}
+
+    def scrape_item(item):
+        if not browser_state:
+            driver, browser = _start_browser(config)
+            # Restarts the browser between pages if it grows too big, as in a normal run
+            browser_state["guard"] = MemoryGuard(
+                config, driver, browser, restart=lambda cookies: _restart_browser(config, cookies)
+            )
+            ensure_logged_in(driver, config["auth0_email"], config["auth0_password"], max_retries=2,
+                             fast_login=config.get("fast_login", True))
+            go_directly_to_connections(driver)
+        memory_guard = browser_state["guard"]
+        return _scrape_work_item(memory_guard.driver, item, memory_guard)
 
-    # Load config from absolute path
-    config = load_config(CONFIG_PATH)
+    try:
+        completed = work_on_queue(
+            queue,
+            scrape_item,
+            worker_id,
+            run_id=run_id,
+            idle_seconds=0 if run_id else config.get("worker_idle_seconds", 300),
+        )
+        logger.info("Worker %s finished %d work item(s).", worker_id, completed)
+    finally:
+        if browser_state:
+            # The current browser: the memory guard may have replaced it
+            browser_state["guard"].driver.quit()
+            browser_state["guard"].browser.close()
 
-    max_attempts = 3
+def run_with_retries(config, max_attempts=3, run_once=run_scraper_once):
+    """
+    Run the scraper up to max_attempts times.
+    Returns the final rows from the first successful attempt, or None if all failed.
+    """
     for attempt in range(1, max_attempts + 1):
         logger.info("=== Scraper Attempt %d of %d ===", attempt, max_attempts)
         try:
-            run_scraper_once(config)
+            rows = run_once(config)
             logger.info("Scraper attempt %d succeeded. Exiting retry loop.", attempt)
-            break  # success, so stop trying
+            return rows  # success, so stop trying
         except Exception as exc:
             logger.exception("Scraper attempt %d failed with error: %s", attempt, exc)
             if attempt < max_attempts:
@@ -271,6 +459,73 @@ def main():
                 time.sleep(60)
             else:
                 logger.error("Max retries reached. Aborting.")
+    return None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Tuuthfairy connections scraper")
+    parser.add_argument(
+        "--schedule",
+        action="store_true",
+        help="Keep running and scrape on an adaptive interval instead of exiting after one run.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile CPU and memory of each run; results go to profiles/<timestamp>/.",
+    )
+    parser.add_argument(
+        "--worker",
+        metavar="QUEUE",
+        help="Scrape page ranges from the page queue database QUEUE instead of running the scraper.",
+    )
+    parser.add_argument("--run-id", help="With --worker: only work on this run's items.")
+    parser.add_argument("--worker-id", help="With --worker: name of this worker (default host-pid).")
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+
+    # Each worker writes its own log; the main log belongs to the coordinator
+    log_file = LOG_FILE
+    if args.worker:
+        from page_queue import default_worker_id
+        worker_id = args.worker_id or default_worker_id()
+        log_file = os.path.join(BASE_DIR, f"tuuthfairy_worker_{worker_id}.log")
+    # Queued, rotating, compressed log file; reconfigured once config.json is read
+    setup_logging(log_file)
+    logger.info("Launching script with retry mechanism...")
+
+    # Check environment up front (especially helpful under cron)
+    check_cron_environment()
+
+    # Load config from absolute path
+    config = load_config(CONFIG_PATH)
+    setup_logging_from_config(log_file, config)
+    if args.worker:
+        run_page_worker(config, args.worker, run_id=args.run_id, worker_id=worker_id)
+        return
+
+    run_once = run_scraper_once
+    if args.profile:
+        # Only imported when asked for, so normal runs pay nothing for it
+        from profiling import profile_run
+        run_once = lambda cfg: profile_run(run_scraper_once, cfg)
+
+    if args.schedule:
+        run_scheduler(
+            lambda: run_with_retries(config, run_once=run_once),
+            min_interval_seconds=config.get("schedule_min_interval_minutes", 15) * 60,
+            max_interval_seconds=config.get("schedule_max_interval_minutes", 240) * 60,
+            jitter_seconds=config.get("schedule_jitter_seconds", 120),
+        )
+        return
+
+    # One-off run (e.g. from cron): don't start on top of a run that's still going
+    with SingleFlightLock() as acquired:
+        if not acquired:
+            logger.warning("Another scraper run is still in progress. Skipping this run.")
+            return
+        run_with_retries(config, run_once=run_once)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
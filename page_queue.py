@@ -0,0 +1,337 @@
+# page_queue.py
+"""
+Page-range work queue for scraping the Connections table with several
+browsers at once, in several processes or on several hosts.
+
+The coordinator (the normal scraper run) plans pagination, splits pages
+1..N into work items in a SQLite database and starts local worker processes
+(main.py --worker). Workers on other hosts can join by pointing at the same
+database on a shared volume. Each worker has its own logged-in browser,
+claims an item with a lease, scrapes its pages by URL and stores the records.
+A claimed item whose lease runs out (a worker died or hung) is handed out
+again, up to MAX_ATTEMPTS times. Once every item is done, merge() puts the
+records back together in page order: the same list scrape_connections_table
+returns for the whole (planned) table.
+
+Only works with a URL-mode PagePlan with a known page count (see
+pagination.py); otherwise the run scrapes in one browser as before.
+"""
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import subprocess
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PAGE_QUEUE_FILE = os.path.join(BASE_DIR, "page_queue.sqlite")
+
+DEFAULT_PAGES_PER_ITEM = 5
+# A worker that holds an item longer than this is presumed dead
+DEFAULT_LEASE_SECONDS = 600
+# Claims of one item before the run gives up on it
+MAX_ATTEMPTS = 3
+POLL_SECONDS = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    plan TEXT NOT NULL,
+    lease_seconds REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    run_id TEXT NOT NULL,
+    first_page INTEGER NOT NULL,
+    last_page INTEGER,              -- NULL: keep going to the end of the table
+    state TEXT NOT NULL DEFAULT 'pending',  -- pending, claimed, done, failed
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    records TEXT,
+    PRIMARY KEY (run_id, first_page)
+);
+"""
+
+WorkItem = namedtuple("WorkItem", "run_id first_page last_page attempts plan")
+
+class PageQueueError(RuntimeError):
+    pass
+
+class PageQueue:
+    """
+    The work queue in the SQLite database at 'path'.
+
+    Every state change runs in its own BEGIN IMMEDIATE transaction, so
+    claims from concurrent workers never hand out the same item twice.
+    """
+
+    def __init__(self, path=PAGE_QUEUE_FILE, timeout=30):
+        self.path = path
+        self.timeout = timeout
+        db = self._connect()
+        try:
+            db.executescript(SCHEMA)
+        finally:
+            db.close()
+
+    def _connect(self):
+        # Autocommit mode; transactions are opened explicitly
+        return sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+
+    @contextmanager
+    def _transaction(self):
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+        finally:
+            db.close()
+
+    def create_run(self, plan, pages_per_item=DEFAULT_PAGES_PER_ITEM, lease_seconds=DEFAULT_LEASE_SECONDS,
+                   run_id=None):
+        """
+        Split the planned pages into items; the last one has no last page and
+        keeps going past the planned total to the end of the table, as a
+        single-browser scrape does.
+        Every claim of the run's items holds them for lease_seconds.
+        Returns the run id.
+        """
+        if not plan.url_mode or not plan.total_pages:
+            raise PageQueueError(f"Can't split {plan!r}: needs page URLs and a page count")
+        run_id = run_id or uuid.uuid4().hex
+        items = []
+        for first_page in range(1, plan.total_pages + 1, pages_per_item):
+            last_page = first_page + pages_per_item - 1
+            items.append((run_id, first_page, last_page if last_page < plan.total_pages else None))
+        with self._transaction() as db:
+            db.execute(
+                "INSERT INTO runs (run_id, plan, lease_seconds, created_at) VALUES (?, ?, ?, ?)",
+                (run_id, json.dumps(plan.as_dict()), lease_seconds, time.time()),
+            )
+            db.executemany("INSERT INTO items (run_id, first_page, last_page) VALUES (?, ?, ?)", items)
+        logger.info("Queued %d work items of %d pages for run %s (%r).", len(items), pages_per_item, run_id, plan)
+        return run_id
+
+    def claim(self, worker, run_id=None):
+        """
+        Claim the next pending (or lease-expired) item, oldest run first.
+        Returns a WorkItem, or None if there is nothing to do right now.
+        """
+        now = time.time()
+        query = (
+            "SELECT items.run_id, first_page, last_page, attempts, state, worker, plan, lease_seconds FROM items "
+            "JOIN runs USING (run_id) "
+            "WHERE (state = 'pending' OR (state = 'claimed' AND lease_until < ?))"
+        )
+        params = [now]
+        if run_id is not None:
+            query += " AND items.run_id = ?"
+            params.append(run_id)
+        query += " ORDER BY created_at, first_page LIMIT 1"
+        with self._transaction() as db:
+            while True:
+                row = db.execute(query, params).fetchone()
+                if row is None:
+                    return None
+                item_run, first_page, last_page, attempts, state, previous_worker, plan, lease_seconds = row
+                if state == "claimed":
+                    logger.warning(
+                        "Lease of %s on pages %d+ (run %s) expired; handing the item out again.",
+                        previous_worker, first_page, item_run,
+                    )
+                if attempts >= MAX_ATTEMPTS:
+                    db.execute(
+                        "UPDATE items SET state = 'failed', error = COALESCE(error, 'lease expired') "
+                        "WHERE run_id = ? AND first_page = ?",
+                        (item_run, first_page),
+                    )
+                    continue
+                db.execute(
+                    "UPDATE items SET state = 'claimed', worker = ?, lease_until = ?, attempts = attempts + 1 "
+                    "WHERE run_id = ? AND first_page = ?",
+                    (worker, now + lease_seconds, item_run, first_page),
+                )
+                return WorkItem(item_run, first_page, last_page, attempts + 1, json.loads(plan))
+
+    def complete(self, item, worker, records):
+        """
+        Store an item's records. Returns False (and drops them) if the lease
+        was lost to another worker in the meantime.
+        """
+        with self._transaction() as db:
+            updated = db.execute(
+                "UPDATE items SET state = 'done', records = ?, lease_until = NULL, error = NULL "
+                "WHERE run_id = ? AND first_page = ? AND worker = ? AND state = 'claimed'",
+                (json.dumps(records), item.run_id, item.first_page, worker),
+            ).rowcount
+        if not updated:
+            logger.warning("Lost the lease on pages %d+ before finishing; discarding them.", item.first_page)
+        return bool(updated)
+
+    def release(self, item, worker, error):
+        """
+        Give an item back after a failure, to be retried (or failed after MAX_ATTEMPTS).
+        """
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE items SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "worker = NULL, lease_until = NULL, error = ? "
+                "WHERE run_id = ? AND first_page = ? AND worker = ? AND state = 'claimed'",
+                (MAX_ATTEMPTS, str(error)[:1000], item.run_id, item.first_page, worker),
+            )
+
+    def release_worker(self, run_id, worker):
+        """
+        Hand out again the items of a worker known to be gone, without waiting for its leases.
+        """
+        with self._transaction() as db:
+            released = db.execute(
+                "UPDATE items SET state = 'pending', worker = NULL, lease_until = NULL "
+                "WHERE run_id = ? AND worker = ? AND state = 'claimed'",
+                (run_id, worker),
+            ).rowcount
+        if released:
+            logger.warning("Worker %s exited holding %d item(s); handing them out again.", worker, released)
+        return released
+
+    def counts(self, run_id):
+        """
+        {state: number of items} for a run.
+        """
+        db = self._connect()
+        try:
+            rows = db.execute("SELECT state, COUNT(*) FROM items WHERE run_id = ? GROUP BY state", (run_id,))
+            return dict(rows.fetchall())
+        finally:
+            db.close()
+
+    def merge(self, run_id):
+        """
+        All records of a finished run, in page order.
+
+        Connections seen in more than one item (the table shifted between
+        items, e.g. a connection was added while scraping) are logged; they
+        are kept, just as a single-browser scrape would keep them.
+        """
+        counts = self.counts(run_id)
+        if set(counts) != {"done"}:
+            raise PageQueueError(f"Run {run_id} isn't finished: {counts}")
+        db = self._connect()
+        try:
+            records = []
+            seen = set()
+            duplicates = []
+            for (chunk,) in db.execute("SELECT records FROM items WHERE run_id = ? ORDER BY first_page", (run_id,)):
+                for record in json.loads(chunk):
+                    if record.get("ID") in seen:
+                        duplicates.append(record.get("ID"))
+                    seen.add(record.get("ID"))
+                    records.append(record)
+        finally:
+            db.close()
+        if duplicates:
+            logger.warning(
+                "Run %s: %d connection ID(s) were scraped more than once (e.g. %s); "
+                "the table probably changed while it was being scraped.",
+                run_id, len(duplicates), ", ".join(duplicates[:5])
+            )
+        return records
+
+    def delete_run(self, run_id):
+        with self._transaction() as db:
+            db.execute("DELETE FROM items WHERE run_id = ?", (run_id,))
+            db.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def work_on_queue(queue, scrape_item, worker, run_id=None, idle_seconds=0, poll_seconds=POLL_SECONDS):
+    """
+    Claim and scrape items until there is nothing left to claim (after
+    waiting up to idle_seconds for new work). scrape_item(item) returns the
+    item's records; if it raises, the item is released and the error re-raised,
+    since the worker's browser is then in an unknown state.
+    Returns the number of items completed.
+    """
+    completed = 0
+    idle_since = time.monotonic()
+    while True:
+        item = queue.claim(worker, run_id=run_id)
+        if item is None:
+            if time.monotonic() - idle_since >= idle_seconds:
+                return completed
+            time.sleep(poll_seconds)
+            continue
+        logger.info("Worker %s scraping pages %d-%s (attempt %d).",
+                    worker, item.first_page, item.last_page or "end", item.attempts)
+        try:
+            records = scrape_item(item)
+        except Exception as e:
+            queue.release(item, worker, e)
+            raise
+        if queue.complete(item, worker, records):
+            completed += 1
+        idle_since = time.monotonic()
+
+def coordinate_run(queue, plan, scrape_item, worker_command=None, local_workers=0,
+                   pages_per_item=DEFAULT_PAGES_PER_ITEM, lease_seconds=DEFAULT_LEASE_SECONDS,
+                   poll_seconds=POLL_SECONDS):
+    """
+    Scrape the planned pages through the queue and return the merged records.
+
+    Starts 'local_workers' processes running worker_command + [--run-id, --worker-id]
+    options, works on items itself with scrape_item, then waits for the rest
+    (re-claiming items of workers that exited or whose leases expired).
+    """
+    run_id = queue.create_run(plan, pages_per_item=pages_per_item, lease_seconds=lease_seconds)
+    me = default_worker_id()
+    workers = {}
+    try:
+        for n in range(1, local_workers + 1):
+            worker_id = f"{socket.gethostname()}-local{n}"
+            command = list(worker_command) + ["--run-id", run_id, "--worker-id", worker_id]
+            workers[worker_id] = subprocess.Popen(command)
+        logger.info("Started %d local scrape worker(s) for run %s.", len(workers), run_id)
+
+        while True:
+            work_on_queue(queue, scrape_item, me, run_id=run_id)
+            counts = queue.counts(run_id)
+            if counts.get("failed"):
+                raise PageQueueError(f"Run {run_id}: {counts['failed']} work item(s) failed; see page_queue errors")
+            if set(counts) == {"done"}:
+                break
+            for worker_id, process in list(workers.items()):
+                if process.poll() is not None:
+                    logger.info("Scrape worker %s exited with code %s.", worker_id, process.returncode)
+                    queue.release_worker(run_id, worker_id)
+                    del workers[worker_id]
+            time.sleep(poll_seconds)
+
+        records = queue.merge(run_id)
+        logger.info("Merged %d records from run %s.", len(records), run_id)
+        return records
+    finally:
+        for process in workers.values():
+            if process.poll() is None:
+                process.terminate()
+        for process in workers.values():
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        # Finished or abandoned, nobody should work on it any more
+        queue.delete_run(run_id)
@@ -0,0 +1,233 @@
+# pagination.py
+"""
+Pagination planner for the Connections table.
+
+Instead of clicking "Next" until a page comes back empty, plan_pagination()
+works out, once per run, how the dashboard pages:
+  - the page size, and whether a bigger one can be asked for in the URL,
+  - the total number of rows/pages, from "1-50 of 1234" / "Page 1 of 25" /
+    "1234 results" style indicators,
+  - whether a page can be opened directly by URL (?page=N).
+The scraper then opens page URLs directly, and the page count is known up
+front (for progress reporting and for resuming a run).
+
+Which query parameters work is remembered in pagination_plan.json, so
+discovery costs a couple of extra page loads only on the first run (and
+once a day when the dashboard didn't take any of them).
+"""
+
+import logging
+import math
+import os
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+import run_metrics
+from utils import read_json_file, write_json_file
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PAGINATION_CACHE_FILE = os.path.join(BASE_DIR, "pagination_plan.json")
+
+CONNECTIONS_URL = "https://dashboard.tuuthfairy.com/connection"
+DEFAULT_MAX_PAGE_SIZE = 500
+PAGE_LOAD_TIMEOUT = 20
+# After finding no working URL parameters, look again after this long
+RETRY_DISCOVERY_SECONDS = 24 * 60 * 60
+
+# (page parameter, page-size parameter) pairs tried in order
+CANDIDATE_PARAMS = (
+    ("page", "pageSize"),
+    ("page", "limit"),
+    ("page", "per_page"),
+    ("page", "size"),
+)
+
+# Runs in the browser: row count, first row's first cell, and any
+# total/page-count indicators found in the page text
+PAGE_INFO_SCRIPT = """
+const text = document.body ? document.body.innerText : "";
+const num = s => parseInt(s.replace(/,/g, ""), 10);
+let m, range = null, pages = null, total = null;
+if ((m = text.match(/(\\d[\\d,]*)\\s*(?:-|\\u2013|to)\\s*(\\d[\\d,]*)\\s+of\\s+(\\d[\\d,]*)/i))) {
+  range = [num(m[1]), num(m[2]), num(m[3])];
+}
+if ((m = text.match(/page\\s+(\\d+)\\s+of\\s+(\\d+)/i))) pages = [num(m[1]), num(m[2])];
+// Not a page size such as "50 rows per page" or "Show 50 rows"
+if ((m = text.match(/(?<!show(?:ing)?\\s+|[\\d,])(\\d[\\d,]*)\\s+(?:total|results|connections|rows)\\b(?!\\s*(?:per|\\/)\\s*page)/i))) {
+  total = num(m[1]);
+}
+const rows = document.querySelectorAll("table tbody tr");
+const first = rows.length ? rows[0].querySelector("td") : null;
+return {rows: rows.length, firstId: first ? first.innerText.trim() : null, range, pages, total};
+"""
+
+class PagePlan:
+    """
+    How to page through the Connections table.
+
+    In URL mode (page_param set) page_url(n) opens page n directly;
+    otherwise the scraper keeps clicking "Next". total_pages is None when
+    the dashboard shows no total.
+    """
+
+    def __init__(self, base_url, page_size, total_rows=None, page_param=None, size_param=None,
+                 requested_size=None):
+        self.base_url = base_url
+        self.page_size = page_size
+        self.total_rows = total_rows
+        self.page_param = page_param
+        self.size_param = size_param
+        self.requested_size = requested_size
+        self.total_pages = math.ceil(total_rows / page_size) if total_rows is not None and page_size else None
+
+    @property
+    def url_mode(self):
+        return self.page_param is not None
+
+    def page_url(self, page):
+        params = {self.page_param: page}
+        if self.size_param:
+            params[self.size_param] = self.requested_size
+        return _with_query(self.base_url, params)
+
+    def open_page(self, driver, page):
+        """
+        Load page 'page' by URL and wait for its rows. Returns the page info.
+        """
+        return _load(driver, self.page_url(page))
+
+    def as_dict(self):
+        return {
+            "base_url": self.base_url,
+            "page_size": self.page_size,
+            "total_rows": self.total_rows,
+            "page_param": self.page_param,
+            "size_param": self.size_param,
+            "requested_size": self.requested_size,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def __repr__(self):
+        mode = f"url ?{self.page_param}=N" + (f"&{self.size_param}={self.requested_size}" if self.size_param else "")
+        return (f"PagePlan({mode if self.url_mode else 'click Next'}, page_size={self.page_size}, "
+                f"total_rows={self.total_rows}, total_pages={self.total_pages})")
+
+def plan_pagination(driver, base_url=CONNECTIONS_URL, max_page_size=DEFAULT_MAX_PAGE_SIZE,
+                    candidates=CANDIDATE_PARAMS, cache_path=PAGINATION_CACHE_FILE):
+    """
+    Work out how to page through the table. Expects page 1 to be loaded and
+    leaves page 1 loaded (with the larger page size, if one was accepted).
+    """
+    first = _page_info(driver)
+    if not first["rows"] or not first["firstId"]:
+        logger.info("Connections table looks empty; not planning pagination.")
+        return PagePlan(base_url, first["rows"])
+
+    cache = read_json_file(cache_path)
+    recently_checked = time.time() - cache.get("checked_at", 0) < RETRY_DISCOVERY_SECONDS
+    if cache.get("page_param") and (cache.get("size_param") or recently_checked):
+        # Known to work (or no better page size was found lately): only re-check that
+        ordered = [(cache["page_param"], cache.get("size_param"))]
+    elif recently_checked:
+        ordered = []
+    else:
+        ordered = list(candidates)
+
+    # A plan that pages by URL but at the default size is kept as a fallback
+    # while the remaining candidates are tried for a working size parameter
+    plan = None
+    for page_param, size_param in ordered:
+        candidate = _try_url_params(driver, base_url, first, page_param, size_param, max_page_size)
+        if candidate is not None and (plan is None or candidate.size_param):
+            plan = candidate
+            if candidate.size_param:
+                break
+
+    if plan is not None:
+        if not plan.size_param:
+            plan.open_page(driver, 1)
+        write_json_file(cache_path, {
+            "page_param": plan.page_param, "size_param": plan.size_param, "checked_at": time.time(),
+        })
+    else:
+        if ordered:
+            logger.info("Dashboard didn't accept page URL parameters; paging with the Next link.")
+            write_json_file(cache_path, {"checked_at": time.time()})
+            _load(driver, base_url)
+        plan = PagePlan(base_url, first["rows"], total_rows=_total_rows(first))
+
+    logger.info("Pagination plan: %r", plan)
+    if plan.total_pages:
+        run_metrics.incr("pages_planned", plan.total_pages)
+    return plan
+
+def _try_url_params(driver, base_url, first, page_param, size_param, max_page_size):
+    """
+    Check that ?page_param=2 opens the second page (and whether size_param
+    raises the page size). Returns a URL-mode PagePlan, or None.
+    """
+    plan = PagePlan(base_url, first["rows"], page_param=page_param, size_param=size_param,
+                    requested_size=max_page_size)
+    page_one = plan.open_page(driver, 1)
+    if page_one["firstId"] != first["firstId"]:
+        # The parameters changed the ordering or broke the page; don't use them
+        return None
+    if page_one["rows"] > first["rows"]:
+        plan.page_size = page_one["rows"]
+    else:
+        plan.size_param = None
+        plan.requested_size = None
+
+    total_rows = _total_rows(page_one)
+    if total_rows is not None and total_rows <= plan.page_size:
+        # Everything fits on page 1
+        return PagePlan(base_url, plan.page_size, total_rows, page_param, plan.size_param, plan.requested_size)
+
+    page_two = plan.open_page(driver, 2)
+    if not page_two["firstId"] or page_two["firstId"] == page_one["firstId"]:
+        return None
+    plan.open_page(driver, 1)
+    return PagePlan(base_url, plan.page_size, total_rows, page_param, plan.size_param, plan.requested_size)
+
+def _total_rows(info):
+    if info["range"]:
+        return info["range"][2]
+    if info["total"] is not None:
+        return info["total"]
+    if info["pages"] and info["rows"]:
+        # Upper bound; the last page may be partial
+        return info["pages"][1] * info["rows"]
+    return None
+
+def _page_info(driver):
+    try:
+        return driver.execute_script(PAGE_INFO_SCRIPT)
+    except WebDriverException as e:
+        logger.warning("Could not read pagination info: %s", e)
+        return {"rows": 0, "firstId": None, "range": None, "pages": None, "total": None}
+
+def _load(driver, url):
+    driver.get(url)
+    try:
+        WebDriverWait(driver, PAGE_LOAD_TIMEOUT).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "table tbody tr"))
+        )
+    except TimeoutException:
+        logger.info("No table rows after loading %s", url)
+    return _page_info(driver)
+
+def _with_query(url, params):
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query))
+    query.update({key: str(value) for key, value in params.items()})
+    return urlunsplit(parts._replace(query=urlencode(query)))
@@ -0,0 +1,104 @@
+# profiling.py
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import tracemalloc
+from datetime import datetime
+
+import run_metrics
+from utils import writable_path
+
+logger = logging.getLogger(__name__)
+
+# One sub-folder per profiled run
+PROFILE_DIR = writable_path("profiles")
+
+# Frames kept per allocation; deeper traces cost more memory while profiling
+TRACEMALLOC_FRAMES = 25
+TOP_N = 30
+
+class RunProfiler:
+    """
+    CPU (cProfile) and memory (tracemalloc) profile of one scraper run.
+
+    A tracemalloc snapshot is taken at the end of every run_metrics span, so
+    the summary shows which stage grew memory and where it was allocated.
+
+    Output folder contents:
+      cpu.prof               - cProfile stats (open with pstats or snakeviz)
+      NN_<stage>.tracemalloc - snapshot at each stage boundary (tracemalloc.Snapshot.load)
+      summary.txt            - top functions and allocation sites
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self._profile = cProfile.Profile()
+        self._snapshots = []
+
+    def __enter__(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        run_metrics.add_span_listener(self._on_span)
+        self._profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._profile.disable()
+        run_metrics.remove_span_listener(self._on_span)
+        self._take_snapshot("end")
+        tracemalloc.stop()
+        self._write_results()
+        logger.info("Profile written to %s", self.output_dir)
+
+    def _on_span(self, entry):
+        self._take_snapshot(entry["name"])
+
+    def _take_snapshot(self, label):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        index = len(self._snapshots)
+        snapshot.dump(os.path.join(self.output_dir, f"{index:02d}_{label}.tracemalloc"))
+        current, peak = tracemalloc.get_traced_memory()
+        self._snapshots.append((label, snapshot, current, peak))
+
+    def _write_results(self):
+        self._profile.dump_stats(os.path.join(self.output_dir, "cpu.prof"))
+
+        out = io.StringIO()
+        out.write(f"Profile of scraper run, {datetime.now().isoformat(timespec='seconds')}\n\n")
+
+        for sort_key in ("cumulative", "tottime"):
+            out.write(f"=== Top {TOP_N} functions by {sort_key} time ===\n")
+            stats = pstats.Stats(self._profile, stream=out)
+            stats.strip_dirs().sort_stats(sort_key).print_stats(TOP_N)
+
+        out.write("=== Traced memory at each stage boundary ===\n")
+        previous = None
+        for label, snapshot, current, peak in self._snapshots:
+            out.write(f"{label:<20} current {current / 1e6:9.2f} MB   peak {peak / 1e6:9.2f} MB\n")
+            if previous is not None:
+                for stat in snapshot.compare_to(previous, "lineno")[:3]:
+                    out.write(f"    {stat}\n")
+            previous = snapshot
+
+        if self._snapshots:
+            out.write(f"\n=== Top {TOP_N} allocation sites at end of run ===\n")
+            final = self._snapshots[-1][1]
+            for stat in final.statistics("lineno")[:TOP_N]:
+                out.write(f"{stat}\n")
+
+        with open(os.path.join(self.output_dir, "summary.txt"), "w", encoding="utf-8") as f:
+            f.write(out.getvalue())
+
+def profile_run(run_once, config, profile_dir=PROFILE_DIR):
+    """
+    Call run_once(config) under RunProfiler, saving results to a per-run folder.
+    """
+    output_dir = os.path.join(profile_dir, datetime.now().strftime("%Y%m%d-%H%M%S"))
+    with RunProfiler(output_dir):
+        return run_once(config)
@@ -0,0 +1,122 @@
+# progress.py
+"""
+Machine-readable progress for a scraper run, one JSON object per line.
+
+Events (all carry "t", seconds since the reporter started):
+    {"event": "run_start", "expected": {"stages": {"login": 11.2, ...}, "rows": 1450}}
+    {"event": "stage_start", "stage": "scrape"}
+    {"event": "progress", "stage": "scrape", "page": 3, "pages_total": 25, "rows": 150, "rows_per_second": 12.4}
+    {"event": "stage_end", "stage": "scrape", "seconds": 41.0, "status": "ok"}
+    {"event": "run_end", "success": true, "seconds": 95.3}
+
+"expected" comes from the last successful run report, so a consumer can draw
+a progress bar and ETA; it is empty on the very first run.
+run_scraper.txt (the GUI launcher) reads these from main_new.py --progress-events.
+"""
+
+import json
+import sys
+import threading
+import time
+
+import run_metrics
+
+# Row-count updates between page events are sent at most this often
+MIN_ROWS_INTERVAL_SECONDS = 0.5
+
+class ProgressReporter:
+    """
+    Turns run_metrics spans and counters into progress events on 'stream'.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._reset_run()
+
+    def _reset_run(self):
+        self._stage = None
+        self._page = 0
+        self._pages_total = None
+        self._rows = 0
+        self._scrape_started = None
+        self._last_rows_event = 0.0
+
+    def install(self):
+        run_metrics.add_span_start_listener(self._on_span_start)
+        run_metrics.add_span_listener(self._on_span_end)
+        run_metrics.add_counter_listener(self._on_counter)
+        return self
+
+    def emit(self, event, **fields):
+        fields = {"event": event, "t": round(time.perf_counter() - self._t0, 3), **fields}
+        line = json.dumps(fields, separators=(",", ":"))
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+    def _on_span_start(self, name):
+        if name == "run":
+            self._reset_run()
+            self.emit("run_start", expected=_expected_from_last_run())
+            return
+        self._stage = name
+        if name == "scrape":
+            self._scrape_started = time.perf_counter()
+        self.emit("stage_start", stage=name)
+
+    def _on_span_end(self, entry):
+        if entry["name"] == "run":
+            self.emit("run_end", success=entry["status"] == "ok", seconds=entry["seconds"])
+            return
+        self.emit("stage_end", stage=entry["name"], seconds=entry["seconds"], status=entry["status"])
+
+    def _on_counter(self, name, value):
+        if name == "pages_planned":
+            # From pagination.py; None (unknown) until then
+            self._pages_total = value
+            return
+        if name == "pages":
+            self._page = value
+        elif name == "rows_scraped":
+            self._rows = value
+            now = time.perf_counter()
+            if now - self._last_rows_event < MIN_ROWS_INTERVAL_SECONDS:
+                return
+        else:
+            return
+        self._last_rows_event = time.perf_counter()
+        self.emit(
+            "progress",
+            stage=self._stage,
+            page=self._page,
+            pages_total=self._pages_total,
+            rows=self._rows,
+            rows_per_second=self._rows_per_second(),
+        )
+
+    def _rows_per_second(self):
+        if self._scrape_started is None:
+            return None
+        elapsed = time.perf_counter() - self._scrape_started
+        return round(self._rows / elapsed, 2) if elapsed > 0 else None
+
+def _expected_from_last_run():
+    report = run_metrics.last_report()
+    if not report:
+        return {}
+    stages = {}
+    for entry in report.get("spans", []):
+        if entry["name"] != "run":
+            stages[entry["name"]] = round(stages.get(entry["name"], 0.0) + entry["seconds"], 3)
+    return {
+        "stages": stages,
+        "rows": report.get("counters", {}).get("rows_scraped"),
+    }
+
+def install_progress_events(stream=None):
+    """
+    Start writing progress events for every following run to 'stream' (stdout by default).
+    """
+    return ProgressReporter(stream).install()
@@ -4,9 +4,19 @@ import requests
 import csv
 import io
 import logging
+import sys
+import time
+
+import run_metrics
 
 logger = logging.getLogger(__name__)
 
+# Reused across runs so a long-running process keeps its HTTP connection warm
+_session = requests.Session()
+
+# (redash_url, built_at, location_map) from the last get_location_map() call
+_location_map_cache = None
+
 def fetch_redash_csv(redash_url, api_key=None):
     """
     Retrieve CSV data from Redash and return as a list of dict rows.
@@ -18,7 +28,8 @@ def fetch_redash_csv(redash_url, api_key=None):
         logger.debug("Using API key for authorization.")
         headers["Authorization"] = f"Key {api_key}"
 
-    response = requests.get(redash_url, headers=headers)
+    response = _session.get(redash_url, headers=headers)
+    run_metrics.incr("redash_api_calls")
     response.raise_for_status()  # raise an exception if the request fails
 
     logger.debug("Redash response received. Status code: %s", response.status_code)
@@ -42,7 +53,8 @@ def build_location_map(redash_rows):
     location_map = {}
 
     for row in redash_rows:
-        loc_id = row["locationId"]  # CSV column name
+        # Interned, so IDs from location_helpers.process_location_fields() are the same objects
+        loc_id = sys.intern(row["locationId"])  # CSV column name
         if loc_id not in location_map:
             location_map[loc_id] = {
                 "practiceGroupId": row["practiceGroupId"],
@@ -50,4 +62,28 @@ def build_location_map(redash_rows):
             }
 
     logger.info("Built location map with %d unique locationIds.", len(location_map))
-    return location_map
\ No newline at end of file
+    return location_map
+
+def get_location_map(redash_url, api_key=None, max_age_seconds=0):
+    """
+    Fetch the Redash CSV and build the location map, reusing the map built
+    earlier in this process if it is younger than max_age_seconds.
+
+    With max_age_seconds=0 this always fetches, same as calling
+    fetch_redash_csv() and build_location_map() directly.
+    """
+    global _location_map_cache
+
+    if _location_map_cache and max_age_seconds > 0:
+        cached_url, built_at, location_map = _location_map_cache
+        age = time.monotonic() - built_at
+        if cached_url == redash_url and age < max_age_seconds:
+            logger.info(
+                "Reusing location map built %.0f seconds ago (%d locationIds).",
+                age, len(location_map)
+            )
+            return location_map
+
+    location_map = build_location_map(fetch_redash_csv(redash_url, api_key=api_key))
+    _location_map_cache = (redash_url, time.monotonic(), location_map)
+    return location_map
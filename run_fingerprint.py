@@ -0,0 +1,164 @@
+# run_fingerprint.py
+"""
+Run-level content fingerprint, used to skip work when nothing changed.
+
+The inputs fingerprint combines hashes of the scraped Connections table
+(built row by row while scraping, see scrape_connections_table), the Redash
+location map, the "Run" practice groups and the status/domain rules. The
+output fingerprint is a hash of the final regrouped rows.
+
+run_fingerprint.json keeps both from the last full run, and
+run_fingerprint_rows.json that run's output rows:
+  - inputs unchanged: enrich, filter, history and the Sheets upload are all
+    skipped; the previous output is returned and only last_checked moves,
+  - inputs changed but output unchanged: history and the Sheets upload are
+    skipped,
+  - at least once every max_age_seconds a full run happens anyway, so a
+    hand-edited sheet doesn't stay stale forever.
+
+The fingerprints are cleared before history and the Sheets upload are
+written and only stored again once both succeeded, so a run that dies
+half-way through an upload is never taken as the last full run.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+from utils import read_json_file, write_json_file
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FINGERPRINT_FILE = os.path.join(BASE_DIR, "run_fingerprint.json")
+# Written by full runs only, so noting an unchanged run doesn't rewrite them
+ROWS_FILE = os.path.join(BASE_DIR, "run_fingerprint_rows.json")
+# Force a full run (history + Sheets rewrite) at least this often
+FULL_RUN_MAX_AGE_SECONDS = 24 * 60 * 60
+
+# The last location map hashed, as (map, digest); scheduler mode reuses the same map object
+_location_map_digest = None
+
+class ContentDigest:
+    """
+    Order-sensitive hash of a sequence of records, fed one at a time.
+    """
+
+    def __init__(self):
+        self._hash = hashlib.blake2b(digest_size=16)
+        self.count = 0
+
+    def add(self, record):
+        self._hash.update(json.dumps(record, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8"))
+        self._hash.update(b"\x1e")
+        self.count += 1
+
+    def hexdigest(self):
+        return f"{self._hash.hexdigest()}:{self.count}"
+
+def digest_records(records):
+    digest = ContentDigest()
+    for record in records:
+        digest.add(record)
+    return digest.hexdigest()
+
+def location_map_digest(location_map):
+    """
+    Hash of the location map, computed once per map object.
+    """
+    global _location_map_digest
+
+    if _location_map_digest is not None and _location_map_digest[0] is location_map:
+        return _location_map_digest[1]
+    digest = ContentDigest()
+    for loc_id, info in location_map.items():
+        digest.add([loc_id, info])
+    _location_map_digest = (location_map, digest.hexdigest())
+    return _location_map_digest[1]
+
+def inputs_fingerprint(table_digest, location_map, practice_groups, row_rules):
+    """
+    Fingerprint of everything the run's output is computed from.
+    'table_digest' is the ContentDigest fed by the scraper.
+    """
+    # Practice groups are compared as a set, as filter_by_practice_groups does
+    groups = sorted({group.strip().lower() for group in practice_groups})
+    parts = [
+        "table", table_digest.hexdigest(),
+        "locations", location_map_digest(location_map),
+        "groups", digest_records(groups),
+        "rules", row_rules.signature(),
+    ]
+    return hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+class RunFingerprint:
+    """
+    The fingerprints of the last full run, stored in 'path'.
+    """
+
+    def __init__(self, path=FINGERPRINT_FILE, max_age_seconds=FULL_RUN_MAX_AGE_SECONDS, rows_path=ROWS_FILE):
+        self.path = path
+        self.rows_path = rows_path
+        self.max_age_seconds = max_age_seconds
+        self.previous = read_json_file(path)
+        # Files written before the rows had their own file
+        self.previous.pop("rows", None)
+        # Kept for last_changed, past invalidate()
+        self._last_output = self.previous.get("output")
+
+    def _fresh(self):
+        return time.time() - self.previous.get("full_run_at", 0) < self.max_age_seconds
+
+    def inputs_unchanged(self, inputs):
+        return self._fresh() and self.previous.get("inputs") == inputs and os.path.exists(self.rows_path)
+
+    def output_unchanged(self, output):
+        return self._fresh() and self.previous.get("output") == output
+
+    @property
+    def previous_rows(self):
+        rows = read_json_file(self.rows_path)
+        return rows if isinstance(rows, list) else []
+
+    def mark_checked(self, inputs=None):
+        """
+        Note a run that found nothing new (with its inputs, if they changed).
+        """
+        if inputs is not None:
+            self.previous["inputs"] = inputs
+        self.previous["last_checked"] = _now()
+        write_json_file(self.path, self.previous)
+
+    def invalidate(self):
+        """
+        Forget the last full run's fingerprints before history and Sheets are
+        written, so a run that fails part-way can't be skipped over next time.
+        """
+        self.previous.pop("inputs", None)
+        self.previous.pop("output", None)
+        write_json_file(self.path, self.previous)
+
+    def record(self, inputs, output, rows):
+        """
+        Store a full run's fingerprints and output rows.
+        """
+        now = _now()
+        changed = self._last_output != output
+        self._last_output = output
+        rows_saved = write_json_file(self.rows_path, rows)
+        self.previous = {
+            "output": output,
+            "full_run_at": time.time(),
+            "last_checked": now,
+            "last_changed": now if changed else self.previous.get("last_changed", now),
+        }
+        if rows_saved:
+            # Without the rows, an unchanged run couldn't return them
+            self.previous["inputs"] = inputs
+        write_json_file(self.path, self.previous)
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -0,0 +1,290 @@
+# run_metrics.py
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# One JSON report per run, plus a Prometheus textfile-collector file with the latest run
+REPORT_DIR = os.path.join(BASE_DIR, "run_reports")
+PROMETHEUS_FILE = os.path.join(BASE_DIR, "tuuthfairy_scraper.prom")
+MAX_REPORTS = 500
+
+METRIC_PREFIX = "tuuthfairy_scraper"
+
+class RunMetrics:
+    """
+    Timing spans, counters and peak memory for a single scraper run.
+
+    Spans are opened with `with metrics.span("login"):` and may nest.
+    Counters are bumped with metrics.incr("pages"). Both are thread-safe.
+    """
+
+    def __init__(self, run_id=None):
+        self.run_id = run_id or datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.started_at = datetime.now()
+        self.spans = []
+        self.counters = {}
+        self.success = None
+        # "run" once start_run() has reset the memory high-water mark for this run,
+        # otherwise the peak covers the whole process (earlier runs included)
+        self.peak_rss_scope = "process"
+        # Names of the spans currently open, innermost last
+        self.active_spans = []
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name):
+        """
+        Time a stage of the run. Exceptions are recorded and re-raised.
+        """
+        start = time.perf_counter()
+        status = "ok"
+        for listener in list(_span_start_listeners):
+            listener(name)
+        self.active_spans.append(name)
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.active_spans.remove(name)
+            seconds = time.perf_counter() - start
+            entry = {
+                "name": name,
+                "start_offset": round(start - self._t0, 4),
+                "seconds": round(seconds, 4),
+                "status": status,
+            }
+            with self._lock:
+                self.spans.append(entry)
+            logger.info("Stage %s finished in %.2fs (%s).", name, seconds, status)
+            for listener in list(_span_listeners):
+                listener(entry)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            value = self.counters[name] = self.counters.get(name, 0) + amount
+        for listener in list(_counter_listeners):
+            listener(name, value)
+
+    def finish(self, success):
+        self.success = success
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "run_id": self.run_id,
+                "started_at": self.started_at.isoformat(timespec="seconds"),
+                "duration_seconds": round(time.perf_counter() - self._t0, 4),
+                "success": self.success,
+                "peak_rss_bytes": peak_rss_bytes(),
+                "peak_rss_scope": self.peak_rss_scope,
+                "spans": list(self.spans),
+                "counters": dict(self.counters),
+            }
+
+    def write_reports(self, report_dir=REPORT_DIR, prometheus_path=PROMETHEUS_FILE):
+        """
+        Write this run's JSON report and refresh the Prometheus textfile.
+        Failures are logged, never raised, so reporting can't break a run.
+        """
+        report = self.to_dict()
+        try:
+            os.makedirs(report_dir, exist_ok=True)
+            report_path = os.path.join(report_dir, f"run_{self.run_id}.json")
+            _atomic_write(report_path, json.dumps(report, indent=2))
+            _prune_reports(report_dir, MAX_REPORTS)
+            logger.info("Wrote run report to %s", report_path)
+        except OSError as exc:
+            logger.warning("Could not write run report: %s", exc)
+
+        if prometheus_path:
+            try:
+                _atomic_write(prometheus_path, _prometheus_text(report))
+            except OSError as exc:
+                logger.warning("Could not write Prometheus textfile %s: %s", prometheus_path, exc)
+
+# Called with each finished span's entry, for every run (used by profiling.py)
+_span_listeners = []
+# Called with a span's name when it starts, and with (counter name, new total)
+# on every incr (used by progress.py)
+_span_start_listeners = []
+_counter_listeners = []
+
+# The run currently in progress. Modules that don't get a RunMetrics passed in
+# (scraper.py, redash_data.py, ...) report through the helpers below.
+_current = RunMetrics()
+
+def start_run(run_id=None):
+    """
+    Begin collecting metrics for a new run and make it the current one.
+    """
+    global _current
+    _current = RunMetrics(run_id)
+    # In scheduler mode one process does many runs; measure each run's own peak
+    if reset_peak_rss():
+        _current.peak_rss_scope = "run"
+    return _current
+
+def current():
+    return _current
+
+def add_span_listener(callback):
+    """
+    Call callback(span_entry) whenever a span ends, in any run.
+    """
+    _span_listeners.append(callback)
+
+def remove_span_listener(callback):
+    if callback in _span_listeners:
+        _span_listeners.remove(callback)
+
+def add_span_start_listener(callback):
+    """
+    Call callback(span_name) whenever a span starts, in any run.
+    """
+    _span_start_listeners.append(callback)
+
+def add_counter_listener(callback):
+    """
+    Call callback(counter_name, new_total) on every incr, in any run.
+    """
+    _counter_listeners.append(callback)
+
+def last_report(report_dir=REPORT_DIR, successful=True):
+    """
+    The most recent run report (as a dict), optionally only successful runs.
+    Returns None if there is none or it can't be read.
+    """
+    try:
+        names = sorted(
+            (name for name in os.listdir(report_dir) if name.startswith("run_") and name.endswith(".json")),
+            reverse=True,
+        )
+    except OSError:
+        return None
+    for name in names:
+        try:
+            with open(os.path.join(report_dir, name), "r", encoding="utf-8") as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if report.get("success") or not successful:
+            return report
+    return None
+
+def span(name):
+    return _current.span(name)
+
+def incr(name, amount=1):
+    _current.incr(name, amount)
+
+def current_stage():
+    """
+    Name of the innermost open span of the current run, or None between stages.
+    """
+    active = _current.active_spans
+    return active[-1] if active else None
+
+def peak_rss_bytes():
+    """
+    Peak resident memory of this process, in bytes (None if unknown): since
+    the last reset_peak_rss() where that worked, otherwise since it started.
+    """
+    high_water_mark = _proc_status_bytes("VmHWM")
+    if high_water_mark is not None:
+        return high_water_mark
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak if sys.platform.startswith("darwin") else peak * 1024
+
+def reset_peak_rss():
+    """
+    Restart this process's memory high-water mark from its current size
+    (Linux only, via /proc/self/clear_refs). True if it was reset.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+def _proc_status_bytes(field):
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def _prometheus_text(report):
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+            label_text = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{METRIC_PREFIX}_{name}{label_text} {value}")
+
+    started = datetime.fromisoformat(report["started_at"]).timestamp()
+    metric("last_run_timestamp_seconds", "gauge", "Start time of the last run.", [({}, started)])
+    metric("last_run_success", "gauge", "1 if the last run succeeded.", [({}, int(bool(report["success"])))])
+    metric("last_run_duration_seconds", "gauge", "Wall time of the last run.", [({}, report["duration_seconds"])])
+
+    # A stage can run more than once (e.g. nested retries); report the total
+    stage_totals = {}
+    for entry in report["spans"]:
+        stage_totals[entry["name"]] = stage_totals.get(entry["name"], 0.0) + entry["seconds"]
+    metric(
+        "stage_duration_seconds", "gauge", "Time spent in each stage of the last run.",
+        [({"stage": name}, round(seconds, 4)) for name, seconds in sorted(stage_totals.items())]
+    )
+    metric(
+        "run_events", "gauge", "Counters from the last run (pages, rows, retries, API calls, ...).",
+        [({"counter": name}, value) for name, value in sorted(report["counters"].items())]
+    )
+    if report["peak_rss_bytes"] is not None:
+        metric(
+            "peak_rss_bytes", "gauge",
+            "Peak resident memory during the last run (scope=run), or of its whole process (scope=process).",
+            [({"scope": report.get("peak_rss_scope", "process")}, report["peak_rss_bytes"])]
+        )
+
+    return "\n".join(lines) + "\n"
+
+def _atomic_write(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def _prune_reports(report_dir, keep):
+    reports = sorted(
+        name for name in os.listdir(report_dir)
+        if name.startswith("run_") and name.endswith(".json")
+    )
+    for name in reports[:-keep]:
+        os.remove(os.path.join(report_dir, name))
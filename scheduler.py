@@ -0,0 +1,138 @@
+# scheduler.py
+
+import fcntl
+import logging
+import os
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Held for the whole duration of a run, by cron-launched and scheduler runs alike
+LOCK_FILE = os.path.join(BASE_DIR, "scraper.lock")
+
+class SingleFlightLock:
+    """
+    Non-blocking exclusive file lock so only one scraper run executes at a time.
+
+    The lock is tied to the open file descriptor, so the OS releases it if the
+    process dies; there is no stale lock file to clean up after a crash.
+    """
+
+    def __init__(self, path=LOCK_FILE):
+        self.path = path
+        self._fd = None
+
+    def acquire(self):
+        """
+        Try to take the lock. Returns False right away if another run holds it.
+        """
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+
+        # Record who holds it, purely for humans looking at the file
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode("ascii"))
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+class AdaptiveInterval:
+    """
+    Pick the delay before the next run from how much the results are changing.
+
+    Each run's output is reduced to a set of (ID, Status, LastUpdated) keys.
+    If that set churned since the previous run, the interval is halved (down to
+    min_seconds); if it was identical, the interval doubles (up to max_seconds).
+    """
+
+    def __init__(self, min_seconds, max_seconds, initial_seconds=None):
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self.seconds = initial_seconds or min_seconds
+        self._previous = None
+
+    def update(self, rows):
+        """
+        Feed one run's output rows; returns the new interval in seconds.
+        """
+        current = {(row["ID"], row["Status"], row["LastUpdated"]) for row in rows}
+
+        if self._previous is None:
+            logger.info("First scheduled run; keeping interval at %.0f seconds.", self.seconds)
+        else:
+            churn = len(current ^ self._previous)
+            if churn:
+                self.seconds = max(self.min_seconds, self.seconds / 2)
+                logger.info(
+                    "%d rows changed since the last run; interval shortened to %.0f seconds.",
+                    churn, self.seconds
+                )
+            else:
+                self.seconds = min(self.max_seconds, self.seconds * 2)
+                logger.info(
+                    "No changes since the last run; interval lengthened to %.0f seconds.",
+                    self.seconds
+                )
+
+        self._previous = current
+        return self.seconds
+
+def run_scheduler(
+    run_once,
+    min_interval_seconds,
+    max_interval_seconds,
+    jitter_seconds=0,
+    lock_path=LOCK_FILE,
+):
+    """
+    Long-running loop that calls run_once() forever.
+
+    - run_once() must return the run's output rows, or None if the run failed.
+    - Each run holds the single-flight lock; if another run (e.g. a cron job)
+      holds it, this tick is skipped.
+    - Start times are spread by +/- jitter_seconds.
+    - The interval adapts to how much the output changes between runs.
+      Failed or skipped runs keep the current interval.
+
+    Everything imported by the caller (location map, practice groups, Google
+    session) stays cached in this process between runs.
+    """
+    cadence = AdaptiveInterval(min_interval_seconds, max_interval_seconds)
+    logger.info(
+        "Scheduler started: interval %.0f-%.0f seconds, jitter %.0f seconds.",
+        min_interval_seconds, max_interval_seconds, jitter_seconds
+    )
+
+    while True:
+        lock = SingleFlightLock(lock_path)
+        if lock.acquire():
+            try:
+                rows = run_once()
+            finally:
+                lock.release()
+            if rows is not None:
+                cadence.update(rows)
+        else:
+            logger.warning("Another scraper run holds %s; skipping this tick.", lock_path)
+
+        delay = max(0.0, cadence.seconds + random.uniform(-jitter_seconds, jitter_seconds))
+        logger.info("Next scheduled run in %.0f seconds.", delay)
+        time.sleep(delay)
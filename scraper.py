@@ -3,6 +3,7 @@
 import time
 import logging
 import os
+from urllib.parse import urlsplit
 
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
@@ -13,15 +14,82 @@ from selenium.common.exceptions import (
     StaleElementReferenceException,
 )
 
+import run_metrics
+from utils import read_json_file, write_json_file
+
 logger = logging.getLogger(__name__)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-def ensure_logged_in(driver, auth0_email, auth0_password, max_retries=2):
+# Row content hash -> scraped record, from the previous run
+ROW_HASH_CACHE_FILE = os.path.join(BASE_DIR, "row_hash_cache.json")
+
+DASHBOARD_ORIGIN = "https://dashboard.tuuthfairy.com"
+CONNECTIONS_URL = DASHBOARD_ORIGIN + "/connection"
+LOGIN_URL = DASHBOARD_ORIGIN + "/auth/login"
+# How long restored (or HTTP login) cookies get to show the table before using the login page
+SESSION_RESTORE_TIMEOUT = 15
+
+# Runs in the browser: for every table row return [cell count, 1 if any cell
+# has text, hash of all cell texts, first cell's text (the ID)]. The hash is
+# cyrb53 (53 bits), base 36.
+ROW_HASHES_SCRIPT = """
+const out = [];
+for (const row of document.querySelectorAll("table tbody tr")) {
+  const cells = row.querySelectorAll("td");
+  let text = "", hasText = 0, first = null;
+  for (const cell of cells) {
+    const t = cell.innerText.trim();
+    if (t) hasText = 1;
+    if (first === null) first = t;
+    text += t + "\u001f";
+  }
+  let h1 = 0xdeadbeef, h2 = 0x41c6ce57;
+  for (let i = 0; i < text.length; i++) {
+    const ch = text.charCodeAt(i);
+    h1 = Math.imul(h1 ^ ch, 2654435761);
+    h2 = Math.imul(h2 ^ ch, 1597334677);
+  }
+  h1 = Math.imul(h1 ^ (h1 >>> 16), 2246822507) ^ Math.imul(h2 ^ (h2 >>> 13), 3266489909);
+  h2 = Math.imul(h2 ^ (h2 >>> 16), 2246822507) ^ Math.imul(h1 ^ (h1 >>> 13), 3266489909);
+  out.push([cells.length, hasText, (4294967296 * (2097151 & h2) + (h1 >>> 0)).toString(36), first]);
+}
+return out;
+"""
+
+class RowHashCache:
+    """
+    Records scraped in the previous run, keyed by the browser-side hash of
+    their row's cell texts. A row whose hash is found here is reused instead
+    of reading its cells over WebDriver.
+
+    save() keeps only the rows seen in this run, so the file doesn't grow.
+    """
+
+    def __init__(self, path=ROW_HASH_CACHE_FILE):
+        self.path = path
+        self._current = {}
+        self._previous = read_json_file(path)
+
+    def get(self, row_hash):
+        record = self._previous.get(row_hash) or self._current.get(row_hash)
+        if record is None:
+            return None
+        self._current[row_hash] = record
+        return dict(record)
+
+    def put(self, row_hash, record):
+        self._current[row_hash] = dict(record)
+
+    def save(self):
+        write_json_file(self.path, self._current)
+
+def ensure_logged_in(driver, auth0_email, auth0_password, max_retries=2, fast_login=True):
     """
     Attempt to log into the Tuuthfairy dashboard via Auth0.
-    We do step-by-step waits for intermediate redirects and
-    retry the entire login flow if we encounter timeouts.
+    With fast_login, first try logging in over HTTP (see log_in_over_http());
+    otherwise, or if that fails, we do step-by-step waits for intermediate
+    redirects and retry the entire login flow if we encounter timeouts.
 
     NOTE FOR CRON/CI USAGE:
     - Make sure PATH includes /usr/bin, /bin, etc. so that Google Chrome
@@ -29,7 +97,9 @@ def ensure_logged_in(driver, auth0_email, auth0_password, max_retries=2):
     - If you see 'Chrome failed to start: exited abnormally', you may need
       --no-sandbox, --disable-dev-shm-usage, or an updated PATH in the crontab.
     """
-    login_url = "https://dashboard.tuuthfairy.com/auth/login"
+    if fast_login and log_in_over_http(driver, auth0_email, auth0_password):
+        return
+    login_url = LOGIN_URL
 
     for attempt in range(max_retries):
         logger.info("ensure_logged_in: Attempt %d of %d", attempt + 1, max_retries)
@@ -107,6 +177,7 @@ def ensure_logged_in(driver, auth0_email, auth0_password, max_retries=2):
         except TimeoutException:
             # If we hit a TimeoutException, let's log it, possibly do a screenshot, then retry
             logger.warning("Timeout while logging in (attempt %d/%d). Retrying...", attempt + 1, max_retries)
+            run_metrics.incr("login_retries")
 
             screenshot_path = os.path.join(BASE_DIR, f"login_error_attempt_{attempt+1}.png")
             driver.save_screenshot(screenshot_path)
@@ -121,15 +192,19 @@ def ensure_logged_in(driver, auth0_email, auth0_password, max_retries=2):
     raise TimeoutException("Failed to log in after multiple attempts.")
 
 def go_directly_to_connections(driver):
-    driver.get("https://dashboard.tuuthfairy.com/connection")
+    if urlsplit(driver.current_url)[:3] == urlsplit(CONNECTIONS_URL)[:3] and \
+            driver.find_elements(By.CSS_SELECTOR, "table tbody tr"):
+        # Logged in over HTTP, which already opened it
+        logger.info("Connections table already loaded.")
+        return
+    driver.get(CONNECTIONS_URL)
     logger.info("Navigating directly to /connection...")
 
     # Debug snippet 1 (BEFORE waiting for the table) - take only if logger is set to Debug 
     if logger.isEnabledFor(logging.DEBUG):
         driver.save_screenshot("connection_before_wait.png")
         logger.debug("Saved screenshot to connection_before_wait.png")
-
-    logger.debug("Page source BEFORE waiting:\n%s", driver.page_source)
+        logger.debug("Page source BEFORE waiting:\n%s", driver.page_source)
 
     WebDriverWait(driver, 60).until(
         EC.presence_of_element_located((By.CSS_SELECTOR, "table tbody tr"))
@@ -139,27 +214,50 @@ def go_directly_to_connections(driver):
     if logger.isEnabledFor(logging.DEBUG):
         driver.save_screenshot("connection_after_wait.png")
         logger.debug("Saved screenshot to connection_after_wait.png")
-
-    logger.debug("Page source AFTER waiting:\n%s", driver.page_source)
+        logger.debug("Page source AFTER waiting:\n%s", driver.page_source)
 
     logger.info("Connections table loaded after direct navigation.")
 
-def scrape_connections_table(driver):
+def scrape_connections_table(driver, row_cache=None, plan=None, digest=None, first_page=1, last_page=None,
+                             memory_guard=None):
     """
     Scrape the entire Connections table across all pages, returning a list of dicts.
 
     We use a robust row-by-row approach to re-locate elements if they go stale.
+
+    With a RowHashCache, each page's rows are first hashed inside the browser
+    in one script call; only rows with a new hash have their cells read, the
+    others are taken from the cache.
+
+    With a URL-mode PagePlan (see pagination.py), later pages are opened by
+    URL instead of clicking "Next". The planned page count is a hint: paging
+    stops at the first short page from the planned last page on, so rows
+    added mid-run (or an underestimated total) are not lost. In every mode an
+    empty page, or one whose first row is the previous page's first row, ends
+    paging, since some dashboards show the last page again for out-of-range
+    page numbers.
+
+    With a ContentDigest (see run_fingerprint.py), every record is added to
+    it as it is scraped, so the table's hash is ready when scraping ends.
+
+    first_page is the page currently loaded; with last_page, scraping stops
+    after that page (used for page ranges, see page_queue.py).
+
+    With a MemoryGuard (see browser_manager.py), a browser that has grown too
+    big is restarted between pages; scraping then carries on from the next
+    page with the records collected so far.
     """
     all_records = []
-    page_count = 1  # Initialize the page count
+    page_count = first_page  # Initialize the page count
+    previous_first_id = None
     
     while True:
         # Before waiting
         if logger.isEnabledFor(logging.DEBUG):
             driver.save_screenshot(f"scrape_before_wait_page{page_count}.png")
             logger.debug("Saved screenshot to scrape_before_wait_page#.png")
-
-        logger.debug("Page source BEFORE wait on page %d:\n%s", page_count, driver.page_source)
+            # page_source is a round trip of its own; only fetch it when it gets logged
+            logger.debug("Page source BEFORE wait on page %d:\n%s", page_count, driver.page_source)
 
         # Wait for the table (empty or not)
         WebDriverWait(driver, 60).until(
@@ -175,19 +273,22 @@ def scrape_connections_table(driver):
         if logger.isEnabledFor(logging.DEBUG):
             driver.save_screenshot(f"scrape_after_wait_page{page_count}.png")
             logger.debug("Saved screenshot to scrape_after_wait_page#.png")
-        
-        logger.debug("Page source AFTER wait on page %d:\n%s", page_count, driver.page_source)
+            logger.debug("Page source AFTER wait on page %d:\n%s", page_count, driver.page_source)
 
         # 1) Get the total number of rows in the table
         rows = driver.find_elements(By.CSS_SELECTOR, "table tbody tr")
+        row_hashes = _row_hashes(driver) if row_cache is not None else None
         # If rows exist but they contain no <td> cells (or only header cells), consider it blank.
         data_found = False
-        for row in rows:
-            # Look for <td> cells
-            cells = row.find_elements(By.TAG_NAME, "td")
-            if cells and any(cell.text.strip() for cell in cells):
-                data_found = True
-                break
+        if row_hashes is not None:
+            data_found = any(row_hash[0] and row_hash[1] for row_hash in row_hashes)
+        else:
+            for row in rows:
+                # Look for <td> cells
+                cells = row.find_elements(By.TAG_NAME, "td")
+                if cells and any(cell.text.strip() for cell in cells):
+                    data_found = True
+                    break
 
         if not data_found:
             logger.info("No data rows found on page %d, ending pagination.", page_count)
@@ -196,25 +297,162 @@ def scrape_connections_table(driver):
         num_rows = len(rows)
         logger.debug("Found %d rows on this page", num_rows)
 
+        # The table re-rendered between the two reads; don't trust the hashes
+        if row_hashes is not None and len(row_hashes) != num_rows:
+            row_hashes = None
+
         # 2) Iterate by index so we can re-locate each row as needed
+        page_records = []
         for row_index in range(num_rows):
-            record = _scrape_row_with_retry(driver, row_index)
+            row_hash, row_id = row_hashes[row_index][2:4] if row_hashes is not None else (None, None)
+            record = row_cache.get(row_hash) if row_hash is not None else None
+            # Only reuse a cached record for the row it was stored for
+            if record is not None and record["ID"] != row_id:
+                record = None
             if record is not None:
-                all_records.append(record)
+                run_metrics.incr("rows_reused")
+            else:
+                record = _scrape_row_with_retry(driver, row_index)
+                if record is not None and row_hash is not None:
+                    if record["ID"] == row_id:
+                        row_cache.put(row_hash, record)
+                    else:
+                        # The table re-rendered since it was hashed; read the rest of the page
+                        logger.info(
+                            "Row %d on page %d changed since it was hashed; not caching this page.",
+                            row_index, page_count
+                        )
+                        row_hashes = None
+            if record is not None:
+                page_records.append(record)
 
-        # 3) Check for "Next" pagination button and click if present
-        next_buttons = driver.find_elements(By.XPATH, "//a[contains(text(), 'Next')]")
-        if not next_buttons:
+        # Dashboards that clamp out-of-range page numbers show the last page again
+        first_id = page_records[0]["ID"] if page_records else None
+        if first_id is not None and first_id == previous_first_id:
+            logger.info("Page %d repeats the previous page; ending pagination.", page_count)
             break
-        next_buttons[0].click()
+        previous_first_id = first_id
+
+        run_metrics.incr("pages")
+        for record in page_records:
+            all_records.append(record)
+            if digest is not None:
+                digest.add(record)
+            run_metrics.incr("rows_scraped")
 
-        # small buffer after pagination click so page can re-render
-        time.sleep(2)
+        if last_page is not None and page_count >= last_page:
+            break
+        if plan is not None and plan.url_mode:
+            # The planned total is only a hint (connections get added mid-run, or the
+            # count was misread): from there on, or without one, a short page is the last
+            if (plan.total_pages is None or page_count >= plan.total_pages) and num_rows < plan.page_size:
+                break
+
+        # Restart a bloated browser between pages rather than let it crash
+        reason = memory_guard.should_recycle() if memory_guard is not None else None
+        if reason:
+            driver = memory_guard.recycle(reason)
+            if plan is None or not plan.url_mode:
+                # The new browser starts on page 1; click back to the page just scraped
+                for _ in range(page_count - 1):
+                    _click_next(driver)
+
+        # 3) Open the next page by URL when the planner found a way to,
+        # otherwise click the "Next" link
+        if plan is not None and plan.url_mode:
+            page_count += 1
+            plan.open_page(driver, page_count)
+            continue
+
+        # Check for "Next" pagination button and click if present
+        if not _click_next(driver):
+            break
         page_count += 1
 
     logger.info("Scraped %d records from connections table.", len(all_records))
     return all_records
 
+def _click_next(driver):
+    """
+    Click the "Next" pagination link; False if there is none.
+    """
+    next_buttons = driver.find_elements(By.XPATH, "//a[contains(text(), 'Next')]")
+    if not next_buttons:
+        return False
+    next_buttons[0].click()
+
+    # small buffer after pagination click so page can re-render
+    time.sleep(2)
+    return True
+
+def restore_session(driver, cookies, auth0_email, auth0_password, fast_login=True):
+    """
+    Bring a freshly started browser back to /connection with the session
+    cookies of the one it replaces, logging in again if they don't work.
+    """
+    if cookies:
+        if _open_with_cookies(driver, cookies):
+            logger.info("Restored the session in the new browser from %d cookies.", len(cookies))
+            return
+        logger.info("Saved session cookies didn't carry over; logging in again.")
+    ensure_logged_in(driver, auth0_email, auth0_password, max_retries=2, fast_login=fast_login)
+    go_directly_to_connections(driver)
+
+def log_in_over_http(driver, auth0_email, auth0_password, login_url=LOGIN_URL, connections_url=CONNECTIONS_URL):
+    """
+    Log in without the login page: auth0_login.http_login() goes through
+    Auth0 over HTTP and its session cookies are copied into the browser,
+    which is left on /connection. Returns False if any of that fails.
+    """
+    import requests
+    from auth0_login import FastLoginError, http_login
+
+    started = time.perf_counter()
+    try:
+        cookies = http_login(auth0_email, auth0_password, login_url)
+    except (FastLoginError, requests.RequestException) as e:
+        logger.info("HTTP login failed (%s); using the login page.", e)
+        run_metrics.incr("login_fallbacks")
+        return False
+    if not _open_with_cookies(driver, cookies, connections_url):
+        logger.info("The browser didn't accept the HTTP login's cookies; using the login page.")
+        run_metrics.incr("login_fallbacks")
+        return False
+    logger.info("Logged in over HTTP in %.1fs.", time.perf_counter() - started)
+    return True
+
+def _open_with_cookies(driver, cookies, connections_url=CONNECTIONS_URL):
+    """
+    Set 'cookies' in the browser and open /connection. True if the table shows up.
+    """
+    # Cookies can only be set for the domain currently loaded
+    parts = urlsplit(connections_url)
+    driver.get(f"{parts.scheme}://{parts.netloc}/favicon.ico")
+    for cookie in cookies:
+        try:
+            driver.add_cookie(cookie)
+        except WebDriverException as e:
+            logger.debug("Could not set cookie %s: %s", cookie.get("name"), e)
+    driver.get(connections_url)
+    try:
+        WebDriverWait(driver, SESSION_RESTORE_TIMEOUT).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "table tbody tr"))
+        )
+    except TimeoutException:
+        return False
+    return True
+
+def _row_hashes(driver):
+    """
+    [cell count, has text, content hash, ID] for each row on the current page,
+    or None if the script fails (the caller then reads every row).
+    """
+    try:
+        return driver.execute_script(ROW_HASHES_SCRIPT)
+    except WebDriverException as e:
+        logger.warning("Row hashing script failed, reading all rows: %s", e)
+        return None
+
 def _scrape_row_with_retry(driver, row_index, max_retries=3):
     """
     Locate the row at row_index, find its <td> cells, and extract text.
@@ -231,9 +469,8 @@ def _scrape_row_with_retry(driver, row_index, max_retries=3):
             if logger.isEnabledFor(logging.DEBUG):
                 driver.save_screenshot(f"row_retry_{row_index}_attempt_{attempts}.png")
                 logger.debug("Saved screenshot to row_retry_#_attempt_#.png")
-            
-            logger.debug("Found %d rows. Attempt %d for row %d. Page source:\n%s",
-                        len(rows_current), attempts, row_index, driver.page_source)
+                logger.debug("Found %d rows. Attempt %d for row %d. Page source:\n%s",
+                             len(rows_current), attempts, row_index, driver.page_source)
             
             if row_index >= len(rows_current):
                 logger.warning(
@@ -276,6 +513,7 @@ def _scrape_row_with_retry(driver, row_index, max_retries=3):
                 "Stale element on row %d attempt %d/%d. Re-locating row and retrying.",
                 row_index, attempts + 1, max_retries
             )
+            run_metrics.incr("stale_elements")
             time.sleep(1)
             attempts += 1
         except WebDriverException as e:
@@ -286,6 +524,7 @@ def _scrape_row_with_retry(driver, row_index, max_retries=3):
         "Row %d: max retries (%d) hit for stale elements. Skipping this row.",
         row_index, max_retries
     )
+    run_metrics.incr("rows_skipped")
     return None
 
 def save_debug_screenshot_and_html(driver):
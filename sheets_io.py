@@ -0,0 +1,227 @@
+# sheets_io.py
+
+import logging
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.utils import absolute_range_name
+
+import run_metrics
+
+logger = logging.getLogger(__name__)
+
+# Google's default per-user Sheets quota is 60 read and 60 write requests per minute
+DEFAULT_REQUESTS_PER_MINUTE = 60
+
+# Status codes worth retrying: rate limited, or a transient server-side failure
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class QuotaWindow:
+    """
+    Client-side sliding one-minute window for a Sheets quota bucket.
+    acquire() blocks until another request fits in the window.
+    """
+
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, window_seconds=60.0):
+        self.requests_per_minute = requests_per_minute
+        self.window_seconds = window_seconds
+        self._sent = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Reserve a slot for one request, sleeping if the window is full.
+        Returns the number of seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._sent and now - self._sent[0] >= self.window_seconds:
+                    self._sent.popleft()
+                if len(self._sent) < self.requests_per_minute:
+                    self._sent.append(now)
+                    return waited
+                delay = self.window_seconds - (now - self._sent[0])
+            logger.info("Sheets quota window full; waiting %.1fs before the next request.", delay)
+            time.sleep(delay)
+            waited += delay
+
+class SheetsIO:
+    """
+    All Google Sheets reads and writes for one run go through here.
+
+      - Reads are fetched with one values_batch_get per call to batch_get().
+      - Writes and clears are queued and sent in one values_batch_clear
+        plus one values_batch_update when flush() is called.
+      - Every request waits for room in the client-side quota window and is
+        retried with jittered exponential backoff on 429 and 5xx responses.
+      - Call counts, retries and latency are kept for log_stats().
+      - Worksheet handles are cached so repeated lookups cost nothing.
+    """
+
+    def __init__(
+        self,
+        spreadsheet,
+        requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+        max_retries=5,
+        base_delay=1.0,
+        max_delay=64.0,
+    ):
+        self.spreadsheet = spreadsheet
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._quota = {
+            "read": QuotaWindow(requests_per_minute),
+            "write": QuotaWindow(requests_per_minute),
+        }
+        self._pending_clears = []
+        self._pending_writes = []
+        self._worksheets = {}
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """
+        Start a fresh set of counters (called at the beginning of each run).
+        """
+        with self._stats_lock:
+            self.stats = {
+                "calls": {},
+                "retries": 0,
+                "quota_wait_seconds": 0.0,
+                "latency_seconds": 0.0,
+            }
+
+    def call(self, name, func, *args, kind="read", **kwargs):
+        """
+        Run a single Sheets API call under the quota window, retrying on 429/5xx.
+        'name' is only used for stats and log messages.
+        """
+        attempt = 0
+        while True:
+            waited = self._quota[kind].acquire()
+            started = time.monotonic()
+            try:
+                result = func(*args, **kwargs)
+                self._record(name, time.monotonic() - started, waited)
+                return result
+            except (APIError, requests.exceptions.ConnectionError, requests.exceptions.Timeout) as exc:
+                self._record(name, time.monotonic() - started, waited)
+                status = getattr(exc, "code", None)
+                if isinstance(exc, APIError) and status not in RETRYABLE_STATUS_CODES:
+                    raise
+                if attempt >= self.max_retries:
+                    logger.error("Sheets call %s failed after %d retries: %s", name, attempt, exc)
+                    raise
+
+                # Full jitter: sleep a random amount up to the exponential cap
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+                attempt += 1
+                with self._stats_lock:
+                    self.stats["retries"] += 1
+                run_metrics.incr("sheets_api_retries")
+                logger.warning(
+                    "Sheets call %s failed (%s); retry %d/%d in %.1fs.",
+                    name, status or type(exc).__name__, attempt, self.max_retries, delay
+                )
+                time.sleep(delay)
+
+    def worksheet(self, title):
+        """
+        Return a worksheet handle, reusing it across calls and runs.
+        The first lookup loads every tab's handle with one metadata request.
+        """
+        if title not in self._worksheets:
+            worksheets = self.call("worksheets", self.spreadsheet.worksheets)
+            self._worksheets = {ws.title: ws for ws in worksheets}
+            if title not in self._worksheets:
+                raise WorksheetNotFound(title)
+        return self._worksheets[title]
+
+    def batch_get(self, ranges, value_render_option=None, date_time_render_option=None):
+        """
+        Read several A1 ranges in a single request.
+        Returns a list of row lists, one per requested range (empty ranges give []).
+        """
+        params = {}
+        if value_render_option:
+            params["valueRenderOption"] = value_render_option
+        if date_time_render_option:
+            params["dateTimeRenderOption"] = date_time_render_option
+        response = self.call(
+            "values_batch_get", self.spreadsheet.values_batch_get, list(ranges), params=params
+        )
+        return [value_range.get("values", []) for value_range in response.get("valueRanges", [])]
+
+    def queue_clear(self, worksheet_title, range_name=None):
+        """
+        Queue clearing a range (or the whole tab when range_name is None).
+        """
+        self._pending_clears.append(absolute_range_name(worksheet_title, range_name))
+
+    def queue_write(self, worksheet_title, range_name, values):
+        """
+        Queue writing 'values' to an A1 range. Values are USER_ENTERED so formulas work.
+        """
+        self._pending_writes.append({
+            "range": absolute_range_name(worksheet_title, range_name),
+            "values": values,
+        })
+
+    def flush(self):
+        """
+        Send everything queued so far: clears first, then writes.
+        At most two requests, however many ranges were queued.
+        """
+        clears, self._pending_clears = self._pending_clears, []
+        writes, self._pending_writes = self._pending_writes, []
+
+        if clears:
+            self.call(
+                "values_batch_clear",
+                self.spreadsheet.values_batch_clear,
+                body={"ranges": clears},
+                kind="write",
+            )
+        if writes:
+            self.call(
+                "values_batch_update",
+                self.spreadsheet.values_batch_update,
+                body={"valueInputOption": "USER_ENTERED", "data": writes},
+                kind="write",
+            )
+
+    def log_stats(self):
+        """
+        Log how many Sheets API calls this run made and how long they took.
+        """
+        with self._stats_lock:
+            stats = self.stats
+            total_calls = sum(entry["count"] for entry in stats["calls"].values())
+            logger.info(
+                "Sheets API: %d calls, %d retries, %.2fs total latency, %.1fs waiting on quota.",
+                total_calls, stats["retries"], stats["latency_seconds"], stats["quota_wait_seconds"]
+            )
+            for name, entry in sorted(stats["calls"].items()):
+                logger.info(
+                    "Sheets API %s: %d calls, %.2fs total, %.2fs max.",
+                    name, entry["count"], entry["seconds"], entry["max_seconds"]
+                )
+
+    def _record(self, name, elapsed, waited):
+        with self._stats_lock:
+            entry = self.stats["calls"].setdefault(
+                name, {"count": 0, "seconds": 0.0, "max_seconds": 0.0}
+            )
+            entry["count"] += 1
+            entry["seconds"] += elapsed
+            entry["max_seconds"] = max(entry["max_seconds"], elapsed)
+            self.stats["latency_seconds"] += elapsed
+            self.stats["quota_wait_seconds"] += waited
+        run_metrics.incr("sheets_api_calls")
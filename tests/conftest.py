@@ -0,0 +1,18 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+# The scraper's modules live at the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def no_waits(monkeypatch):
+    import pagination
+    import scraper
+
+    # _click_next waits for the page to re-render
+    monkeypatch.setattr(scraper.time, "sleep", lambda seconds: None)
+    # An empty page never shows rows; don't wait the full 20 s for them
+    monkeypatch.setattr(pagination, "PAGE_LOAD_TIMEOUT", 0.05)
@@ -0,0 +1,205 @@
+# tests/fake_auth0.py
+"""
+A local stand-in for the dashboard's login and its Auth0 tenant, for
+auth0_login.http_login and scraper.log_in_over_http.
+"""
+
+import http.server
+import os
+import threading
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+class Auth0StandInHandler(http.server.BaseHTTPRequestHandler):
+    """
+    The dashboard and an Auth0 tenant on one port, told apart by the Host
+    header (127.0.0.1 is the dashboard, localhost is Auth0): the dashboard's
+    /auth/login, /auth/callback and /connection, and Auth0's /authorize,
+    identifier-first Universal Login (/u/login/identifier, /u/login/password)
+    and /authorize/resume. Pages are plain HTML forms, as Universal Login serves them.
+    identifier_action, if set, is where the identifier form posts to.
+    """
+    dashboard = ""
+    auth = ""
+    email = ""
+    password = ""
+    latency = 0.0
+    identifier_action = ""
+    transactions = {}   # Universal Login state -> {"redirect_uri", "state", "username"}
+    codes = set()
+    sessions = set()    # dashboard session cookies
+    sso_sessions = set()  # Auth0 session cookies
+    served = []
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def _route(self, method):
+        time.sleep(self.latency)
+        self.served.append(self.path)
+        parts = urlsplit(self.path)
+        query = dict(parse_qsl(parts.query))
+        if method == "POST":
+            length = int(self.headers.get("Content-Length", 0))
+            query.update(parse_qsl(self.rfile.read(length).decode("utf-8")))
+        cookies = dict(
+            pair.strip().split("=", 1) for pair in self.headers.get("Cookie", "").split(";") if "=" in pair
+        )
+        if self.headers.get("Host", "").startswith("localhost"):
+            self._auth0(method, parts.path, query, cookies)
+        else:
+            self._dashboard(parts.path, query, cookies)
+
+    def _dashboard(self, path, query, cookies):
+        logged_in = cookies.get("appSession") in self.sessions
+        if path == "/auth/login":
+            state = os.urandom(8).hex()
+            self._redirect(
+                f"{self.auth}/authorize?response_type=code&client_id=stand-in"
+                f"&redirect_uri={self.dashboard}/auth/callback&state={state}",
+                cookie=f"auth_verification={state}; Path=/; HttpOnly",
+            )
+        elif path == "/auth/callback":
+            if query.get("code") not in self.codes or query.get("state") != cookies.get("auth_verification"):
+                self._page(400, "<p>Invalid callback</p>")
+                return
+            self.codes.discard(query["code"])
+            session = os.urandom(16).hex()
+            self.sessions.add(session)
+            self._redirect("/", cookie=f"appSession={session}; Path=/; HttpOnly; SameSite=Lax")
+        elif path in ("/", "/connection") and not logged_in:
+            self._redirect("/auth/login")
+        elif path == "/":
+            self._page(200, "<nav><a href='/connection'>Connections</a></nav>")
+        elif path == "/connection":
+            self._page(200, "<table><tbody><tr><td>conn_000001</td></tr></tbody></table>")
+        else:
+            self._page(404, "")
+
+    def _auth0(self, method, path, query, cookies):
+        transaction = self.transactions.get(query.get("state"))
+        if path == "/authorize":
+            if cookies.get("auth0") in self.sso_sessions:
+                self._redirect_with_code(query["redirect_uri"], query["state"])
+                return
+            login_state = os.urandom(8).hex()
+            self.transactions[login_state] = {"redirect_uri": query["redirect_uri"], "state": query["state"]}
+            self._redirect(f"/u/login/identifier?state={login_state}")
+        elif transaction is None:
+            self._page(400, "<p>Unknown state</p>")
+        elif path == "/u/login/identifier" and method == "GET":
+            self._page(200, self._form(query["state"], '<input id="username" name="username" type="text">',
+                                       action=self.identifier_action))
+        elif path == "/u/login/identifier":
+            if query.get("action") != "default":
+                self._page(400, "<p>Missing action</p>")
+                return
+            transaction["username"] = query.get("username")
+            self._redirect(f"/u/login/password?state={query['state']}")
+        elif path == "/u/login/password" and method == "GET":
+            self._page(200, self._password_form(query["state"], transaction))
+        elif path == "/u/login/password":
+            if transaction.get("username") != self.email or query.get("password") != self.password:
+                self._page(400, "<p>Wrong email or password</p>" + self._password_form(query["state"], transaction))
+                return
+            sso = os.urandom(16).hex()
+            self.sso_sessions.add(sso)
+            self._redirect(f"/authorize/resume?state={query['state']}", cookie=f"auth0={sso}; Path=/; HttpOnly")
+        elif path == "/authorize/resume":
+            del self.transactions[query["state"]]
+            self._redirect_with_code(transaction["redirect_uri"], transaction["state"])
+        else:
+            self._page(404, "")
+
+    def _form(self, state, fields, action=""):
+        return (f'<form method="POST" action="{action}"><input type="hidden" name="state" value="{state}">{fields}'
+                f'<button type="submit" name="action" value="default">Continue</button></form>')
+
+    def _password_form(self, state, transaction):
+        return self._form(state, f'<input type="hidden" name="username" value="{transaction.get("username")}">'
+                                 f'<input id="password" name="password" type="password">')
+
+    def _redirect_with_code(self, redirect_uri, state):
+        code = os.urandom(8).hex()
+        self.codes.add(code)
+        self._redirect(f"{redirect_uri}?code={code}&state={state}")
+
+    def _redirect(self, location, cookie=None):
+        self.send_response(302)
+        self.send_header("Location", location)
+        if cookie:
+            self.send_header("Set-Cookie", cookie)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _page(self, status, html):
+        body = f"<html><body>{html}</body></html>".encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class StandInBrowser:
+    """
+    Just enough of a WebDriver for scraper.log_in_over_http: get(), add_cookie()
+    and finding the Connections table rows, over its own cookie jar.
+    """
+
+    def __init__(self):
+        import requests
+
+        self._http = requests.Session()
+        self.current_url = "about:blank"
+        self.page_source = ""
+
+    def get(self, url):
+        response = self._http.get(url)
+        self.current_url = response.url
+        self.page_source = response.text
+
+    def add_cookie(self, cookie):
+        self._http.cookies.set(
+            cookie["name"], cookie["value"],
+            domain=cookie.get("domain", urlsplit(self.current_url).hostname), path=cookie.get("path", "/"),
+        )
+
+    def find_elements(self, by, selector):
+        return [self] if selector == "table tbody tr" and "<tbody><tr>" in self.page_source else []
+
+    def find_element(self, by, selector):
+        from selenium.common.exceptions import NoSuchElementException
+
+        elements = self.find_elements(by, selector)
+        if not elements:
+            raise NoSuchElementException(selector)
+        return elements[0]
+
+def start_stand_in(email, password, latency_seconds=0.0):
+    """
+    Serve a fresh Auth0StandInHandler on a free port in a background thread.
+    Returns (server, handler class); the handler class holds the state, its
+    .dashboard and .auth base URLs and the paths .served so far.
+    """
+    handler = type("Auth0StandIn", (Auth0StandInHandler,), {
+        "email": email,
+        "password": password,
+        "latency": latency_seconds,
+        "transactions": {},
+        "codes": set(),
+        "sessions": set(),
+        "sso_sessions": set(),
+        "served": [],
+    })
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    port = server.server_address[1]
+    handler.dashboard = f"http://127.0.0.1:{port}"
+    handler.auth = f"http://localhost:{port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, handler
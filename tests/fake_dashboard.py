@@ -0,0 +1,215 @@
+# tests/fake_dashboard.py
+"""
+An in-process stand-in for Chrome showing the dashboard's Connections table.
+
+fake_driver() returns a real selenium WebDriver whose command executor is a
+FakeDashboard instead of chromedriver, so the scraper's own Selenium calls
+(find_elements, .text, execute_script, WebDriverWait, ...) run unchanged and
+every WebDriver round trip goes through driver.execute, as with Chrome.
+"""
+
+import hashlib
+from collections import Counter
+from urllib.parse import parse_qsl, urlsplit
+
+from selenium.webdriver import ChromeOptions
+from selenium.webdriver.remote.webdriver import WebDriver
+
+import pagination
+import scraper
+
+ELEMENT_KEY = "element-6066-11e4-a52e-4f735466cecf"
+BASE_URL = "https://dashboard.test/connection"
+
+def make_table(count, prefix="conn"):
+    return [
+        {
+            "ID": f"{prefix}_{i:05d}",
+            "WebsiteId": f"portal{i % 7}.example.com",
+            "Username": f"user{i}",
+            "Status": "auth_failed" if i % 3 else "active",
+            "Locations": f"loc_{i % 11}",
+            "LastUpdated": "2025-01-01",
+        }
+        for i in range(count)
+    ]
+
+def _error(error, message=""):
+    return {"status": error, "value": {"error": error, "message": message}}
+
+class FakeDashboard:
+    """
+    The table, paged 'page_size' rows at a time and opened by URL
+    (?page=N&pageSize=M) or with a "Next" link.
+
+    With clamp, page numbers past the end show the last page again (as some
+    dashboards do); otherwise they show an empty table. show_total puts a
+    "1-50 of N" indicator on the page. Element references from an earlier
+    page go stale once another page is loaded. after_hash, if set, is called
+    with the dashboard right after the row hashing script ran (e.g. to
+    re-render the table in between).
+    """
+
+    def __init__(self, table, page_size=50, clamp=False, show_total=True, accept_page_size=True):
+        self.table = table
+        self.page_size = page_size
+        self.clamp = clamp
+        self.show_total = show_total
+        self.accept_page_size = accept_page_size
+        self.url = "about:blank"
+        self.page = 1
+        self.size = page_size
+        self.loads = 0
+        self.commands = Counter()
+        self.cookies = []
+        self.after_hash = None
+        self._version = 0
+
+    # -- page state
+
+    def _page_count(self):
+        return max(1, -(-len(self.table) // self.size))
+
+    def _shown_page(self):
+        if self.clamp:
+            return min(self.page, self._page_count())
+        return self.page
+
+    def rows(self):
+        page = self._shown_page()
+        return self.table[(page - 1) * self.size:page * self.size]
+
+    def load(self, url):
+        parts = urlsplit(url)
+        query = dict(parse_qsl(parts.query))
+        self.url = url
+        self.page = int(query.get("page", 1))
+        self.size = int(query["pageSize"]) if self.accept_page_size and "pageSize" in query else self.page_size
+        self.loads += 1
+        self._version += 1
+
+    # -- elements
+
+    def _ref(self, *parts):
+        return {ELEMENT_KEY: ":".join([str(self._version)] + [str(p) for p in parts])}
+
+    def _resolve(self, element_id):
+        version, *parts = element_id.split(":")
+        if int(version) != self._version:
+            return None
+        return parts
+
+    def _find(self, using, value, parent=None):
+        rows = self.rows()
+        if parent is None:
+            if using == "css selector" and value == "table tbody tr":
+                return [self._ref("row", i) for i in range(len(rows))]
+            if using == "css selector" and value.startswith("table"):
+                return [self._ref("table")]
+            if using == "xpath" and "Next" in value:
+                last = self._shown_page() * self.size >= len(self.table)
+                return [] if last else [self._ref("next")]
+            return []
+        if parent[0] == "row" and using == "tag name" and value == "td":
+            return [self._ref("cell", parent[1], j) for j in range(6)]
+        return []
+
+    def _text(self, parts):
+        if parts[0] == "cell":
+            record = self.rows()[int(parts[1])]
+            field = ("ID", "WebsiteId", "Username", "Status", "Locations", "LastUpdated")[int(parts[2])]
+            return record[field]
+        return ""
+
+    # -- scripts
+
+    def _script(self, script):
+        rows = self.rows()
+        if script == scraper.ROW_HASHES_SCRIPT:
+            out = []
+            for record in rows:
+                text = "\x1f".join(record[f] for f in ("ID", "WebsiteId", "Username", "Status",
+                                                       "Locations", "LastUpdated"))
+                out.append([6, 1, hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest(),
+                            record["ID"]])
+            if self.after_hash is not None:
+                self.after_hash(self)
+            return out
+        if script == pagination.PAGE_INFO_SCRIPT:
+            start = (self._shown_page() - 1) * self.size
+            total = len(self.table)
+            return {
+                "rows": len(rows),
+                "firstId": rows[0]["ID"] if rows else None,
+                "range": [start + 1, start + len(rows), total] if self.show_total and rows else None,
+                "pages": None,
+                "total": None,
+            }
+        return None
+
+    # -- the WebDriver protocol
+
+    def execute(self, command, params):
+        self.commands[command] += 1
+        params = params or {}
+        if command == "newSession":
+            return {"value": {"sessionId": "fake", "capabilities": {"browserName": "chrome"}}}
+        if command == "get":
+            self.load(params["url"])
+            return {"value": None}
+        if command == "getCurrentUrl":
+            return {"value": self.url}
+        if command == "getPageSource":
+            return {"value": f"<html><!-- page {self.page} --></html>"}
+        if command in ("findElement", "findElements"):
+            found = self._find(params["using"], params["value"])
+            if command == "findElements":
+                return {"value": found}
+            return {"value": found[0]} if found else _error("no such element", params["value"])
+        if command == "findChildElements":
+            parent = self._resolve(params["id"])
+            if parent is None:
+                return _error("stale element reference")
+            return {"value": self._find(params["using"], params["value"], parent)}
+        if command == "getElementText":
+            parts = self._resolve(params["id"])
+            if parts is None:
+                return _error("stale element reference")
+            return {"value": self._text(parts)}
+        if command == "clickElement":
+            parts = self._resolve(params["id"])
+            if parts is None:
+                return _error("stale element reference")
+            if parts[0] == "next":
+                self.page += 1
+                self._version += 1
+            return {"value": None}
+        if command == "w3cExecuteScript":
+            return {"value": self._script(params["script"])}
+        if command == "addCookie":
+            self.cookies.append(params["cookie"])
+            return {"value": None}
+        if command == "getCookies":
+            return {"value": list(self.cookies)}
+        if command in ("screenshot", "quit"):
+            return {"value": ""}
+        return _error("unknown command", command)
+
+    def close(self):
+        # driver.quit() closes its command executor
+        pass
+
+def fake_driver(dashboard):
+    """
+    A selenium WebDriver talking to 'dashboard' instead of chromedriver.
+    """
+    return WebDriver(command_executor=dashboard, options=ChromeOptions())
+
+def url_plan(dashboard, total_rows=None, page_size=None):
+    """
+    A URL-mode PagePlan for 'dashboard', as plan_pagination would find it.
+    """
+    return pagination.PagePlan(
+        BASE_URL, page_size or dashboard.page_size, total_rows=total_rows, page_param="page",
+        size_param="pageSize", requested_size=page_size or dashboard.page_size,
+    )
@@ -0,0 +1,193 @@
+# tests/fake_sheets.py
+"""
+An in-memory stand-in for a gspread Spreadsheet.
+
+It implements the handful of Spreadsheet/Worksheet methods SheetsIO and
+google_sheets call, keeps each tab as a list of rows (the text written to
+each cell), and counts every call.
+
+Reads render cells as Sheets would after a USER_ENTERED write: a
+=HYPERLINK shows its label, and numbers and TRUE/FALSE are typed ("0123"
+reads back as 123 unformatted, or as "123" formatted). Dates and times
+are typed too, and shown in the sheet's own format ("2026-10-18 13:05:00"
+reads back as "10/18/2026 13:05:00", or as a serial number). Text with a
+leading apostrophe stays text, without the apostrophe.
+
+Failures can be queued with fail_next(status) to make the next API call
+raise the same APIError gspread would.
+"""
+
+import re
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import requests
+from gspread.exceptions import APIError
+from gspread.utils import a1_range_to_grid_range
+
+HYPERLINK_PATTERN = re.compile(r'=HYPERLINK\("[^"]*", "(?P<label>[^"]*)"\)')
+NUMBER_PATTERN = re.compile(r"[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?")
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}( \d{2}:\d{2}:\d{2})?")
+SERIAL_EPOCH = datetime(1899, 12, 30)
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title, row_count=1000):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.row_count = row_count
+
+    def resize(self, rows=None, cols=None):
+        self.spreadsheet._api("resize")
+        if rows is not None:
+            self.row_count = rows
+
+class FakeSpreadsheet:
+    """
+    'tabs' maps a tab title to its rows. Every write moves modifiedTime
+    forward a second; edit() makes a change as a person would.
+    """
+
+    def __init__(self, tabs, spreadsheet_id="sheet-1", title="Tuuthfairy Scraper"):
+        self.id = spreadsheet_id
+        self.title = title
+        self.tabs = {name: [list(row) for row in rows] for name, rows in tabs.items()}
+        self.worksheet_handles = {name: FakeWorksheet(self, name) for name in tabs}
+        self.calls = Counter()
+        self.modified = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        self._failures = []
+
+    # -- test helpers
+
+    def fail_next(self, *statuses):
+        """
+        Make the next API calls fail with these HTTP statuses, in order.
+        """
+        self._failures.extend(statuses)
+
+    def edit(self, tab, rows):
+        self.tabs[tab] = [list(row) for row in rows]
+        self._touch()
+
+    def _touch(self):
+        self.modified += timedelta(seconds=1)
+
+    def _api(self, name):
+        self.calls[name] += 1
+        if self._failures:
+            status = self._failures.pop(0)
+            response = requests.Response()
+            response.status_code = status
+            response._content = (
+                '{"error": {"code": %d, "message": "fake failure", "status": "FAKE"}}' % status
+            ).encode("utf-8")
+            raise APIError(response)
+
+    def _grid(self, range_name):
+        title, _, cells = range_name.partition("!")
+        title = title.strip("'")
+        grid = a1_range_to_grid_range(cells) if cells else {}
+        return title, grid
+
+    # -- the gspread API
+
+    def get_lastUpdateTime(self):
+        self._api("get_lastUpdateTime")
+        return self.modified.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+    def worksheets(self):
+        self._api("worksheets")
+        return list(self.worksheet_handles.values())
+
+    def values_batch_get(self, ranges, params=None):
+        self._api("values_batch_get")
+        params = params or {}
+        formatted = params.get("valueRenderOption", "FORMATTED_VALUE") == "FORMATTED_VALUE"
+        dates_formatted = formatted or params.get("dateTimeRenderOption") == "FORMATTED_STRING"
+        value_ranges = []
+        for range_name in ranges:
+            title, grid = self._grid(range_name)
+            rows = self.tabs.get(title, [])
+            rows = rows[grid.get("startRowIndex", 0):grid.get("endRowIndex")]
+            start_col, end_col = grid.get("startColumnIndex", 0), grid.get("endColumnIndex")
+            values = [row[start_col:end_col] for row in rows]
+            # Like the API: trailing empty cells and rows are left out
+            values = [[_render(cell, formatted, dates_formatted) for cell in _rstrip(row)] for row in values]
+            while values and not values[-1]:
+                values.pop()
+            value_ranges.append({"range": range_name, "values": values} if values else {"range": range_name})
+        return {"valueRanges": value_ranges}
+
+    def values_batch_clear(self, body=None):
+        self._api("values_batch_clear")
+        for range_name in body["ranges"]:
+            title, grid = self._grid(range_name)
+            if not grid:
+                self.tabs[title] = []
+            else:
+                self._write(title, grid, None)
+        self._touch()
+
+    def values_batch_update(self, body=None):
+        self._api("values_batch_update")
+        for entry in body["data"]:
+            title, grid = self._grid(entry["range"])
+            self._write(title, grid, entry["values"])
+        self._touch()
+
+    def values_update(self, range_name, params=None, body=None):
+        self._api("values_update")
+        title, grid = self._grid(range_name)
+        self._write(title, grid, body["values"])
+        self._touch()
+
+    def _write(self, title, grid, values):
+        rows = self.tabs.setdefault(title, [])
+        start_row = grid.get("startRowIndex", 0)
+        start_col = grid.get("startColumnIndex", 0)
+        if values is None:
+            end_row = grid.get("endRowIndex", len(rows))
+            end_col = grid.get("endColumnIndex")
+            for r in range(start_row, min(end_row, len(rows))):
+                stop = len(rows[r]) if end_col is None else min(end_col, len(rows[r]))
+                for c in range(start_col, stop):
+                    rows[r][c] = ""
+            return
+        for offset, new_row in enumerate(values):
+            r = start_row + offset
+            while len(rows) <= r:
+                rows.append([])
+            row = rows[r]
+            while len(row) < start_col + len(new_row):
+                row.append("")
+            row[start_col:start_col + len(new_row)] = [str(v) for v in new_row]
+
+def _render(cell, formatted, dates_formatted):
+    """
+    A cell's value as the API returns it, formatted (text) or unformatted (typed).
+    """
+    if cell.startswith("'"):
+        return cell[1:]
+    link = HYPERLINK_PATTERN.fullmatch(cell)
+    if link:
+        return link.group("label")
+    date = DATE_PATTERN.fullmatch(cell)
+    if date:
+        moment = datetime.strptime(cell, "%Y-%m-%d %H:%M:%S" if date.group(1) else "%Y-%m-%d")
+        if not dates_formatted:
+            return (moment - SERIAL_EPOCH).total_seconds() / 86400
+        shown = f"{moment.month}/{moment.day}/{moment.year}"
+        return shown + moment.strftime(" %H:%M:%S") if date.group(1) else shown
+    if cell.upper() in ("TRUE", "FALSE"):
+        return cell.upper() if formatted else cell.upper() == "TRUE"
+    if NUMBER_PATTERN.fullmatch(cell.strip()):
+        number = float(cell)
+        if number.is_integer():
+            number = int(number)
+        return str(number) if formatted else number
+    return cell
+
+def _rstrip(row):
+    row = list(row)
+    while row and row[-1] == "":
+        row.pop()
+    return row
@@ -0,0 +1,15 @@
+# tests/test_benchmarks.py
+import os
+import subprocess
+import sys
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_pipeline_gate_passes_on_the_recorded_baseline():
+    # The committed baseline must match the committed code, or every run of the gate fails
+    result = subprocess.run(
+        [sys.executable, "benchmarks.py", "pipeline", "--sizes", "1000", "10000"],
+        cwd=REPO, capture_output=True, text=True, timeout=300,
+    )
+    assert "nan" not in result.stdout
+    assert result.returncode == 0, result.stdout
@@ -0,0 +1,84 @@
+# tests/test_driver_trace.py
+import math
+from collections import Counter
+
+import pytest
+
+import scraper
+from driver_trace import DriverTracer, read_trace, summarize_trace
+from fake_dashboard import FakeDashboard, fake_driver, make_table, url_plan
+
+pytestmark = pytest.mark.usefixtures("no_waits")
+
+def traced_scrape(tmp_path, row_cache=None, rows=150):
+    """
+    Scrape a 'rows'-row table 50 rows per page under a DriverTracer;
+    returns the records and the WebDriver commands sent for each page of
+    the table (not for the empty page after a full last one, which only
+    shows paging has ended).
+    """
+    dashboard = FakeDashboard(make_table(rows), page_size=50)
+    driver = fake_driver(dashboard)
+    plan = url_plan(dashboard, total_rows=rows)
+    tracer = DriverTracer(driver, str(tmp_path / "trace.jsonl"))
+    plan.open_page(driver, 1)
+    records = scraper.scrape_connections_table(driver, plan=plan, row_cache=row_cache)
+    tracer.close()
+
+    pages = []
+    for entry in read_trace(tracer.trace_path):
+        # Every page is opened by URL
+        if entry["cmd"] == "get":
+            pages.append(Counter())
+        pages[-1][entry["cmd"]] += 1
+    table_pages = math.ceil(rows / 50)
+    assert len(pages) == table_pages + (rows % 50 == 0)
+    return records, pages[:table_pages]
+
+def test_commands_per_page_reading_every_row(tmp_path):
+    records, pages = traced_scrape(tmp_path)
+    assert len(records) == 150
+    # Per row: re-locate the rows, find its cells, read 6 texts. Per page: open
+    # it, wait for the table and its first row, list the rows twice, read the
+    # page info, and check the first row has text. No page_source fetches.
+    assert pages == [Counter({
+        "get": 1, "findElement": 2, "w3cExecuteScript": 1,
+        "findElements": 2 + 50, "findChildElements": 1 + 50, "getElementText": 1 + 6 * 50,
+    })] * 3
+
+def test_commands_per_page_with_row_cache(tmp_path):
+    cache_path = str(tmp_path / "row_hash_cache.json")
+    cache = scraper.RowHashCache(cache_path)
+    _, cold_pages = traced_scrape(tmp_path, row_cache=cache)
+    cache.save()
+    # One script call hashes the page's rows; every row is still read once
+    assert cold_pages == [Counter({
+        "get": 1, "findElement": 2, "w3cExecuteScript": 2,
+        "findElements": 2 + 50, "findChildElements": 50, "getElementText": 6 * 50,
+    })] * 3
+
+    # Unchanged rows are taken from the cache: nothing is read per row
+    records, warm_pages = traced_scrape(tmp_path, row_cache=scraper.RowHashCache(cache_path))
+    assert records == make_table(150)
+    assert warm_pages == [Counter({"get": 1, "findElement": 2, "w3cExecuteScript": 2, "findElements": 2})] * 3
+
+def test_summary_names_the_calling_line(tmp_path):
+    _, pages = traced_scrape(tmp_path)
+    summary = summarize_trace(str(tmp_path / "trace.jsonl"))
+    assert sum(row["count"] for row in summary) == len(read_trace(str(tmp_path / "trace.jsonl")))
+    assert sum(row["count"] for row in summary) > sum(sum(page.values()) for page in pages)
+    assert any(row["site"].startswith("scraper.py:") and "_scrape_row_with_retry" in row["site"] for row in summary)
+
+def test_attach_follows_a_restarted_browser(tmp_path):
+    dashboard = FakeDashboard(make_table(50), page_size=50)
+    old_driver, new_driver = fake_driver(dashboard), fake_driver(dashboard)
+    tracer = DriverTracer(old_driver, str(tmp_path / "trace.jsonl"))
+    old_driver.get("https://dashboard.example/connection")
+    tracer.attach(new_driver)
+    # The old browser is no longer traced; the new one is
+    old_driver.get("https://dashboard.example/connection?page=2")
+    new_driver.get("https://dashboard.example/connection")
+    new_driver.find_elements("css selector", "table tbody tr")
+    tracer.close()
+    assert [entry["cmd"] for entry in read_trace(tracer.trace_path)] == ["get", "get", "findElements"]
+    assert tracer._traced_execute not in (old_driver.execute, new_driver.execute)
@@ -0,0 +1,51 @@
+# tests/test_entry_points.py
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.mark.parametrize("module", ["main", "main_new"])
+def test_import_leaves_logging_alone(module):
+    # Workers, benchmarks and tests import the entry points; only main() may open a log file
+    code = f"import logging, {module}; print(len(logging.getLogger().handlers))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=REPO, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "0"
+
+@pytest.mark.parametrize("module", ["main", "main_new"])
+def test_unsupported_platform_prepares_no_profile(module, monkeypatch):
+    import importlib
+
+    import browser_manager
+
+    entry_point = importlib.import_module(module)
+    prepared = []
+    monkeypatch.setattr(browser_manager.BrowserManager, "prepare", lambda self: prepared.append(self))
+    monkeypatch.setattr(sys, "platform", "win32")
+    with pytest.raises(RuntimeError, match="Unsupported platform"):
+        entry_point._start_browser({})
+    assert prepared == []
+
+def test_main_new_skips_while_another_run_holds_the_lock(tmp_path, monkeypatch):
+    import main_new
+    from scheduler import SingleFlightLock
+
+    lock_path = str(tmp_path / "scraper.lock")
+    runs = []
+    monkeypatch.setattr(main_new, "SingleFlightLock", lambda: SingleFlightLock(lock_path))
+    parse_args = main_new.parse_args
+    monkeypatch.setattr(main_new, "parse_args", lambda: parse_args([]))
+    monkeypatch.setattr(main_new, "setup_logging", lambda *args: None)
+    monkeypatch.setattr(main_new, "setup_logging_from_config", lambda *args: None)
+    monkeypatch.setattr(main_new, "check_cron_environment", lambda: None)
+    monkeypatch.setattr(main_new, "load_config", lambda: {})
+    monkeypatch.setattr(main_new, "run_scraper_once", runs.append)
+
+    with SingleFlightLock(lock_path) as acquired:
+        assert acquired
+        main_new.main()
+    assert runs == []
+    main_new.main()
+    assert runs == [{}]
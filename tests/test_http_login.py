@@ -0,0 +1,67 @@
+# tests/test_http_login.py
+import socket
+
+import pytest
+
+from auth0_login import FastLoginError, get_session, http_login
+from fake_auth0 import StandInBrowser, start_stand_in
+from scraper import log_in_over_http
+
+EMAIL = "ops@example.com"
+PASSWORD = "correct horse"
+
+@pytest.fixture
+def stand_in():
+    get_session().cookies.clear()
+    server, handler = start_stand_in(EMAIL, PASSWORD)
+    yield handler
+    server.shutdown()
+    server.server_close()
+    get_session().cookies.clear()
+
+def log_in(stand_in, password=PASSWORD, login_url=None):
+    browser = StandInBrowser()
+    result = log_in_over_http(browser, EMAIL, password, login_url=login_url or f"{stand_in.dashboard}/auth/login",
+                              connections_url=f"{stand_in.dashboard}/connection")
+    return result, browser
+
+def test_first_login_shows_the_table(stand_in):
+    result, browser = log_in(stand_in)
+    assert result
+    assert browser.find_elements(None, "table tbody tr")
+    assert "/u/login/password" in [path.split("?")[0] for path in stand_in.served]
+
+def test_second_login_reuses_the_auth0_session(stand_in):
+    log_in(stand_in)
+    first = len(stand_in.served)
+    del stand_in.served[:]
+    result, browser = log_in(stand_in)
+    assert result
+    assert browser.find_elements(None, "table tbody tr")
+    assert len(stand_in.served) < first
+    assert not any(path.startswith("/u/login") for path in stand_in.served)
+
+def test_wrong_password_falls_back(stand_in):
+    result, browser = log_in(stand_in, password="wrong")
+    assert result is False
+    assert not browser.find_elements(None, "table tbody tr")
+
+def test_unreachable_server_falls_back(stand_in):
+    with socket.socket() as closed:
+        closed.bind(("127.0.0.1", 0))
+        port = closed.getsockname()[1]
+    result, _ = log_in(stand_in, login_url=f"http://127.0.0.1:{port}/auth/login")
+    assert result is False
+
+def test_credentials_only_go_to_the_tenant(stand_in):
+    # A login form that posts anywhere but the Auth0 tenant gets nothing
+    stand_in.identifier_action = f"{stand_in.dashboard}/steal"
+    with pytest.raises(FastLoginError, match="Auth0 tenant"):
+        http_login(EMAIL, PASSWORD, f"{stand_in.dashboard}/auth/login")
+    assert not any(path.startswith("/steal") for path in stand_in.served)
+
+def test_unexpected_tenant_gets_no_credentials(stand_in):
+    with pytest.raises(FastLoginError, match="Auth0 tenant"):
+        http_login(EMAIL, PASSWORD, f"{stand_in.dashboard}/auth/login", auth_host="tenant.auth0.com")
+    # The identifier form is fetched but never submitted
+    assert [path.split("?")[0] for path in stand_in.served].count("/u/login/identifier") == 1
@@ -0,0 +1,93 @@
+# tests/test_page_queue.py
+import logging
+
+import pytest
+
+import main
+from browser_manager import MemoryGuard
+from fake_dashboard import FakeDashboard, fake_driver, make_table, url_plan
+from page_queue import PageQueue, coordinate_run
+
+pytestmark = pytest.mark.usefixtures("no_waits")
+
+def run_queue(tmp_path, dashboard, plan, scrape_item=None, pages_per_item=3):
+    driver = fake_driver(dashboard)
+    return coordinate_run(
+        PageQueue(str(tmp_path / "page_queue.sqlite")),
+        plan,
+        scrape_item or (lambda item: main._scrape_work_item(driver, item)),
+        pages_per_item=pages_per_item,
+        poll_seconds=0,
+    )
+
+@pytest.mark.parametrize("clamp", [False, True])
+def test_queue_scrape_matches_the_table(tmp_path, clamp):
+    table = make_table(1234)
+    dashboard = FakeDashboard(table, page_size=50, clamp=clamp)
+    plan = url_plan(dashboard, total_rows=len(table))
+    assert run_queue(tmp_path, dashboard, plan) == table
+    # Every planned page is opened once; none past the last one
+    assert dashboard.loads == plan.total_pages == 25
+
+def test_merge_warns_about_connections_scraped_twice(tmp_path, caplog):
+    table = make_table(300)
+    dashboard = FakeDashboard(table, page_size=50)
+    driver = fake_driver(dashboard)
+
+    def scrape_item(item):
+        records = main._scrape_work_item(driver, item)
+        if item.first_page == 1:
+            # A connection is added at the top while the first item is being stored
+            dashboard.table = make_table(1, prefix="new") + table
+        return records
+
+    with caplog.at_level(logging.WARNING, logger="page_queue"):
+        records = run_queue(tmp_path, dashboard, url_plan(dashboard, total_rows=len(table)), scrape_item)
+    assert [r["ID"] for r in records].count(table[149]["ID"]) == 2
+    assert "scraped more than once" in caplog.text
+    # The last row was pushed onto a page past the planned total; the open-ended last item gets it
+    assert table[-1] in records
+
+def test_last_item_is_open_ended(tmp_path):
+    dashboard = FakeDashboard(make_table(300), page_size=50)
+    queue = PageQueue(str(tmp_path / "page_queue.sqlite"))
+    run_id = queue.create_run(url_plan(dashboard, total_rows=300), pages_per_item=4)
+    items = [queue.claim("me", run_id=run_id) for _ in range(2)]
+    assert [(item.first_page, item.last_page) for item in items] == [(1, 4), (5, None)]
+
+class BloatedBrowser:
+    """
+    A BrowserManager that is always over MemoryGuard's limit.
+    """
+
+    def __init__(self):
+        self.closed = False
+
+    def tree_rss_bytes(self):
+        return 2 ** 40
+
+    def close(self):
+        self.closed = True
+
+def test_queue_scrape_recycles_a_bloated_browser(tmp_path):
+    table = make_table(600)
+    dashboard = FakeDashboard(table, page_size=50)
+    restarts = []
+
+    def restart(cookies):
+        restarts.append(cookies)
+        return fake_driver(dashboard), BloatedBrowser()
+
+    config = {"browser_recycle_rss_mb": 1, "browser_recycle_js_heap_mb": 0, "browser_recycle_max": 3}
+    memory_guard = MemoryGuard(config, fake_driver(dashboard), BloatedBrowser(), restart)
+    first_browser = memory_guard.browser
+    records = coordinate_run(
+        PageQueue(str(tmp_path / "page_queue.sqlite")),
+        url_plan(dashboard, total_rows=len(table)),
+        lambda item: main._scrape_work_item(memory_guard.driver, item, memory_guard),
+        pages_per_item=3,
+        poll_seconds=0,
+    )
+    assert records == table
+    assert len(restarts) == memory_guard.recycles == 3
+    assert first_browser.closed
@@ -0,0 +1,60 @@
+# tests/test_practice_groups_cache.py
+import pytest
+import requests
+
+import google_sheets
+from fake_sheets import FakeSpreadsheet
+from sheets_io import SheetsIO
+
+GROUPS_TAB = "Tuuthfairy Groups"
+GROUPS = [["Status", "Practice Group"], ["Run", "Smile Dental"], ["Skip", "Other"], ["run", "Bright Teeth"]]
+
+@pytest.fixture
+def spreadsheet():
+    return FakeSpreadsheet({GROUPS_TAB: GROUPS, "auth_failed": []})
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "practice_groups_cache.json")
+
+def load(spreadsheet, cache_path):
+    return google_sheets.load_practice_groups_from_sheet(SheetsIO(spreadsheet), GROUPS_TAB, cache_path=cache_path)
+
+def upload(spreadsheet, cache_path):
+    sheets_io = SheetsIO(spreadsheet)
+    with google_sheets._own_sheet_write(sheets_io, cache_path):
+        sheets_io.queue_write("auth_failed", "A1", [["Message"]])
+        sheets_io.flush()
+
+def test_own_upload_keeps_cache(spreadsheet, cache_path):
+    assert load(spreadsheet, cache_path) == {"Smile Dental", "Bright Teeth"}
+    upload(spreadsheet, cache_path)
+    assert load(spreadsheet, cache_path) == {"Smile Dental", "Bright Teeth"}
+    assert spreadsheet.calls["values_batch_get"] == 1
+
+def test_edit_before_own_upload_is_picked_up(spreadsheet, cache_path):
+    load(spreadsheet, cache_path)
+    spreadsheet.edit(GROUPS_TAB, GROUPS + [["Run", "New Group"]])
+    upload(spreadsheet, cache_path)
+    assert load(spreadsheet, cache_path) == {"Smile Dental", "Bright Teeth", "New Group"}
+
+def test_edit_without_upload_is_picked_up(spreadsheet, cache_path):
+    load(spreadsheet, cache_path)
+    spreadsheet.edit(GROUPS_TAB, GROUPS[:2])
+    assert load(spreadsheet, cache_path) == {"Smile Dental"}
+
+def test_unreachable_google_falls_back_to_cache(spreadsheet, cache_path, monkeypatch):
+    load(spreadsheet, cache_path)
+
+    def unreachable(*args, **kwargs):
+        raise requests.exceptions.ConnectionError("no network")
+
+    monkeypatch.setattr(google_sheets, "open_sheets_io", unreachable)
+    sheets_io, groups = google_sheets.open_practice_groups(
+        "service_account.json", spreadsheet.title, GROUPS_TAB, cache_path=cache_path
+    )
+    assert sheets_io is None
+    assert groups == {"Smile Dental", "Bright Teeth"}
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        google_sheets.open_practice_groups("service_account.json", "Another Spreadsheet", GROUPS_TAB, cache_path=cache_path)
@@ -0,0 +1,66 @@
+# tests/test_regroup.py
+import random
+
+import pytest
+
+import data_filter
+from data_filter import (
+    RowRules,
+    build_output_rows,
+    filter_by_practice_groups,
+    filter_by_row_rules,
+    iter_regrouped_locations,
+    regroup_and_merge_locations,
+)
+from location_helpers import iter_expanded_records
+
+GROUPS = ["Smile Dental", "Bright Teeth", "Other"]
+
+def make_records(count, seed=1):
+    rng = random.Random(seed)
+    return [
+        {
+            "ID": f"conn_{i:04d}",
+            "WebsiteId": rng.choice(["portal.example.com", "unumdentalpwp.skygenusasystems.com"]),
+            "Username": f"user{i}",
+            "Status": rng.choice(["auth_failed", "active"]),
+            "Locations": tuple(f"loc_{rng.randrange(40)}" for _ in range(rng.randrange(5))),
+            "LastUpdated": "2025-01-01",
+        }
+        for i in range(count)
+    ]
+
+def make_location_map():
+    return {
+        f"loc_{i}": {"practiceGroupId": str(i % 3), "practiceGroupName": GROUPS[i % 3]}
+        for i in range(35)
+    }
+
+@pytest.fixture(autouse=True)
+def few_open_runs(monkeypatch):
+    # Force multi-pass merging of the spilled runs as well
+    monkeypatch.setattr(data_filter, "REGROUP_MAX_OPEN_RUNS", 3)
+
+@pytest.mark.parametrize("shuffle", [False, True])
+def test_spilling_regroup_matches_in_memory(shuffle, tmp_path):
+    rows = list(iter_expanded_records(make_records(300), make_location_map()))
+    if shuffle:
+        random.Random(7).shuffle(rows)
+    expected = regroup_and_merge_locations(rows)
+    assert list(iter_regrouped_locations(iter(rows), max_rows_in_memory=7, spill_dir=str(tmp_path))) == expected
+    assert list(tmp_path.iterdir()) == []
+
+def test_streamed_output_rows_match_the_list_pipeline(tmp_path):
+    records = make_records(300)
+    location_map = make_location_map()
+    rules = RowRules()
+    valid_groups = {"Smile Dental", "bright teeth "}
+
+    expanded = list(iter_expanded_records(records, location_map))
+    expected = regroup_and_merge_locations(
+        filter_by_row_rules(filter_by_practice_groups(expanded, valid_groups), rules)
+    )
+    assert expected
+    assert build_output_rows(
+        records, location_map, valid_groups, rules, max_rows_in_memory=5, spill_dir=str(tmp_path)
+    ) == expected
@@ -0,0 +1,57 @@
+# tests/test_run_fingerprint.py
+import os
+
+import pytest
+
+from run_fingerprint import RunFingerprint
+
+ROWS = [{"ID": "conn_1", "locationIds": "a, b"}]
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / "run_fingerprint.json"), str(tmp_path / "run_fingerprint_rows.json")
+
+def load(paths):
+    path, rows_path = paths
+    return RunFingerprint(path, rows_path=rows_path)
+
+def test_full_run_is_skipped_next_time(paths):
+    load(paths).record("inputs-1", "output-1", ROWS)
+    fingerprint = load(paths)
+    assert fingerprint.inputs_unchanged("inputs-1")
+    assert fingerprint.output_unchanged("output-1")
+    assert fingerprint.previous_rows == ROWS
+
+def test_failed_write_is_not_skipped_next_time(paths):
+    load(paths).record("inputs-1", "output-1", ROWS)
+    fingerprint = load(paths)
+    fingerprint.invalidate()
+    # ... history or the Sheets upload fails here ...
+    fingerprint = load(paths)
+    assert not fingerprint.inputs_unchanged("inputs-1")
+    assert not fingerprint.output_unchanged("output-1")
+
+def test_last_changed_survives_invalidate(paths):
+    load(paths).record("inputs-1", "output-1", ROWS)
+    first_changed = load(paths).previous["last_changed"]
+    fingerprint = load(paths)
+    fingerprint.previous["last_changed"] = "earlier"
+    fingerprint.invalidate()
+    fingerprint.record("inputs-2", "output-1", ROWS)
+    assert load(paths).previous["last_changed"] == "earlier" != first_changed
+
+def test_mark_checked_leaves_rows_alone(paths):
+    load(paths).record("inputs-1", "output-1", ROWS)
+    rows_path = paths[1]
+    os.utime(rows_path, (0, 0))
+    fingerprint = load(paths)
+    fingerprint.mark_checked("inputs-2")
+    assert os.stat(rows_path).st_mtime == 0
+    assert load(paths).inputs_unchanged("inputs-2")
+
+def test_inputs_not_stored_without_rows(paths, tmp_path):
+    path = paths[0]
+    fingerprint = RunFingerprint(path, rows_path=str(tmp_path / "missing" / "rows.json"))
+    fingerprint.record("inputs-1", "output-1", ROWS)
+    assert not RunFingerprint(path, rows_path=str(tmp_path / "missing" / "rows.json")).inputs_unchanged("inputs-1")
+    assert RunFingerprint(path, rows_path=str(tmp_path / "missing" / "rows.json")).output_unchanged("output-1")
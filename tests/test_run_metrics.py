@@ -0,0 +1,22 @@
+# tests/test_run_metrics.py
+import pytest
+
+import run_metrics
+
+def test_each_run_reports_its_own_peak_memory(tmp_path):
+    # An earlier run in the same process (scheduler mode) used a lot of memory
+    run_metrics.start_run("earlier")
+    ballast = bytearray(200 * 1024 * 1024)
+    ballast[::4096] = b"x" * len(ballast[::4096])
+    earlier_peak = run_metrics.current().to_dict()["peak_rss_bytes"]
+    del ballast
+
+    metrics = run_metrics.start_run("later")
+    if metrics.peak_rss_scope != "run":
+        pytest.skip("the memory high-water mark can't be reset here")
+    report = metrics.to_dict()
+    assert report["peak_rss_scope"] == "run"
+    assert report["peak_rss_bytes"] < earlier_peak - 100 * 1024 * 1024
+
+    metrics.write_reports(report_dir=str(tmp_path), prometheus_path=str(tmp_path / "scraper.prom"))
+    assert 'tuuthfairy_scraper_peak_rss_bytes{scope="run"}' in (tmp_path / "scraper.prom").read_text()
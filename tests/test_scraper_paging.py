@@ -0,0 +1,101 @@
+# tests/test_scraper_paging.py
+import pytest
+
+import scraper
+from fake_dashboard import FakeDashboard, fake_driver, make_table, url_plan
+
+pytestmark = pytest.mark.usefixtures("no_waits")
+
+def scrape(dashboard, plan=None, **kwargs):
+    driver = fake_driver(dashboard)
+    if plan is not None:
+        plan.open_page(driver, kwargs.get("first_page", 1))
+    else:
+        driver.get(dashboard_url())
+    return scraper.scrape_connections_table(driver, plan=plan, **kwargs)
+
+def dashboard_url():
+    return "https://dashboard.test/connection"
+
+@pytest.mark.parametrize("clamp", [False, True])
+def test_url_mode_checks_one_page_past_a_full_planned_total(clamp):
+    table = make_table(100)
+    dashboard = FakeDashboard(table, page_size=50, clamp=clamp)
+    records = scrape(dashboard, url_plan(dashboard, total_rows=100))
+    assert records == table
+    # Page 3 is empty, or page 2 again; either ends paging
+    assert dashboard.loads == 3
+
+def test_url_mode_stops_after_a_short_planned_last_page():
+    table = make_table(120)
+    dashboard = FakeDashboard(table, page_size=50, clamp=True)
+    assert scrape(dashboard, url_plan(dashboard, total_rows=120)) == table
+    assert dashboard.loads == 3
+
+@pytest.mark.parametrize("clamp", [False, True])
+def test_url_mode_keeps_rows_past_an_underestimated_total(clamp):
+    table = make_table(230)
+    dashboard = FakeDashboard(table, page_size=50, clamp=clamp)
+    assert scrape(dashboard, url_plan(dashboard, total_rows=100)) == table
+
+def test_url_mode_without_total_stops_on_repeated_page():
+    table = make_table(100)
+    dashboard = FakeDashboard(table, page_size=50, clamp=True)
+    records = scrape(dashboard, url_plan(dashboard))
+    assert records == table
+
+def test_url_mode_without_total_stops_after_short_page():
+    table = make_table(120)
+    dashboard = FakeDashboard(table, page_size=50, clamp=True)
+    records = scrape(dashboard, url_plan(dashboard))
+    assert records == table
+    assert dashboard.loads == 3
+
+def test_url_mode_without_total_stops_on_empty_page():
+    table = make_table(100)
+    dashboard = FakeDashboard(table, page_size=50, clamp=False)
+    assert scrape(dashboard, url_plan(dashboard)) == table
+
+def test_page_range_stops_at_last_page():
+    table = make_table(300)
+    dashboard = FakeDashboard(table, page_size=50)
+    records = scrape(dashboard, url_plan(dashboard, total_rows=300), first_page=3, last_page=4)
+    assert records == table[100:200]
+
+def test_click_mode_scrapes_every_page_once():
+    table = make_table(120)
+    dashboard = FakeDashboard(table, page_size=50)
+    assert scrape(dashboard) == table
+
+def test_row_cache_reuses_rows_of_an_unchanged_table(tmp_path):
+    table = make_table(120)
+    dashboard = FakeDashboard(table, page_size=50)
+    cache_path = str(tmp_path / "row_hash_cache.json")
+
+    cache = scraper.RowHashCache(cache_path)
+    assert scrape(dashboard, url_plan(dashboard, total_rows=120), row_cache=cache) == table
+    cache.save()
+
+    dashboard = FakeDashboard(table, page_size=50)
+    assert scrape(dashboard, url_plan(dashboard, total_rows=120), row_cache=scraper.RowHashCache(cache_path)) == table
+    assert dashboard.commands["getElementText"] == 0
+
+def test_row_cache_ignores_a_table_rerendered_after_hashing(tmp_path):
+    table = make_table(50)
+    shuffled = table[25:] + table[:25]
+    dashboard = FakeDashboard(table, page_size=50)
+
+    def rerender(dashboard):
+        dashboard.table = shuffled
+        dashboard.after_hash = None
+
+    dashboard.after_hash = rerender
+    cache_path = str(tmp_path / "row_hash_cache.json")
+    cache = scraper.RowHashCache(cache_path)
+    assert scrape(dashboard, url_plan(dashboard, total_rows=50), row_cache=cache) == shuffled
+    cache.save()
+
+    # Had the shuffled rows been stored under the hashes of the original ones,
+    # this run would return them in the wrong rows
+    dashboard = FakeDashboard(table, page_size=50)
+    assert scrape(dashboard, url_plan(dashboard, total_rows=50), row_cache=scraper.RowHashCache(cache_path)) == table
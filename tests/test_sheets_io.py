@@ -0,0 +1,140 @@
+# tests/test_sheets_io.py
+import pytest
+from gspread.exceptions import APIError
+
+import sheets_io as sheets_io_module
+from fake_sheets import FakeSpreadsheet
+from sheets_io import SheetsIO
+
+class FakeClock:
+    """
+    Stands in for the time module in sheets_io: sleeping just moves the clock.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(sheets_io_module, "time", clock)
+    return clock
+
+@pytest.fixture
+def spreadsheet():
+    return FakeSpreadsheet({"auth_failed": [["old", "row"], ["stale", "data"]], "other": [["a"], ["b"]]})
+
+def test_queued_writes_go_out_in_two_requests(spreadsheet, clock):
+    io = SheetsIO(spreadsheet)
+    io.queue_clear("auth_failed")
+    io.queue_write("auth_failed", "A1:B1", [["ID", "Status"]])
+    io.queue_write("auth_failed", "A2:B3", [["conn_1", "auth_failed"], ["conn_2", "locked"]])
+    io.queue_write("other", "A3", [["c"]])
+    assert spreadsheet.calls == {}
+    io.flush()
+
+    assert spreadsheet.calls == {"values_batch_clear": 1, "values_batch_update": 1}
+    assert spreadsheet.tabs["auth_failed"] == [["ID", "Status"], ["conn_1", "auth_failed"], ["conn_2", "locked"]]
+    assert spreadsheet.tabs["other"] == [["a"], ["b"], ["c"]]
+    # Nothing left queued
+    io.flush()
+    assert sum(spreadsheet.calls.values()) == 2
+
+def test_batch_get_reads_several_ranges_at_once(spreadsheet, clock):
+    io = SheetsIO(spreadsheet)
+    assert io.batch_get(["'auth_failed'!A:A", "'other'", "'missing'"]) == [[["old"], ["stale"]], [["a"], ["b"]], []]
+    assert spreadsheet.calls == {"values_batch_get": 1}
+
+def test_requests_are_paced_to_the_quota(spreadsheet, clock):
+    io = SheetsIO(spreadsheet, requests_per_minute=2)
+    for _ in range(5):
+        io.batch_get(["'other'"])
+    # Requests 3-4 wait for the first minute to pass, request 5 for the second
+    assert clock.now - 1000.0 == pytest.approx(120.0)
+    assert io.stats["quota_wait_seconds"] == pytest.approx(120.0)
+
+    # Writes have their own window
+    io.queue_write("other", "A1", [["x"]])
+    before = clock.now
+    io.flush()
+    assert clock.now == before
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_retryable_errors_are_retried(spreadsheet, clock, status):
+    io = SheetsIO(spreadsheet, base_delay=1.0, max_delay=64.0)
+    spreadsheet.fail_next(status, status)
+    assert io.batch_get(["'other'"]) == [[["a"], ["b"]]]
+    assert spreadsheet.calls["values_batch_get"] == 3
+    assert io.stats["retries"] == 2
+    # Full jitter, capped at base_delay * 2 ** attempt
+    assert len(clock.sleeps) == 2
+    assert 0 <= clock.sleeps[0] <= 1.0 and 0 <= clock.sleeps[1] <= 2.0
+
+def test_other_errors_are_not_retried(spreadsheet, clock):
+    io = SheetsIO(spreadsheet)
+    spreadsheet.fail_next(400)
+    with pytest.raises(APIError):
+        io.batch_get(["'other'"])
+    assert spreadsheet.calls["values_batch_get"] == 1
+    assert io.stats["retries"] == 0
+
+def test_gives_up_after_max_retries(spreadsheet, clock):
+    io = SheetsIO(spreadsheet, max_retries=2)
+    spreadsheet.fail_next(503, 503, 503, 503)
+    with pytest.raises(APIError):
+        io.batch_get(["'other'"])
+    assert spreadsheet.calls["values_batch_get"] == 3
+
+def test_full_upload_is_one_clear_and_one_write(spreadsheet, clock):
+    import google_sheets
+
+    io = SheetsIO(spreadsheet)
+    rows = [
+        {"ID": f"conn_{i}", "WebsiteId": "portal.example.com", "Username": f"user{i}", "Status": "auth_failed",
+         "locationId": "1, 2", "LastUpdated": "2025-01-01", "practiceGroupId": "7", "practiceGroupName": "Smile"}
+        for i in range(3000)
+    ]
+    google_sheets.upload_data_to_google_sheets(io.worksheet("auth_failed"), rows, sheets_io=io)
+    # The grid is grown once, then everything goes out in one clear and one write
+    assert spreadsheet.calls == {"worksheets": 1, "resize": 1, "values_batch_clear": 1, "values_batch_update": 1}
+    assert len(spreadsheet.tabs["auth_failed"]) == 3001
+
+def test_diff_sync_leaves_rows_sheets_reformatted_alone(spreadsheet, clock):
+    import google_sheets
+
+    io = SheetsIO(spreadsheet)
+    worksheet = io.worksheet("auth_failed")
+    # Sheets stores "0123" as the number 123 and "7.50" as 7.5, which display differently,
+    # and would show a date in its own format
+    rows = [
+        {"ID": f"conn_{i}", "WebsiteId": "portal.example.com", "Username": "0123", "Status": "auth_failed",
+         "locationId": str(i), "LastUpdated": ["2026-10-18 13:05:00", "2025-01-01", ""][i],
+         "practiceGroupId": "7.50", "practiceGroupName": "TRUE"}
+        for i in range(3)
+    ]
+    google_sheets.sync_data_to_google_sheets(worksheet, rows, sheets_io=io)
+    written = [list(row) for row in spreadsheet.tabs["auth_failed"]]
+    assert written[0] == google_sheets.SHEET_HEADER and len(written) == 4
+
+    # LastUpdated is kept as the text the dashboard showed
+    assert [row[0] for row in io.batch_get(["auth_failed!F2:F4"])[0]] == ["2026-10-18 13:05:00", "2025-01-01"]
+
+    writes = spreadsheet.calls["values_batch_update"]
+    google_sheets.sync_data_to_google_sheets(worksheet, rows, sheets_io=io)
+    assert spreadsheet.calls["values_batch_update"] == writes
+    assert spreadsheet.tabs["auth_failed"] == written
+
+    # Only the changed row is rewritten
+    rows[1] = dict(rows[1], Status="locked")
+    google_sheets.sync_data_to_google_sheets(worksheet, rows, sheets_io=io)
+    assert spreadsheet.calls["values_batch_update"] == writes + 1
+    changed = [i for i, row in enumerate(spreadsheet.tabs["auth_failed"]) if row != written[i]]
+    assert changed == [2]
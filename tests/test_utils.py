@@ -0,0 +1,34 @@
+# tests/test_utils.py
+import os
+import stat
+
+import pytest
+
+from utils import read_json_file, write_json_file
+
+def test_json_file_round_trip(tmp_path):
+    path = str(tmp_path / "cache.json")
+    assert read_json_file(path) == {}
+    assert write_json_file(path, {"page_size": 500})
+    assert read_json_file(path) == {"page_size": 500}
+
+def test_failed_write_keeps_the_previous_file(tmp_path):
+    path = str(tmp_path / "cache.json")
+    write_json_file(path, {"page_size": 500})
+    # Fails halfway through serializing, as a crash mid-write would
+    with pytest.raises(TypeError):
+        write_json_file(path, {"page_size": 50, "plan": object()})
+    assert read_json_file(path) == {"page_size": 500}
+
+def test_unwritable_path_is_reported_not_raised(tmp_path):
+    assert not write_json_file(str(tmp_path / "missing" / "cache.json"), {})
+
+def test_file_mode(tmp_path):
+    path = str(tmp_path / "token.json")
+    write_json_file(path, {"token": "secret"}, file_mode=0o600)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+def test_corrupt_file_reads_as_empty(tmp_path):
+    path = tmp_path / "cache.json"
+    path.write_text('{"page_size": 5')
+    assert read_json_file(str(path)) == {}
@@ -1,7 +1,11 @@
 # utils.py
+import json
+import logging
 import sys
 import os
 
+logger = logging.getLogger(__name__)
+
 def resource_path(relative_path):
     """
     Get the absolute path to a resource, works for development and when bundled.
@@ -11,4 +15,44 @@ def resource_path(relative_path):
         base_path = sys._MEIPASS
     except AttributeError:
         base_path = os.path.abspath(".")
-    return os.path.join(base_path, relative_path)
\ No newline at end of file
+    return os.path.join(base_path, relative_path)
+
+def writable_path(relative_path):
+    """
+    Get an absolute path for files we create (reports, profiles, ...).
+
+    When bundled, _MEIPASS is a temporary folder removed on exit, so output
+    goes next to the executable instead.
+    """
+    if getattr(sys, "frozen", False):
+        base_path = os.path.dirname(sys.executable)
+    else:
+        base_path = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_path, relative_path)
+
+def read_json_file(path):
+    """
+    The JSON document stored at 'path', or {} if it is missing or unreadable.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def write_json_file(path, data, file_mode=0o644, **dump_kwargs):
+    """
+    Store 'data' as JSON at 'path'. It is written to a temp file that is then
+    swapped in, so a crash mid-write never leaves a half-written file.
+    Failures are logged, not raised; returns whether the file was written.
+    """
+    tmp_path = f"{path}.tmp"
+    try:
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, file_mode)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, **dump_kwargs)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning("Could not write %s: %s", path, e)
+        return False
+    return True